@@ -1,28 +1,133 @@
+import asyncio
 import logging
 import os
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from backend.middlewares.logging import setup_access_log_middleware
+from backend.middlewares.logging import (
+    flush_access_log,
+    reload_access_log_config,
+    setup_access_log_middleware,
+)
+from backend.middlewares.metrics import InFlightMiddleware, setup_metrics_middleware
 from backend.routers.mask import router as mask_router
+from backend.services.admission import AdmissionController
+from backend.services.batcher import MicroBatcher
+from backend.services.executor import MaskExecutor
 from backend.services.masker import Masker
+from backend.services.metrics import METRICS, process_memory, process_rss_bytes
+from backend.settings import Settings
+
+_startup_logger = logging.getLogger("app.startup")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     アプリ起動/終了のライフサイクルでリソースを管理する。
-    - 起動時に Masker を準備
-    - 終了時に必要ならクリーンアップ（現状なし）
+    - 起動時に設定を読み込み、Masker と実行器を準備
+      - inline: このプロセスで Masker をロード
+        （pre-fork 起動時は親プロセスでロード済みの app.state.preloaded_masker を共有する）
+      - thread: 各ワーカが自前の Masker をロード（本プロセスではロードしない）
+        （pre-fork 起動時は preloaded_masker をワーカ1つで使い、再ロードしない）
+      - process: 各ワーカが自前の Masker をロード（本プロセスではロードしない）
+    - ウォームアップが完了したら app.state.ready を立てる（/ready）
+      - inline: 起動完了後にイベントループ上で1文ずつ実行（その間も /health は応答する）
+      - thread/process: 各ワーカの初期化時に実行（実行器の起動完了時点で完了済み）
+    - 並行する /mask をまとめるマイクロバッチ（app.state.mask_batcher）を用意する
+    - 文字数で上限を設けた受付制御（app.state.admission）を用意する
+    - 起動の各段の所要時間をログに出す
+    - 終了時に実行器のプールを停止し、未出力のアクセスログを書き出す
     """
-    app.state.masker = Masker(model_name="ja_ginza")
+    t_start = time.perf_counter()
+    app.state.ready = False
+    settings = Settings.from_env()
+    app.state.settings = settings
+    reload_access_log_config()
+    masker_kwargs = settings.masker_kwargs()
+    warmup_texts = settings.warmup_texts()
+    preloaded = getattr(app.state, "preloaded_masker", None)
+    executor = MaskExecutor(
+        mode=settings.executor_mode,
+        max_workers=settings.executor_workers,
+        masker_kwargs=masker_kwargs,
+        warmup_texts=warmup_texts,
+        shared_masker=preloaded if settings.executor_mode == "thread" else None,
+    )
+    if executor.mode == "inline":
+        app.state.masker = preloaded if preloaded is not None else Masker(**masker_kwargs)
+    else:
+        app.state.masker = None
+    t_executor = time.perf_counter()
+    executor.start()
+    app.state.mask_executor = executor
+    app.state.mask_batcher = _build_batcher(app, settings, executor)
+    app.state.admission = AdmissionController(settings.queue_max_chars)
+    _startup_logger.info(
+        "startup: mode=%s model_ready=%.2fs executor_ready=%.2fs",
+        executor.mode,
+        t_executor - t_start,
+        time.perf_counter() - t_executor,
+    )
+    warmup_task: asyncio.Task | None = None
+    masker = app.state.masker
+    if masker is not None and warmup_texts and not getattr(masker, "warmed", False):
+        warmup_task = asyncio.create_task(_warm_up(app, masker, warmup_texts, t_start))
+    else:
+        _mark_ready(app, t_start)
     try:
         yield
     finally:
-        # クリーンアップが必要ならここで実施
-        pass
+        if warmup_task is not None:
+            warmup_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await warmup_task
+        if app.state.mask_batcher is not None:
+            await app.state.mask_batcher.close()
+        executor.shutdown()
+        flush_access_log()
+
+
+def _build_batcher(app: FastAPI, settings: Settings, executor: MaskExecutor) -> MicroBatcher | None:
+    """/mask のマイクロバッチ（MASK_MICROBATCH_MAX_ITEMS=1 で無効）。実行枠は実行器のワーカ数。"""
+    if settings.microbatch_max_items <= 1:
+        return None
+
+    async def run(method: str, **kwargs: Any) -> Any:
+        # テストで app.state.masker を差し替えられるよう、実行時に参照する
+        return await executor.run(app.state.masker, method, **kwargs)
+
+    return MicroBatcher(
+        run,
+        slots=1 if executor.mode == "inline" else executor.max_workers,
+        max_items=settings.microbatch_max_items,
+        max_chars=settings.microbatch_max_chars,
+        window=settings.microbatch_window_ms / 1000,
+    )
+
+
+async def _warm_up(app: FastAPI, masker: Masker, texts: tuple[str, ...], t_start: float) -> None:
+    """inline 時のウォームアップ。1文ごとにイベントループへ制御を返し、/health 等を応答できるようにする。"""
+    t0 = time.perf_counter()
+    try:
+        for text in texts:
+            masker.warm_up((text,))
+            await asyncio.sleep(0)
+    except Exception:  # noqa: BLE001
+        # ウォームアップは最適化のため、失敗しても受付は開始する
+        _startup_logger.exception("warm-up failed")
+    _startup_logger.info("warm-up: texts=%d seconds=%.2f", len(texts), time.perf_counter() - t0)
+    _mark_ready(app, t_start)
+
+
+def _mark_ready(app: FastAPI, t_start: float) -> None:
+    app.state.ready = True
+    _startup_logger.info("ready: seconds=%.2f", time.perf_counter() - t_start)
 
 
 def _configure_logging() -> None:
@@ -57,13 +162,97 @@ app.add_middleware(
     "/health",
     tags=["system"],
     summary="ヘルスチェック",
-    description="死活監視。APIプロセスが起動していれば200を返します。",
+    description="死活監視（liveness）。APIプロセスが起動していれば200を返します。受付可否は /ready を参照します。",
 )
 async def health_check():
     return {"status": "healthy"}
 
 
+@app.get(
+    "/ready",
+    tags=["system"],
+    summary="レディネスチェック",
+    description=(
+        "モデルのロードとウォームアップが完了していれば200、完了前は503を返します。"
+        "ロードバランサ/オーケストレータの振り分け判定に使用します。"
+    ),
+    responses={503: {"description": "起動中（ウォームアップ未完了）"}},
+)
+async def readiness_check(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
+
+# ワーカ間で共有される統計値（合算せず最大値を採る）
+_SHARED_STATS = {"disk_size", "disk_max_entries"}
+
+
+@app.get(
+    "/stats",
+    tags=["system"],
+    summary="内部統計",
+    description=(
+        "NER キャッシュのヒット/ミス/追い出し件数などを返します（disk_ 接頭辞は共有ディスクキャッシュ）。"
+        "thread 実行時は全ワーカの合算。process 実行時はワーカプロセス内にあるため null です。"
+    ),
+)
+async def stats(request: Request):
+    executor = getattr(request.app.state, "mask_executor", None)
+    masker = getattr(request.app.state, "masker", None)
+    maskers = executor.local_maskers(masker) if executor is not None else [masker]
+    totals: dict[str, int] | None = None
+    for m in maskers:
+        cache_stats = getattr(m, "cache_stats", lambda: None)()
+        if cache_stats is None:
+            continue
+        totals = totals or dict.fromkeys(cache_stats, 0)
+        for k, v in cache_stats.items():
+            # 共有ディスクキャッシュの件数/上限はワーカ間で同一のため合算しない
+            totals[k] = max(totals.get(k, 0), v) if k in _SHARED_STATS else totals.get(k, 0) + v
+    return {"ner_cache": totals}
+
+
+@app.get(
+    "/metrics",
+    tags=["system"],
+    summary="メトリクス（Prometheus 形式）",
+    description=(
+        "処理段ごとの所要時間（masker_stage_seconds）、入力文字数・検出件数のヒストグラム、"
+        "ラベルごとの検出件数、処理中のリクエスト数、受付制御のキュー（文字数・件数・上限）と拒否件数、"
+        "プロセスの RSS（Linux では USS/共有/PSS の内訳も）を"
+        "Prometheus のテキスト形式で返します。"
+    ),
+    response_class=PlainTextResponse,
+)
+async def metrics(request: Request) -> PlainTextResponse:
+    executor = getattr(request.app.state, "mask_executor", None)
+    gauges = [
+        ("http_requests_in_flight", "処理中の HTTP リクエスト数", InFlightMiddleware.in_flight),
+        ("mask_executor_in_flight", "実行器へ投入中のタスク数", executor.in_flight if executor is not None else 0),
+        ("process_resident_memory_bytes", "API プロセスの常駐メモリ（バイト）", process_rss_bytes()),
+    ]
+    admission = getattr(request.app.state, "admission", None)
+    if admission is not None:
+        # オートスケールの指標（キューの文字数が上限に近づいたらスケールアウト）
+        gauges += [
+            ("mask_queue_chars", "受け付けた処理待ち + 処理中の文字数", admission.chars),
+            ("mask_queue_requests", "受け付けた処理待ち + 処理中のリクエスト数", admission.requests),
+            ("mask_queue_capacity_chars", "受け付ける文字数の上限（0 は無制限）", admission.max_chars),
+        ]
+    memory = process_memory()
+    if memory is not None:
+        # pre-fork 起動時のホスト見積もり用（unique はワーカ固有、shared は親プロセスと共有するページ）
+        gauges += [
+            ("process_unique_memory_bytes", "API プロセス固有のメモリ（USS。バイト）", memory["unique"]),
+            ("process_shared_memory_bytes", "他プロセスと共有しているメモリ（バイト）", memory["shared"]),
+            ("process_proportional_memory_bytes", "共有分を按分したメモリ（PSS。バイト）", memory["pss"]),
+        ]
+    return PlainTextResponse(METRICS.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 # Middlewares
+setup_metrics_middleware(app)
 setup_access_log_middleware(app)
 
 # Routers
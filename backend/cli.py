@@ -0,0 +1,457 @@
+"""
+一括マスク CLI（python -m backend.cli）
+
+- HTTP を介さずに大量のレコードをマスクする（バックフィル用）
+- 入力: JSONL（1行 = /mask のリクエストと同じ形式）またはプレーンテキスト（1行 = 1文書）。ファイル省略時・"-" は標準入力
+- 出力: 入力と同じ順序で1行ずつ
+  - jsonl: /mask のレスポンスと同じ形式（各行の output に従う。失敗した行は {"line": 行番号, "error": ...}）
+  - text: マスク後の1行
+- ワーカプロセスごとに Masker を1回だけロードし、--batch-size 行ずつ Masker.mask_many（1回の NER）で処理する
+  - Masker の設定は API と同じ環境変数（MASK_MODEL, MASK_PIPELINE, MASK_REGEX_RULES_FILE など）から読む
+  - マスク方法は API と同じ正規化（MaskRequest.mask_kwargs）を通すため、オンラインと同じ結果になる
+  - 投入中のバッチ数をワーカ数の数倍に抑え、入力サイズに依らずメモリは一定
+- 進捗（件数・docs/s）を標準エラーへ出力する
+- --job-dir: 再開可能なシャード単位のジョブとして実行する（数 GB の入力向け。backend.services.shards）
+  - 入力をメモリマップし、改行で揃えたバイト範囲（--shard-bytes）のシャードに分けて並列に処理する
+  - シャードごとの出力とマニフェストをジョブディレクトリに書き、再実行時は完了済みのシャードを飛ばす
+  - 失敗した行は行番号の代わりに入力上のバイト位置（offset）で示す（UTF-8 として不正な行も失敗として扱う）
+  - シャードが失敗しても、完了した他のシャードはマニフェストに記録してから終了する
+  - -o を指定した場合は、全シャードの完了後に出力を入力順に連結する
+
+使い方（リポジトリルートで実行）:
+    python -m backend.cli records.jsonl -o masked.jsonl --workers 4
+    cat notes.txt | python -m backend.cli --format text --targets PERSON --targets EMAIL > masked.txt
+    python -m backend.cli huge.jsonl --job-dir jobs/huge --workers 8 -o masked.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from pathlib import Path
+from typing import IO, Any
+
+from pydantic import ValidationError
+
+from backend.schemas.mask import MaskRequest
+from backend.services.masker import Masker
+from backend.services.shards import JobManifest, ManifestMismatch, Shard, iter_records
+from backend.settings import Settings
+
+# 処理結果に影響する Masker の設定（ジョブのマニフェストに記録し、再実行時に一致を確認する）
+_JOB_MASKER_KEYS: tuple[str, ...] = (
+    "model_name",
+    "pipeline",
+    "exclude",
+    "window_chars",
+    "regex_rules_file",
+    "dictionary_file",
+)
+
+# ワーカプロセス内の Masker（initializer でロードする）
+_masker: Masker | None = None
+
+
+def _init_worker(masker_kwargs: dict[str, Any]) -> None:
+    global _masker
+    _masker = Masker(**masker_kwargs)
+
+
+def _parse(line: str, fmt: str, defaults: dict[str, Any]) -> MaskRequest | str:
+    """1行を MaskRequest へ変換する。不正な行はエラー内容（PII を含まない）を返す。"""
+    if fmt == "text":
+        return MaskRequest.model_validate({**defaults, "text": line})
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return "JSON として解析できません"
+    if not isinstance(record, dict):
+        return "JSON オブジェクトではありません"
+    try:
+        request = MaskRequest.model_validate({**defaults, **record})
+    except ValidationError as e:
+        return "スキーマ不正: " + ", ".join(".".join(map(str, err["loc"])) for err in e.errors())
+    if not request.text:
+        return "text は必須です"
+    return request
+
+
+def mask_lines(
+    lines: list[tuple[int, str | None]], fmt: str, defaults: dict[str, Any], position_key: str = "line"
+) -> tuple[list[str], list[tuple[int, str]]]:
+    """
+    (位置, 行) のバッチをマスクする（ワーカプロセスで実行）。位置は行番号（ジョブではバイト位置）
+    行が None（デコードできなかった行）は失敗として扱う
+    戻り値: (出力行のリスト, 失敗した行の (位置, エラー内容) のリスト)
+    - 有効な行はまとめて1回の mask_many で処理する
+    - 失敗した行は jsonl ではエラーの行（{position_key: 位置, "error": ...}）、text では空行を出力する
+      （入力と出力の行を対応させる）
+    """
+    assert _masker is not None
+    outputs: list[str] = [""] * len(lines)
+    failed: dict[int, str] = {}
+    refs: list[int] = []
+    requests: list[MaskRequest] = []
+    for k, (_, line) in enumerate(lines):
+        if line is None:
+            failed[k] = "UTF-8 としてデコードできません"
+            continue
+        if fmt == "text" and not line:
+            continue
+        parsed = _parse(line, fmt, defaults)
+        if isinstance(parsed, str):
+            failed[k] = parsed
+            continue
+        refs.append(k)
+        requests.append(parsed)
+    results = _masker.mask_many([r.mask_kwargs() for r in requests]) if requests else []
+    for k, request, result in zip(refs, requests, results, strict=True):
+        if isinstance(result, Exception):
+            failed[k] = f"内部エラー（{result.__class__.__name__}）"
+        elif fmt == "text":
+            outputs[k] = result[0]
+        else:
+            payload = request.response_payload(*result)
+            outputs[k] = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    if fmt == "jsonl":
+        for k, error in failed.items():
+            outputs[k] = json.dumps({position_key: lines[k][0], "error": error}, ensure_ascii=False)
+    return outputs, [(lines[k][0], error) for k, error in sorted(failed.items())]
+
+
+def _read_lines(paths: list[str], stdin: IO[str]) -> Iterator[tuple[int, str]]:
+    """入力ファイル（"-" は標準入力）を順に読み、(通し行番号, 改行を除いた行) を返す。"""
+    lineno = 0
+    for path in paths or ["-"]:
+        with nullcontext(stdin) if path == "-" else open(path, encoding="utf-8-sig") as f:
+            for line in f:
+                lineno += 1
+                yield lineno, line.rstrip("\r\n")
+
+
+def _batched(lines: Iterable[tuple[int, str | None]], size: int) -> Iterator[list[tuple[int, str | None]]]:
+    batch: list[tuple[int, str | None]] = []
+    for item in lines:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Progress:
+    """処理件数と docs/s を一定間隔で標準エラーへ出力する。"""
+
+    def __init__(self, interval: float, stream: IO[str]) -> None:
+        self.interval = interval
+        self.stream = stream
+        self.docs = 0
+        self.errors = 0
+        self._t0 = time.perf_counter()
+        self._next = self._t0 + interval
+
+    def add(self, docs: int, errors: int) -> None:
+        self.docs += docs
+        self.errors += errors
+        if self.interval > 0 and time.perf_counter() >= self._next:
+            self._next = time.perf_counter() + self.interval
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        seconds = time.perf_counter() - self._t0
+        rate = self.docs / seconds if seconds > 0 else 0.0
+        label = "done" if final else "progress"
+        print(
+            f"{label}: docs={self.docs} errors={self.errors} seconds={seconds:.1f} docs/s={rate:.1f}",
+            file=self.stream,
+            flush=True,
+        )
+
+
+def run(
+    lines: Iterable[tuple[int, str]],
+    out: IO[str],
+    fmt: str,
+    defaults: dict[str, Any],
+    masker_kwargs: dict[str, Any],
+    workers: int = 1,
+    batch_size: int = 64,
+    progress: _Progress | None = None,
+) -> tuple[int, int]:
+    """行を順にマスクして out へ書き出し、(処理件数, 失敗件数) を返す。"""
+    progress = progress or _Progress(0, sys.stderr)
+
+    def _write(result: tuple[list[str], list[tuple[int, str]]]) -> None:
+        outputs, errors = result
+        out.writelines(line + "\n" for line in outputs)
+        if fmt == "text":
+            # text の出力にはエラーを書けないため標準エラーへ出す
+            for lineno, error in errors:
+                print(f"line {lineno}: {error}", file=progress.stream)
+        progress.add(len(outputs), len(errors))
+
+    if workers <= 1:
+        _init_worker(masker_kwargs)
+        for batch in _batched(lines, batch_size):
+            _write(mask_lines(batch, fmt, defaults))
+        return progress.docs, progress.errors
+
+    # 投入中のバッチを入力順に保持し、先頭から書き出す（上限を超えたら先頭の完了を待つ）
+    max_pending = workers * 4
+    pending: deque[Future[tuple[list[str], list[tuple[int, str]]]]] = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(masker_kwargs,),
+    ) as pool:
+        for batch in _batched(lines, batch_size):
+            pending.append(pool.submit(mask_lines, batch, fmt, defaults))
+            while len(pending) >= max_pending or (pending and pending[0].done()):
+                _write(pending.popleft().result())
+        while pending:
+            _write(pending.popleft().result())
+    return progress.docs, progress.errors
+
+
+def process_shard(
+    input_path: str, shard: Shard, job_dir: str, fmt: str, defaults: dict[str, Any], batch_size: int
+) -> tuple[int, int]:
+    """
+    1シャードを処理して出力ファイルを書き、(処理件数, 失敗件数) を返す（ワーカプロセスで実行）。
+    - 一時ファイルへ書いてから rename する（途中で落ちた出力は完了扱いにならない）
+    """
+    out_path = Path(job_dir) / shard.output
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    docs = errors = 0
+    records = iter_records(input_path, shard.start, shard.end)
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for batch in _batched(records, batch_size):
+            outputs, failed = mask_lines(batch, fmt, defaults, position_key="offset")
+            out.writelines(line + "\n" for line in outputs)
+            if fmt == "text":
+                for offset, error in failed:
+                    print(f"offset {offset}: {error}", file=sys.stderr)
+            docs += len(outputs)
+            errors += len(failed)
+    os.replace(tmp_path, out_path)
+    return docs, errors
+
+
+def job_options(fmt: str, defaults: dict[str, Any], shard_bytes: int, masker_kwargs: dict[str, Any]) -> dict[str, Any]:
+    """マニフェストに記録する処理条件（JSON で往復しても一致するよう正規化する）。"""
+    options = {
+        "format": fmt,
+        "defaults": defaults,
+        "shard_bytes": shard_bytes,
+        "masker": {k: masker_kwargs.get(k) for k in _JOB_MASKER_KEYS},
+    }
+    return json.loads(json.dumps(options))
+
+
+def run_job(
+    input_path: str,
+    job_dir: Path,
+    fmt: str,
+    defaults: dict[str, Any],
+    masker_kwargs: dict[str, Any],
+    workers: int = 1,
+    batch_size: int = 64,
+    shard_bytes: int = 64 * 2**20,
+    progress: _Progress | None = None,
+) -> JobManifest:
+    """
+    入力をシャードに分けて処理する。ジョブディレクトリに同じ条件のマニフェストがあれば完了済みのシャードを飛ばす。
+    - 条件が異なる場合は ManifestMismatch
+    - シャードの処理が例外で失敗した場合は、他のシャードの完了を待ってマニフェストに記録してから最初の例外を送出する
+    """
+    progress = progress or _Progress(0, sys.stderr)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    suffix = ".jsonl" if fmt == "jsonl" else ".txt"
+    options = job_options(fmt, defaults, shard_bytes, masker_kwargs)
+    manifest = JobManifest.load(job_dir)
+    if manifest is None:
+        manifest = JobManifest.plan(input_path, options, shard_bytes, suffix)
+        manifest.save(job_dir)
+    else:
+        stat = os.stat(input_path)
+        manifest.check(
+            JobManifest(
+                input=os.path.abspath(input_path), size=stat.st_size, mtime_ns=stat.st_mtime_ns, options=options
+            )
+        )
+    pending = manifest.pending(job_dir)
+    print(
+        f"job: shards={len(manifest.shards)} pending={len(pending)} dir={job_dir}", file=progress.stream, flush=True
+    )
+
+    def _done(shard: Shard, result: tuple[int, int]) -> None:
+        shard.docs, shard.errors = result
+        shard.done = True
+        manifest.save(job_dir)
+        progress.add(*result)
+
+    if workers <= 1:
+        if pending:
+            _init_worker(masker_kwargs)
+        for shard in pending:
+            _done(shard, process_shard(input_path, shard, str(job_dir), fmt, defaults, batch_size))
+        return manifest
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(masker_kwargs,),
+    ) as pool:
+        futures = {
+            pool.submit(process_shard, input_path, shard, str(job_dir), fmt, defaults, batch_size): shard
+            for shard in pending
+        }
+        error: Exception | None = None
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            _done(futures[future], result)
+    if error is not None:
+        raise error
+    return manifest
+
+
+def concat_outputs(manifest: JobManifest, job_dir: Path, out: IO[str]) -> None:
+    """全シャードの出力を入力順に連結する。"""
+    for shard in manifest.shards:
+        with open(job_dir / shard.output, encoding="utf-8") as f:
+            shutil.copyfileobj(f, out)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JSONL/テキストを API と同じ Masker でまとめてマスクします")
+    parser.add_argument("inputs", nargs="*", help='入力ファイル（省略時・"-" は標準入力）')
+    parser.add_argument(
+        "-o", "--output", help='出力ファイル（"-" は標準出力。--job-dir なし時の既定は標準出力。--job-dir 時は連結先）'
+    )
+    parser.add_argument(
+        "--format",
+        choices=["jsonl", "text"],
+        help="入力形式（省略時は拡張子 .jsonl/.ndjson なら jsonl、それ以外は text。標準入力は jsonl）",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="ワーカプロセス数 (default: CPU 数)"
+    )
+    parser.add_argument("--batch-size", type=int, default=64, help="1回の NER にまとめる行数 (default: 64)")
+    parser.add_argument(
+        "--progress-interval", type=float, default=5.0, help="進捗を出力する間隔（秒。0 で最後のみ） (default: 5)"
+    )
+    parser.add_argument("--targets", action="append", help="マスク対象ラベル（複数可。JSONL の targets が優先）")
+    parser.add_argument("--replacement", help="マスク置換に用いる文字列（JSONL の masking が優先）")
+    parser.add_argument(
+        "--no-preserve-length", action="store_true", help="マスク後の長さを保持しない（JSONL の masking が優先）"
+    )
+    parser.add_argument("--fixed-length", type=int, help="固定長でマスク（JSONL の masking が優先）")
+    parser.add_argument(
+        "--job-dir", help="再開可能なシャード単位のジョブとして実行し、出力とマニフェストを置くディレクトリ"
+    )
+    parser.add_argument(
+        "--shard-bytes", type=int, default=64 * 2**20, help="--job-dir 時のシャードの大きさ（バイト） (default: 64MiB)"
+    )
+    return parser.parse_args(argv)
+
+
+def _defaults(args: argparse.Namespace) -> dict[str, Any]:
+    """コマンドラインで指定したマスク方法（/mask のリクエストの既定値として使う）。"""
+    defaults: dict[str, Any] = {}
+    if args.targets:
+        defaults["targets"] = args.targets
+    masking: dict[str, Any] = {}
+    if args.replacement is not None:
+        masking["replacement"] = args.replacement
+    if args.no_preserve_length:
+        masking["preserve_length"] = False
+    if args.fixed_length is not None:
+        masking["fixed_length"] = args.fixed_length
+    if masking:
+        defaults["masking"] = masking
+    return defaults
+
+
+def _detect_format(inputs: list[str]) -> str:
+    if not inputs or inputs == ["-"]:
+        return "jsonl"
+    return "jsonl" if all(p.endswith((".jsonl", ".ndjson")) for p in inputs if p != "-") else "text"
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    fmt = args.format or _detect_format(args.inputs)
+    defaults = _defaults(args)
+    try:
+        MaskRequest.model_validate({**defaults, "text": ""})
+    except ValidationError as e:
+        print(f"マスク方法の指定が不正です: {e}", file=sys.stderr)
+        return 2
+    masker_kwargs = Settings.from_env().masker_kwargs()
+    progress = _Progress(args.progress_interval, sys.stderr)
+    if args.job_dir:
+        return _main_job(args, fmt, defaults, masker_kwargs, progress)
+    try:
+        with nullcontext(sys.stdout) if args.output in (None, "-") else open(args.output, "w", encoding="utf-8") as out:
+            run(
+                _read_lines(args.inputs, sys.stdin),
+                out,
+                fmt,
+                defaults,
+                masker_kwargs,
+                workers=max(1, args.workers),
+                batch_size=max(1, args.batch_size),
+                progress=progress,
+            )
+    finally:
+        progress.report(final=True)
+    return 1 if progress.errors else 0
+
+
+def _main_job(
+    args: argparse.Namespace, fmt: str, defaults: dict[str, Any], masker_kwargs: dict[str, Any], progress: _Progress
+) -> int:
+    if len(args.inputs) != 1 or args.inputs[0] == "-":
+        print("--job-dir には入力ファイルを1つ指定してください（標準入力は使えません）", file=sys.stderr)
+        return 2
+    job_dir = Path(args.job_dir)
+    try:
+        manifest = run_job(
+            args.inputs[0],
+            job_dir,
+            fmt,
+            defaults,
+            masker_kwargs,
+            workers=max(1, args.workers),
+            batch_size=max(1, args.batch_size),
+            shard_bytes=max(1, args.shard_bytes),
+            progress=progress,
+        )
+    except ManifestMismatch as e:
+        print(f"{e}（別のジョブディレクトリを指定してください）", file=sys.stderr)
+        return 2
+    finally:
+        progress.report(final=True)
+    if args.output:
+        with nullcontext(sys.stdout) if args.output == "-" else open(args.output, "w", encoding="utf-8") as out:
+            concat_outputs(manifest, job_dir, out)
+    return 1 if any(s.errors for s in manifest.shards) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
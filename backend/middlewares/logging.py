@@ -5,12 +5,29 @@
 - 既定では PII を含む原文本文は記録しない（ダイジェストと長さのみ）
 - デバッグ時（`LOG_DEBUG_BODY=true`）のみ原文本文をログに含める
 
-環境変数:
+実装:
+- 純粋な ASGI ミドルウェア。リクエスト/レスポンス本文はバッファせず、そのまま流す
+- 本文の長さや検出件数は、ルーターが request.state.access_log（AccessLogChannel）へ渡した値を使う
+  （本文の再読み込みや JSON の再パースはしない）
+- IN はルーターが本文を渡した時点（渡さない場合はレスポンス開始時）、OUT はレスポンス完了時に出力する
+- ログの整形（json.dumps）とハンドラへの書き込みはキュー経由でバックグラウンドのスレッドが行う
+  （キューが溢れた場合は破棄し、件数を後で WARNING として出力する）
+  - 本文のダイジェスト（SHA-256）も書き込み時にそのスレッドで計算する（イベントループでは本文の参照だけを積む）
+
+サンプリング:
+- LOG_SAMPLE の割合のリクエストのみ IN/OUT を出力する
+- エラー（例外/5xx）と遅いリクエスト（LOG_SLOW_MS 以上）は割合に関わらず出力する
+  （対象外と判定したリクエストの IN は保留し、完了時にエラー/遅延だった場合のみ出力する）
+- LOG_SAMPLE_BY_ID=true の場合はリクエストIDのハッシュで判定する（同じIDは常に同じ判定）
+
+環境変数（起動時に1回だけ読む。変更を反映するには reload_access_log_config() を呼ぶ）:
 - LOG_JSON: true/false（JSON 形式で出力）
 - LOG_LEVEL: INFO/DEBUG など（logging レベル）
 - LOG_DEBUG_BODY: true/false（原文本文のログ許可。既定 false）
 - LOG_BODY_MAX: 本文の最大記録長（既定 256）
 - LOG_SAMPLE: サンプリング率 0.0〜1.0（既定 1.0）
+- LOG_SAMPLE_BY_ID: true/false（リクエストIDで決定的にサンプリング。既定 false）
+- LOG_SLOW_MS: 常に出力する遅延の閾値（ミリ秒。既定 1000）
 """
 from __future__ import annotations
 
@@ -18,122 +35,257 @@ import hashlib
 import json
 import logging
 import os
+import queue
+import random
+import threading
 import time
 import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any
 
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
 def _sha256_hex(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def setup_access_log_middleware(app: FastAPI) -> None:
-    """
-    アクセスログミドルウェアをアプリへ登録する（多重登録は回避）。
-    """
+class _Digest:
+    """ログの値として積み、書き込み時（ライターのスレッド）に SHA-256 の16進表記へ置き換える本文。"""
 
-    if getattr(app.state, "_access_log_installed", False):
-        return
+    __slots__ = ("text",)
 
-    logger = logging.getLogger("app.access")
+    def __init__(self, text: str) -> None:
+        self.text = text
 
-    @app.middleware("http")
-    async def access_log(request: Request, call_next) -> Response:  # type: ignore[override]
-        start = time.perf_counter()
 
-        # 設定（毎回読む: テストでの切替や動的変更に備える）
-        log_json = os.getenv("LOG_JSON", "true").lower() == "true"
-        debug_body = os.getenv("LOG_DEBUG_BODY", "false").lower() == "true"
+@dataclass(frozen=True)
+class AccessLogConfig:
+    """アクセスログの設定（不変）。"""
+
+    log_json: bool = True
+    debug_body: bool = False
+    body_max: int = 256
+    sample: float = 1.0
+    sample_by_id: bool = False
+    slow_ms: int = 1000
+
+    @classmethod
+    def from_env(cls) -> AccessLogConfig:
         try:
-            body_max = int(os.getenv("LOG_BODY_MAX", "256"))
+            body_max = int(os.getenv("LOG_BODY_MAX", str(cls.body_max)))
         except Exception:  # noqa: BLE001
-            body_max = 256
+            body_max = cls.body_max
         try:
-            sample = float(os.getenv("LOG_SAMPLE", "1.0"))
+            sample = min(max(float(os.getenv("LOG_SAMPLE", str(cls.sample))), 0.0), 1.0)
         except Exception:  # noqa: BLE001
-            sample = 1.0
+            sample = cls.sample
+        try:
+            slow_ms = int(os.getenv("LOG_SLOW_MS", str(cls.slow_ms)))
+        except Exception:  # noqa: BLE001
+            slow_ms = cls.slow_ms
+        return cls(
+            log_json=os.getenv("LOG_JSON", "true").lower() == "true",
+            debug_body=os.getenv("LOG_DEBUG_BODY", "false").lower() == "true",
+            body_max=body_max,
+            sample=sample,
+            sample_by_id=os.getenv("LOG_SAMPLE_BY_ID", "false").lower() == "true",
+            slow_ms=slow_ms,
+        )
 
-        # 低コストなサンプリング（簡易）: 現状は全件想定
-        _ = sample  # 未使用（将来拡張）
+    def sampled(self, request_id: str) -> bool:
+        """このリクエストを割合サンプリングの対象とするか。"""
+        if self.sample >= 1.0:
+            return True
+        if self.sample <= 0.0:
+            return False
+        if self.sample_by_id:
+            digest = hashlib.blake2b(request_id.encode("utf-8"), digest_size=8).digest()
+            return int.from_bytes(digest, "big") < self.sample * 2**64
+        return random.random() < self.sample
 
-        method = request.method
-        path = request.url.path
 
-        # リクエストID（ヘッダ優先、無ければ採番）
-        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
-        # 後段で参照できるように state にも保存
-        request.state.request_id = request_id
-
-        # タイムスタンプ（UTC, RFC3339）
-        def _now_ts() -> str:
-            # ローカルタイム（コンテナのTZに依存）でISO8601を出力
-            return datetime.now().astimezone().isoformat(timespec="milliseconds")
-        start_ts = _now_ts()
+_config = AccessLogConfig.from_env()
+
+
+def reload_access_log_config() -> AccessLogConfig:
+    """環境変数からアクセスログの設定を読み直す（起動時や設定変更時に呼ぶ）。"""
+    global _config
+    _config = AccessLogConfig.from_env()
+    return _config
+
+
+class _LogWriter:
+    """ログの整形と書き込みを行うバックグラウンドスレッド（イベントループをブロックしない）。"""
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self._queue: queue.Queue[tuple[logging.Logger, dict[str, Any], bool]] = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._dropped = 0
 
-        # リクエスト本文の取得（JSON前提で text を抽出。失敗時は空扱い）
-        req_text: str = ""
+    def submit(self, logger: logging.Logger, payload: dict[str, Any], as_json: bool) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+                    self._thread.start()
         try:
-            raw = await request.body()
-            # 本文を読み取った場合はダウンストリームでも参照できるように復元する
-            # 1) キャッシュへ格納
-            try:
-                request._body = raw  # type: ignore[attr-defined]
-            except Exception:  # noqa: BLE001
-                pass
-            # 2) 受信チャネルを差し替え（受信側が body() 以外で読む場合に備える）
-            async def _receive() -> dict[str, Any]:
-                return {"type": "http.request", "body": raw, "more_body": False}
+            self._queue.put_nowait((logger, payload, as_json))
+        except queue.Full:
+            self._dropped += 1
 
+    def _run(self) -> None:
+        while True:
+            logger, payload, as_json = self._queue.get()
             try:
-                request._receive = _receive  # type: ignore[attr-defined]
+                if self._dropped:
+                    dropped, self._dropped = self._dropped, 0
+                    logger.warning("access log queue full: dropped=%d", dropped)
+                _write(logger, payload, as_json)
             except Exception:  # noqa: BLE001
                 pass
-            if raw:
-                # JSON を想定（/mask）
-                try:
-                    obj = json.loads(raw.decode("utf-8"))
-                    if isinstance(obj, dict) and "text" in obj and isinstance(obj["text"], str):
-                        req_text = obj["text"]
-                except Exception:  # noqa: BLE001
-                    # JSON でなければスキップ
-                    req_text = ""
-        except Exception:  # noqa: BLE001
-            req_text = ""
+            finally:
+                self._queue.task_done()
 
-        # 実行前ログ（IN）
-        start_log: dict[str, Any] = {
-            "logger": "app.access",
-            "level": "INFO",
-            "event": "IN",
-            "request_id": request_id,
-            "ts": start_ts,
-            "method": method,
-            "path": path,
-        }
-        if req_text:
-            # 長さは常に記録（プレビュー有無に関わらず）
-            start_log["req_body_len"] = len(req_text)
-            if debug_body:
-                start_log["req_body"] = req_text[:body_max]
-                # 必要に応じてダイジェストも保持（整合性確認用）
-                start_log["req_body_digest"] = _sha256_hex(req_text)
+    def flush(self) -> None:
+        """キュー内のログをすべて書き出すまで待つ（終了時やテスト用）。"""
+        if self._thread is not None:
+            self._queue.join()
+
+
+_writer = _LogWriter()
+
+
+def flush_access_log() -> None:
+    """未出力のアクセスログを書き出す。"""
+    _writer.flush()
+
+
+def _now_ts() -> str:
+    # ローカルタイム（コンテナのTZに依存）でISO8601を出力
+    return datetime.now().astimezone().isoformat(timespec="milliseconds")
+
+
+class AccessLogChannel:
+    """
+    ルーターからアクセスログへ要約値を渡すチャネル（request.state.access_log）。
+    - set_request: リクエストの原文（IN ログの長さ/ダイジェスト用）。呼び出し時に IN を出力する
+    - set_response: マスク後の長さと検出件数（OUT ログ用）
+    """
+
+    __slots__ = ("_on_request", "req_text", "masked_len", "masked", "detected_count")
+
+    def __init__(self, on_request: Callable[[], None]) -> None:
+        self._on_request = on_request
+        self.req_text: str = ""
+        self.masked_len: int | None = None
+        self.masked: str | None = None
+        self.detected_count: int | None = None
+
+    def set_request(self, text: str) -> None:
+        self.req_text = text
+        self._on_request()
+
+    def set_response(self, masked_len: int, detected_count: int, masked: str | None = None) -> None:
+        self.masked_len = masked_len
+        self.detected_count = detected_count
+        self.masked = masked
+
+
+class AccessLogMiddleware:
+    """アクセスログを出力する ASGI ミドルウェア。"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        config = _config
+        log_json = config.log_json
+        debug_body = config.debug_body
+        body_max = config.body_max
+
+        method: str = scope["method"]
+        path: str = scope["path"]
+
+        # リクエストID（ヘッダ優先、無ければ採番）
+        request_id = ""
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        request_id = request_id or uuid.uuid4().hex
+        start_ts = _now_ts()
+        in_logged = False
+        # 割合サンプリングの対象外なら IN を保留し、完了時にエラー/遅延の場合のみ出力する
+        sampled = config.sampled(request_id)
+        in_pending = False
+
+        def in_payload() -> dict[str, Any]:
+            start_log: dict[str, Any] = {
+                "logger": "app.access",
+                "level": "INFO",
+                "event": "IN",
+                "request_id": request_id,
+                "ts": start_ts,
+                "method": method,
+                "path": path,
+            }
+            req_text = channel.req_text
+            if req_text:
+                # 長さは常に記録（プレビュー有無に関わらず）
+                start_log["req_body_len"] = len(req_text)
+                if debug_body:
+                    start_log["req_body"] = req_text[:body_max]
+                start_log["req_body_digest"] = _Digest(req_text)
+            return start_log
+
+        def emit_in() -> None:
+            """実行前ログ（IN）。ルーターが本文を渡した時点、またはレスポンス開始時に1回だけ出力する。"""
+            nonlocal in_logged, in_pending
+            if in_logged:
+                return
+            in_logged = True
+            if sampled:
+                _emit(self.logger, in_payload(), log_json)
             else:
-                start_log["req_body_digest"] = _sha256_hex(req_text)
-        _emit(logger, start_log, log_json)
+                in_pending = True
+
+        # 後段（ルーター）から参照できるように state へ保存（request.state は scope["state"] を参照する）
+        channel = AccessLogChannel(emit_in)
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["access_log"] = channel
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                emit_in()
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if not any(k.lower() == b"x-request-id" for k, _ in headers):
+                    headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
 
-        # ルーティング実行
-        response: Response
         try:
-            response = await call_next(request)
-            status = response.status_code
+            await self.app(scope, receive, send_wrapper)
         except Exception as ex:  # noqa: BLE001
-            status = 500
-            # エラーもログして再送出
-            end = time.perf_counter()
-            latency_ms = int((end - start) * 1000)
+            # エラーもログして再送出（サンプリングに関わらず出力）
+            emit_in()
+            if in_pending:
+                _emit(self.logger, in_payload(), log_json)
             log_obj: dict[str, Any] = {
                 "logger": "app.access",
                 "level": "ERROR",
@@ -142,38 +294,26 @@ def setup_access_log_middleware(app: FastAPI) -> None:
                 "ts": _now_ts(),
                 "method": method,
                 "path": path,
-                "status": status,
-                "latency_ms": latency_ms,
+                "status": 500,
+                "latency_ms": int((time.perf_counter() - start) * 1000),
                 "error": ex.__class__.__name__,
             }
+            req_text = channel.req_text
             if debug_body and req_text:
                 log_obj["req_body"] = req_text[:body_max]
-            else:
-                if req_text:
-                    log_obj["req_body_digest"] = _sha256_hex(req_text)
-                    log_obj["req_body_len"] = len(req_text)
-            _emit(logger, log_obj, log_json)
+            elif req_text:
+                log_obj["req_body_digest"] = _Digest(req_text)
+                log_obj["req_body_len"] = len(req_text)
+            _emit(self.logger, log_obj, log_json)
             raise
 
-        end = time.perf_counter()
-        latency_ms = int((end - start) * 1000)
-
-        # レスポンス本文を捕捉（後で新しい Response に包み直す）
-        # まず既存レスポンスのヘッダ/属性を保持
-        headers = dict(response.headers)
-        headers.setdefault("X-Request-ID", request_id)
-
-        body_bytes = b""
-        if getattr(response, "body_iterator", None) is not None:
-            async for chunk in response.body_iterator:  # type: ignore[attr-defined]
-                body_bytes += chunk
-        else:
-            try:
-                body_bytes = response.body  # type: ignore[attr-defined]
-            except Exception:  # noqa: BLE001
-                body_bytes = b""
-
-        # リクエストログ（完了: OUT）
+        # リクエストログ（完了: OUT）。latency_ms はレスポンス本文の送出完了まで（ストリーミングも含む）
+        emit_in()
+        latency_ms = int((time.perf_counter() - start) * 1000)
+        if not (sampled or status >= 500 or latency_ms >= config.slow_ms):
+            return
+        if in_pending:
+            _emit(self.logger, in_payload(), log_json)
         log_obj = {
             "logger": "app.access",
             "level": "INFO",
@@ -185,40 +325,37 @@ def setup_access_log_middleware(app: FastAPI) -> None:
             "status": status,
             "latency_ms": latency_ms,
         }
-        # OUT ログは本文/ダイジェストともに出力しない（IN のみ記録）。
+        # OUT ログは本文/ダイジェストともに出力しない（IN のみ記録）。マスク結果は要約のみ
+        if channel.masked_len is not None:
+            log_obj["masked_len"] = channel.masked_len
+            if debug_body and channel.masked is not None:
+                log_obj["masked_preview"] = channel.masked[:body_max]
+        if channel.detected_count is not None:
+            log_obj["detected_count"] = channel.detected_count
+        _emit(self.logger, log_obj, log_json)
 
-        _emit(logger, log_obj, log_json)
 
-        # レスポンス付加情報（/mask のみ、masked 情報を安全に要約）
-        if path == "/mask" and body_bytes:
-            try:
-                body_obj = json.loads(body_bytes.decode("utf-8"))
-                if isinstance(body_obj, dict):
-                    masked = body_obj.get("masked")
-                    detected = body_obj.get("detected")
-                    if isinstance(masked, str):
-                        log_obj["masked_len"] = len(masked)
-                        if debug_body:
-                            log_obj["masked_preview"] = masked[:body_max]
-                    if isinstance(detected, list):
-                        log_obj["detected_count"] = len(detected)
-            except Exception:  # noqa: BLE001
-                pass
-
-        # 包み直したレスポンスを返却
-        return Response(
-            content=body_bytes,
-            status_code=status,
-            headers=headers,
-            media_type=response.media_type,
-            background=getattr(response, "background", None),
-        )
+def setup_access_log_middleware(app: FastAPI) -> None:
+    """
+    アクセスログミドルウェアをアプリへ登録する（多重登録は回避）。
+    - 呼び出し時に環境変数から設定を読み直す
+    """
 
+    reload_access_log_config()
+    if getattr(app.state, "_access_log_installed", False):
+        return
+    app.add_middleware(AccessLogMiddleware)
     app.state._access_log_installed = True
 
 
 def _emit(logger: logging.Logger, payload: dict[str, Any], as_json: bool) -> None:
-    """ロガーへ出力（JSON文字列 or テキスト）。"""
+    """ログをライターのキューへ積む（整形と書き込みはバックグラウンドで行う）。"""
+    _writer.submit(logger, payload, as_json)
+
+
+def _write(logger: logging.Logger, payload: dict[str, Any], as_json: bool) -> None:
+    """ロガーへ出力（JSON文字列 or テキスト）。_Digest の値はここでダイジェストへ置き換える。"""
+    payload = {k: _sha256_hex(v.text) if isinstance(v, _Digest) else v for k, v in payload.items()}
     if as_json:
         logger.info(json.dumps(payload, ensure_ascii=False))
     else:
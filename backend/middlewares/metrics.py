@@ -0,0 +1,37 @@
+"""
+メトリクス用ミドルウェア。
+
+- 処理中の HTTP リクエスト数（/metrics の http_requests_in_flight）を数える
+- 値の増減はイベントループ上でのみ行うためロック不要
+"""
+from __future__ import annotations
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class InFlightMiddleware:
+    """処理中の HTTP リクエスト数を数える ASGI ミドルウェア。"""
+
+    in_flight: int = 0
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        InFlightMiddleware.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            InFlightMiddleware.in_flight -= 1
+
+
+def setup_metrics_middleware(app: FastAPI) -> None:
+    """メトリクス用ミドルウェアをアプリへ登録する（多重登録は回避）。"""
+    if getattr(app.state, "_metrics_installed", False):
+        return
+    app.add_middleware(InFlightMiddleware)
+    app.state._metrics_installed = True
@@ -1,11 +1,240 @@
 import logging
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from typing import Annotated, Any, Literal
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
 
-from backend.schemas.mask import Entity, MaskRequest, MaskResponse
+from backend.middlewares.logging import AccessLogChannel
+from backend.schemas.mask import (
+    Entity,
+    MaskBatchRequest,
+    MaskBatchResponse,
+    MaskRequest,
+    MaskResponse,
+    MaskStreamChunk,
+    MaskStreamSummary,
+)
+from backend.services.admission import QueueFull
+from backend.services.masker import DeadlineExceeded, Span
+from backend.services.metrics import METRICS
+from backend.services.parallel import mask_parallel
+from backend.services.stream import SentenceChunker
+from backend.services.tabular import (
+    DELIMITERS,
+    CsvFormatError,
+    CsvRecordSplitter,
+    parse_records,
+    resolve_columns,
+    write_rows,
+)
+from backend.services.wire import MSGPACK, NotAcceptable, encode, negotiate
+from backend.settings import Settings
 
 router = APIRouter(prefix="/mask", tags=["mask"])
 
+# 処理期限（受信からのミリ秒）を指定するリクエストヘッダ
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+# 受付制御・処理期限に関する応答（OpenAPI 用）
+_ADMISSION_RESPONSES: dict[int | str, dict[str, Any]] = {
+    429: {"description": "処理待ちが上限に達している（MASK_QUEUE_REJECT_STATUS=429 の場合。Retry-After 付き）"},
+    503: {"description": "処理待ちが上限に達している（Retry-After 付き）"},
+    504: {"description": "処理期限（X-Request-Timeout-Ms）までに完了しなかった"},
+}
+
+# Accept で MessagePack を指定した場合の応答（OpenAPI 用。スキーマは JSON と同じ）
+_MSGPACK_CONTENT: dict[str, Any] = {MSGPACK: {}}
+
+
+async def _run_masker(request: Request, method: str, **kwargs: Any) -> Any:
+    """
+    app.state の実行器経由で Masker を呼び出す。
+    - 実行器が無い場合（テストで差し替えた場合など）は app.state.masker を直接呼ぶ
+    """
+    masker = getattr(request.app.state, "masker", None)
+    executor = getattr(request.app.state, "mask_executor", None)
+    if executor is None:
+        return getattr(masker, method)(**kwargs)
+    return await executor.run(masker, method, **kwargs)
+
+
+async def _mask_one(request: Request, **kwargs: Any) -> Any:
+    """
+    1件の mask 呼び出し。
+    - MASK_PARALLEL_MIN_CHARS 以上の文書は、文境界で分けた NER を実行器のワーカへ並列に投入する
+    - マイクロバッチが有効なら並行する他の要求とまとめて処理する
+    """
+    settings = _settings(request)
+    executor = getattr(request.app.state, "mask_executor", None)
+    if (
+        settings.parallel_min_chars > 0
+        and len(kwargs["text"]) >= settings.parallel_min_chars
+        and executor is not None
+        and executor.mode != "inline"
+        and executor.max_workers > 1
+    ):
+
+        async def run(method: str, **kw: Any) -> Any:
+            return await _run_masker(request, method, **kw)
+
+        return await mask_parallel(
+            run,
+            workers=executor.max_workers,
+            max_chunk_chars=settings.parallel_chunk_chars,
+            window_chars=settings.ner_window_chars,
+            **kwargs,
+        )
+    batcher = getattr(request.app.state, "mask_batcher", None)
+    if batcher is None:
+        return await _run_masker(request, "mask", **kwargs)
+    return await batcher.submit(kwargs)
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    リクエスト本文を読みながら応答する StreamingResponse。
+    - 既定実装は切断検知のため receive() を並行して呼ぶが、本文の受信と競合するため行わない
+    - 切断は本文読み込み側（request.stream() の ClientDisconnect）で検知する
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: ARG002
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class _TrailerStreamingResponse(_DuplexStreamingResponse):
+    """
+    本文の後に HTTP トレーラを送る _DuplexStreamingResponse。
+    - trailers: 本文を出し終えた後に呼び、トレーラ（名前 -> 値。ASCII）を返す関数。None ならトレーラを送らない
+    - サーバが ASGI の http.response.trailers 拡張に対応している場合のみ渡すこと（_accepts_trailers）
+    """
+
+    def __init__(self, content: AsyncIterator[str], trailers: Callable[[], dict[str, str]] | None, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.trailers = trailers
+
+    async def stream_response(self, send: Send) -> None:
+        if self.trailers is None:
+            await super().stream_response(send)
+            return
+        await send(
+            {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers, "trailers": True}
+        )
+        async for chunk in self.body_iterator:
+            data = chunk if isinstance(chunk, bytes) else chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in self.trailers().items()]
+        await send({"type": "http.response.trailers", "headers": headers, "more_trailers": False})
+
+
+def _accepts_trailers(request: Request) -> bool:
+    """サーバがトレーラ送信（ASGI 拡張）に対応し、クライアントが TE: trailers を送ったか。"""
+    te = {v.strip().lower() for v in request.headers.get("te", "").split(",")}
+    return "http.response.trailers" in request.scope.get("extensions", {}) and "trailers" in te
+
+
+def _access_log(request: Request) -> AccessLogChannel | None:
+    """アクセスログへ要約値を渡すチャネル（ミドルウェア未登録なら None）。"""
+    return getattr(request.state, "access_log", None)
+
+
+def _settings(request: Request) -> Settings:
+    return getattr(request.app.state, "settings", None) or Settings()
+
+
+def _deadline(request: Request) -> float | None:
+    """
+    処理期限（time.time() の絶対時刻）を求める。
+    - X-Request-Timeout-Ms と MASK_REQUEST_TIMEOUT_MS のうち短い方（どちらも無ければ None）
+    """
+    timeouts = []
+    raw = request.headers.get(TIMEOUT_HEADER)
+    if raw is not None:
+        try:
+            value = float(raw)
+        except ValueError:
+            value = 0.0
+        if not value > 0:
+            raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} は正の数（ミリ秒）で指定してください")
+        timeouts.append(value)
+    if _settings(request).request_timeout_ms > 0:
+        timeouts.append(_settings(request).request_timeout_ms)
+    return time.time() + min(timeouts) / 1000 if timeouts else None
+
+
+def _deadline_kwargs(deadline: float | None) -> dict[str, Any]:
+    """Masker へ渡す deadline 引数（期限なしの場合は渡さない）。"""
+    return {} if deadline is None else {"deadline": deadline}
+
+
+@contextmanager
+def _admitted(request: Request, chars: int, force: bool = False) -> Iterator[None]:
+    """
+    受付制御（app.state.admission）で chars 文字分を確保し、処理後に解放する。
+    - 上限を超える場合は MASK_QUEUE_REJECT_STATUS（503/429）+ Retry-After
+    """
+    admission = getattr(request.app.state, "admission", None)
+    if admission is None:
+        yield
+        return
+    try:
+        admission.admit(chars, force=force)
+    except QueueFull as e:
+        raise _queue_full(request, e.retry_after) from e
+    try:
+        yield
+    finally:
+        admission.release(chars)
+
+
+def _queue_full(request: Request, retry_after: int) -> HTTPException:
+    METRICS.inc("mask_rejected_total", (("reason", "queue_full"),))
+    return HTTPException(
+        status_code=_settings(request).queue_reject_status,
+        detail="処理待ちが上限に達しています",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _reject_if_full(request: Request) -> None:
+    """本文の長さが不明な要求（ストリーミング）の受付判定。開始時に上限へ達していれば拒否する。"""
+    admission = getattr(request.app.state, "admission", None)
+    if admission is not None and admission.full():
+        raise _queue_full(request, admission.retry_after())
+
+
+def _deadline_exceeded() -> HTTPException:
+    METRICS.inc("mask_deadline_exceeded_total")
+    return HTTPException(status_code=504, detail="処理期限までに完了しませんでした")
+
+
+def _media_type(request: Request) -> str:
+    """Accept から応答の形式（JSON/MessagePack）を決める。対応できなければ 406。"""
+    try:
+        return negotiate(request.headers.get("accept"))
+    except NotAcceptable as e:
+        raise HTTPException(
+            status_code=406, detail="MessagePack で応答するには msgpack のインストールが必要です"
+        ) from e
+
+
+def _encoded(payload: dict[str, Any], media_type: str) -> Response:
+    """レスポンスモデルを経由せずに dict を直列化して返す。"""
+    return Response(encode(payload, media_type), media_type=media_type, headers={"Vary": "Accept"})
+
+
+def _to_entities(detected_spans: list[Span]) -> list[Entity]:
+    """サービスの検出スパンをレスポンスのエンティティへ変換する。"""
+    return [Entity.from_span(s) for s in detected_spans]
+
 
 @router.post(
     "",
@@ -14,60 +243,381 @@ router = APIRouter(prefix="/mask", tags=["mask"])
     description=(
         "プレーンテキストを受け取り、指定ラベルのエンティティをマスクします。"
         "文単位で解析し、検出エンティティは全文オフセットで返却します。"
+        "並行する要求はまとめて1回の NER で処理することがあります（結果は要求ごとに独立）。"
+        "処理待ちの文字数が上限を超える場合は 503（または 429）と Retry-After を返します。"
+        "X-Request-Timeout-Ms で処理期限を指定でき、期限を過ぎた処理は打ち切って 504 を返します。"
+        "output で返す項目の絞り込み（original/masked/エンティティの text）と列形式（columnar）を指定できます。"
+        "Accept: application/msgpack で MessagePack を返します（msgpack がインストールされている場合）。"
     ),
     responses={
-        200: {"description": "マスク結果"},
+        200: {"description": "マスク結果", "content": _MSGPACK_CONTENT},
         400: {"description": "入力不正"},
+        406: {"description": "MessagePack を指定したが msgpack が利用できない"},
         422: {"description": "スキーマ不正"},
         500: {"description": "内部エラー"},
+        **_ADMISSION_RESPONSES,
     },
 )
-async def mask_text(payload: MaskRequest, request: Request) -> MaskResponse:
+async def mask_text(payload: MaskRequest, request: Request) -> Response:
+    log = _access_log(request)
+    if log is not None:
+        log.set_request(payload.text)
     try:
         if not payload.text:
             raise HTTPException(status_code=400, detail="text は必須です")
 
-        masking = payload.masking
-        replacement = masking.replacement if masking and masking.replacement else "＊"
-        preserve_length = masking.preserve_length if masking is not None else True
-        fixed_length = masking.fixed_length if masking is not None else None
-
-        masker = request.app.state.masker
-        masked, detected_spans = masker.mask(
-            text=payload.text,
-            targets=payload.targets,
-            replacement=replacement,
-            preserve_length=preserve_length,
-            fixed_length=fixed_length,
-        )
+        deadline = _deadline(request)
+        media_type = _media_type(request)
 
-        # マスク後オフセットを計算（サービスからの情報は元オフセットのみ）
-        # ここでは masked 側の位置を再計算する（処理はサービスに寄せても良い）
-        # 簡易実装として、マスク適用アルゴリズムを再現せず、文字列検索で近傍を特定するのは不安定のため、
-        # サービス内で用いたマップ計算を将来公開する予定（現時点では preserve_length=True の場合は同一）
-        # 今回は preserve_length=True / fixed_length=None の既定に対しては一致、それ以外は近似として start を基準に設定
-        detected: list[Entity] = []
-        for s in detected_spans:
-            masked_start = s.start
-            masked_end = s.end
-            if fixed_length is not None:
-                masked_end = masked_start + fixed_length
-            elif not preserve_length:
-                masked_end = masked_start + len(replacement)
-            detected.append(
-                Entity(
-                    label=s.label,
-                    text=s.text,
-                    start_char=s.start,
-                    end_char=s.end,
-                    masked_start=masked_start,
-                    masked_end=masked_end,
-                )
+        with _admitted(request, len(payload.text)):
+            masked, detected_spans = await _mask_one(
+                request, **payload.mask_kwargs(), **_deadline_kwargs(deadline)
             )
-        return MaskResponse(original=payload.text, masked=masked, detected=detected)
+        if log is not None:
+            log.set_response(len(masked), len(detected_spans), masked)
+        return _encoded(payload.response_payload(masked, detected_spans), media_type)
     except HTTPException:
         raise
+    except DeadlineExceeded as e:
+        raise _deadline_exceeded() from e
     except Exception as e:  # noqa: BLE001
         # 例外はアプリロガーへ出力（PIIを含めない）
         logging.getLogger("app").exception("/mask で例外が発生しました")
         raise HTTPException(status_code=500, detail="内部エラー") from e
+
+
+def _batch_error(index: int, error: str) -> dict[str, Any]:
+    """失敗した要素の結果（MaskBatchItemResult の形）。"""
+    return {"index": index, "result": None, "error": error}
+
+
+@router.post(
+    "/batch",
+    response_model=MaskBatchResponse,
+    summary="複数テキストをまとめてマスク",
+    description=(
+        "/mask と同じ形式のリクエストを複数受け取り、入力順に結果を返します。"
+        "全要素の文をまとめて1回の NER に流します。要素単位のエラーは error に格納し、"
+        "バッチ全体は失敗させません。受付制御は全要素の文字数の合計で判定します。"
+        "処理期限を過ぎた要素は error に「処理期限超過」を格納し、全要素が期限切れの場合は 504 を返します。"
+        "output（要素ごと）と Accept による応答形式の指定は /mask と同じです。"
+    ),
+    responses={
+        200: {"description": "要素ごとのマスク結果", "content": _MSGPACK_CONTENT},
+        400: {"description": "入力不正（件数超過など）"},
+        406: {"description": "MessagePack を指定したが msgpack が利用できない"},
+        422: {"description": "スキーマ不正"},
+        500: {"description": "内部エラー"},
+        **_ADMISSION_RESPONSES,
+    },
+)
+async def mask_batch(payload: MaskBatchRequest, request: Request) -> Response:
+    try:
+        max_items = _settings(request).batch_max_items
+        if len(payload.items) > max_items:
+            raise HTTPException(status_code=400, detail=f"items は最大 {max_items} 件です")
+        deadline = _deadline(request)
+        media_type = _media_type(request)
+
+        # MaskBatchItemResult と同じ形の dict（要素ごとのモデルは作らない）
+        results: list[dict[str, Any] | None] = [None] * len(payload.items)
+        indexes: list[int] = []
+        jobs: list[dict[str, Any]] = []
+        for i, item in enumerate(payload.items):
+            if not item.text:
+                results[i] = _batch_error(i, "text は必須です")
+                continue
+            indexes.append(i)
+            jobs.append({**item.mask_kwargs(), **_deadline_kwargs(deadline)})
+
+        outputs: list[Any] = []
+        if jobs:
+            with _admitted(request, sum(len(job["text"]) for job in jobs)):
+                outputs = await _run_masker(request, "mask_many", items=jobs)
+        if outputs and all(isinstance(out, DeadlineExceeded) for out in outputs):
+            raise _deadline_exceeded()
+        for i, out in zip(indexes, outputs, strict=True):
+            if isinstance(out, DeadlineExceeded):
+                results[i] = _batch_error(i, "処理期限超過")
+                continue
+            if isinstance(out, Exception):
+                # 要素単位の失敗は種別のみ記録（PIIを含めない）
+                logging.getLogger("app").error(
+                    "/mask/batch の要素 %d で例外が発生しました: %s", i, out.__class__.__name__
+                )
+                results[i] = _batch_error(i, "内部エラー")
+                continue
+            masked, detected_spans = out
+            results[i] = {
+                "index": i,
+                "result": payload.items[i].response_payload(masked, detected_spans),
+                "error": None,
+            }
+        return _encoded({"results": [r for r in results if r is not None]}, media_type)
+    except HTTPException:
+        raise
+    except Exception as e:  # noqa: BLE001
+        logging.getLogger("app").exception("/mask/batch で例外が発生しました")
+        raise HTTPException(status_code=500, detail="内部エラー") from e
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    summary="大きなテキストをストリーミングでマスク",
+    description=(
+        "リクエスト本文（text/plain, UTF-8）を逐次読み込み、文境界で区切ったチャンクごとにマスクして"
+        " NDJSON で返します。各行は MaskStreamChunk（オフセットは全文基準）、最終行は MaskStreamSummary です。"
+        "処理途中で失敗した場合は {\"error\": ...} の行を出力して終了します。"
+        "受付制御は開始時のみ判定し（処理待ちが上限に達していれば 503/429）、以降のチャンクは拒否しません。"
+        "処理期限（X-Request-Timeout-Ms）を過ぎた場合は {\"error\": \"処理期限超過\"} の行で終了します。"
+    ),
+    responses={
+        200: {"description": "NDJSON（チャンクごとのマスク結果）", "content": {"application/x-ndjson": {}}},
+        400: {"description": "ヘッダ不正"},
+        422: {"description": "クエリ不正"},
+        429: _ADMISSION_RESPONSES[429],
+        503: _ADMISSION_RESPONSES[503],
+    },
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"text/plain": {"schema": {"type": "string"}}}}
+    },
+)
+async def mask_stream(
+    request: Request,
+    targets: Annotated[list[str] | None, Query(description="マスク対象ラベル（複数指定可）")] = None,
+    replacement: Annotated[str, Query(min_length=1, description="マスク置換に用いる文字列")] = "＊",
+    preserve_length: Annotated[bool, Query(description="マスク後も元テキスト長を維持するか")] = True,
+    fixed_length: Annotated[int | None, Query(ge=0, description="固定長でマスク（preserve_length より優先）")] = None,
+) -> StreamingResponse:
+    chunker = SentenceChunker(chunk_chars=_settings(request).stream_chunk_chars)
+    deadline = _deadline(request)
+    _reject_if_full(request)
+
+    async def _lines() -> AsyncIterator[str]:
+        masked_offset = 0
+        detected_count = 0
+
+        async def _mask_chunk(start: int, chunk: str) -> str:
+            nonlocal masked_offset, detected_count
+            with _admitted(request, len(chunk), force=True):
+                masked, detected_spans = await _run_masker(
+                    request,
+                    "mask",
+                    text=chunk,
+                    targets=targets,
+                    replacement=replacement,
+                    preserve_length=preserve_length,
+                    fixed_length=fixed_length,
+                    **_deadline_kwargs(deadline),
+                )
+            detected = _to_entities(detected_spans)
+            # チャンク内オフセットを全文基準へずらす
+            for e in detected:
+                e.start_char += start
+                e.end_char += start
+                e.masked_start += masked_offset
+                e.masked_end += masked_offset
+            line = MaskStreamChunk(
+                start=start,
+                end=start + len(chunk),
+                masked_start=masked_offset,
+                masked_end=masked_offset + len(masked),
+                masked=masked,
+                detected=detected,
+            )
+            masked_offset += len(masked)
+            detected_count += len(detected)
+            return line.model_dump_json() + "\n"
+
+        try:
+            async for data in request.stream():
+                for start, chunk in chunker.feed(data):
+                    yield await _mask_chunk(start, chunk)
+            for start, chunk in chunker.close():
+                yield await _mask_chunk(start, chunk)
+            summary = MaskStreamSummary(
+                chars=chunker.offset, masked_chars=masked_offset, detected_count=detected_count
+            )
+            log = _access_log(request)
+            if log is not None:
+                log.set_response(masked_offset, detected_count)
+            yield summary.model_dump_json() + "\n"
+        except ClientDisconnect:
+            return
+        except DeadlineExceeded:
+            METRICS.inc("mask_deadline_exceeded_total")
+            yield '{"error": "処理期限超過"}\n'
+        except Exception:  # noqa: BLE001
+            # ステータスは送信済みのため、エラー行を出して終了する（PIIを含めない）
+            logging.getLogger("app").exception("/mask/stream で例外が発生しました")
+            yield '{"error": "内部エラー"}\n'
+
+    return _DuplexStreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+# /mask/csv のトレーラ（列ごとの検出件数は列名=件数 の application/x-www-form-urlencoded 形式）
+_CSV_TRAILERS: tuple[str, ...] = ("X-Mask-Rows", "X-Mask-Detected", "X-Mask-Detected-Count")
+
+
+@router.post(
+    "/csv",
+    response_class=StreamingResponse,
+    summary="CSV/TSV ファイルの指定列をストリーミングでマスク",
+    description=(
+        "リクエスト本文（text/csv または text/tab-separated-values, UTF-8）を行単位で逐次読み込み、"
+        "指定列のセルをマスクした CSV/TSV（改行は \\n）を同じ形式でそのまま返します。"
+        "空行も含め、行の並びは入力と同じです。"
+        "MASK_CSV_BATCH_ROWS 行ごとのセルをまとめて1回の NER で処理するため、メモリはファイルサイズに依存しません。"
+        "サーバが HTTP トレーラに対応し、リクエストに TE: trailers がある場合は、本文の後に"
+        " X-Mask-Rows（データ行数）・X-Mask-Detected（列ごとの検出件数。`列名=件数&...`）・"
+        "X-Mask-Detected-Count（検出件数の合計）を送ります。"
+        "処理途中で失敗した場合は応答を途中で打ち切ります（チャンク転送の終端を送りません）。"
+    ),
+    responses={
+        200: {
+            "description": "マスク後の CSV/TSV（行のまとまりごとに逐次送信）",
+            "content": {"text/csv": {}, "text/tab-separated-values": {}},
+        },
+        400: {"description": "入力不正（存在しない列の指定など）"},
+        422: {"description": "クエリ不正"},
+        429: _ADMISSION_RESPONSES[429],
+        503: _ADMISSION_RESPONSES[503],
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                "text/tab-separated-values": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def mask_csv(
+    request: Request,
+    columns: Annotated[
+        list[str] | None, Query(description="マスクする列（列名または 0 始まりの列番号。複数指定可。省略時は全列）")
+    ] = None,
+    fmt: Annotated[
+        Literal["csv", "tsv"] | None,
+        Query(alias="format", description="入力形式（省略時は Content-Type から判定。既定 csv）"),
+    ] = None,
+    header: Annotated[bool, Query(description="先頭行をヘッダ（列名）として扱い、マスクせずに出力するか")] = True,
+    targets: Annotated[list[str] | None, Query(description="マスク対象ラベル（複数指定可）")] = None,
+    replacement: Annotated[str, Query(min_length=1, description="マスク置換に用いる文字列")] = "＊",
+    preserve_length: Annotated[bool, Query(description="マスク後も元テキスト長を維持するか")] = True,
+    fixed_length: Annotated[int | None, Query(ge=0, description="固定長でマスク（preserve_length より優先）")] = None,
+) -> StreamingResponse:
+    if fmt is None:
+        fmt = "tsv" if "tab-separated-values" in request.headers.get("content-type", "") else "csv"
+    delimiter = DELIMITERS[fmt]
+    batch_rows = _settings(request).csv_batch_rows
+    deadline = _deadline(request)
+    _reject_if_full(request)
+
+    splitter = CsvRecordSplitter(delimiter)
+    body = request.stream().__aiter__()
+    # ヘッダ行は応答開始前に読み、列指定を検証する（存在しない列は 400）
+    pending: list[str] = []
+    header_row: list[str] | None = None
+    try:
+        if header:
+            while not pending:
+                try:
+                    pending = splitter.feed(await body.__anext__())
+                except StopAsyncIteration:
+                    pending = splitter.close()
+                    break
+            parsed = parse_records(pending[:1], delimiter)
+            header_row = parsed[0] if parsed else []
+            pending = pending[1:]
+        selected = resolve_columns(columns, header_row)
+    except CsvFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    names = header_row or []
+
+    def _name(col: int) -> str:
+        return names[col] if col < len(names) else str(col)
+
+    totals: dict[str, int] = {}
+    rows_done = 0
+
+    async def _mask_rows(records: list[str]) -> str:
+        nonlocal rows_done
+        rows = parse_records(records, delimiter)
+        refs: list[tuple[int, int]] = []
+        jobs: list[dict[str, Any]] = []
+        for r, row in enumerate(rows):
+            for c in selected if selected is not None else range(len(row)):
+                if c < len(row) and row[c]:
+                    refs.append((r, c))
+                    jobs.append(
+                        {
+                            "text": row[c],
+                            "targets": targets,
+                            "replacement": replacement,
+                            "preserve_length": preserve_length,
+                            "fixed_length": fixed_length,
+                            **_deadline_kwargs(deadline),
+                        }
+                    )
+        outputs: list[Any] = []
+        if jobs:
+            with _admitted(request, sum(len(job["text"]) for job in jobs), force=True):
+                outputs = await _run_masker(request, "mask_many", items=jobs)
+        for (r, c), out in zip(refs, outputs, strict=True):
+            if isinstance(out, Exception):
+                raise out
+            rows[r][c] = out[0]
+            if out[1]:
+                name = _name(c)
+                totals[name] = totals.get(name, 0) + len(out[1])
+        rows_done += len(rows)
+        return write_rows(rows, delimiter)
+
+    async def _chunks() -> AsyncIterator[str]:
+        masked_chars = 0
+        try:
+            if header_row is not None:
+                text = write_rows([header_row], delimiter)
+                masked_chars += len(text)
+                yield text
+            batch = list(pending)
+            async for data in body:
+                batch.extend(splitter.feed(data))
+                while len(batch) >= batch_rows:
+                    text = await _mask_rows(batch[:batch_rows])
+                    del batch[:batch_rows]
+                    masked_chars += len(text)
+                    yield text
+            batch.extend(splitter.close())
+            while batch:
+                text = await _mask_rows(batch[:batch_rows])
+                del batch[:batch_rows]
+                masked_chars += len(text)
+                yield text
+            log = _access_log(request)
+            if log is not None:
+                log.set_response(masked_chars, sum(totals.values()))
+        except ClientDisconnect:
+            return
+        except DeadlineExceeded:
+            # ステータスは送信済みのため、応答を途中で打ち切って失敗を伝える
+            METRICS.inc("mask_deadline_exceeded_total")
+            raise
+
+    def _trailers() -> dict[str, str]:
+        return {
+            "X-Mask-Rows": str(rows_done),
+            "X-Mask-Detected": urlencode(totals),
+            "X-Mask-Detected-Count": str(sum(totals.values())),
+        }
+
+    trailers = _accepts_trailers(request)
+    return _TrailerStreamingResponse(
+        _chunks(),
+        _trailers if trailers else None,
+        media_type="text/tab-separated-values" if fmt == "tsv" else "text/csv",
+        headers={"Trailer": ", ".join(_CSV_TRAILERS)} if trailers else None,
+    )
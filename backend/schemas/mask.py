@@ -1,16 +1,41 @@
-from typing import Optional  # noqa: F401 - 互換注釈のための残置（型の説明で使用）
+from typing import Any, Literal, Optional  # noqa: F401 - 互換注釈のための残置（型の説明で使用）
 
 from pydantic import BaseModel, ConfigDict, Field
 
 
 class Entity(BaseModel):
     label: str
-    text: str
+    text: str | None = Field(
+        default=None, description="検出箇所の元テキスト（output.include_entity_text=false の場合は省略）"
+    )
     start_char: int
     end_char: int
     masked_start: int
     masked_end: int
 
+    @classmethod
+    def from_span(cls, span: Any) -> "Entity":
+        """Masker の検出スパン（backend.services.masker.Span）から変換する（マスク後オフセットは算出済み）。"""
+        return cls(
+            label=span.label,
+            text=span.text,
+            start_char=span.start,
+            end_char=span.end,
+            masked_start=span.masked_start,
+            masked_end=span.masked_end,
+        )
+
+
+class DetectedColumns(BaseModel):
+    """検出エンティティの列形式（各配列の i 番目が i 番目のエンティティ）。"""
+
+    label: list[str]
+    start_char: list[int]
+    end_char: list[int]
+    masked_start: list[int]
+    masked_end: list[int]
+    text: list[str] | None = Field(default=None, description="output.include_entity_text=false の場合は省略")
+
 
 class MaskRequest(BaseModel):
     text: str
@@ -44,6 +69,85 @@ class MaskRequest(BaseModel):
         default=None, description="マスク方法のオプション"
     )
 
+    # レスポンスの形式（返す項目の絞り込み・検出エンティティの列形式）
+    class OutputOptions(BaseModel):
+        include_original: bool = Field(default=True, description="original（入力テキスト）を返すか")
+        include_masked: bool = Field(default=True, description="masked（マスク後テキスト）を返すか")
+        include_entity_text: bool = Field(default=True, description="検出エンティティの text を返すか")
+        format: Literal["entities", "columnar"] = Field(
+            default="entities",
+            description=(
+                "検出エンティティの形式。entities は detected（オブジェクトの配列）、"
+                "columnar は detected_columns（ラベル・オフセットの並列配列）"
+            ),
+        )
+
+        def payload(self, original: str, masked: str, spans: list[Any]) -> dict[str, Any]:
+            """
+            MaskResponse と同じ形の dict を作る（エンティティごとの Pydantic モデルは作らない）。
+            spans: Masker の検出スパン（backend.services.masker.Span）
+            """
+            out: dict[str, Any] = {}
+            if self.include_original:
+                out["original"] = original
+            if self.include_masked:
+                out["masked"] = masked
+            text = self.include_entity_text
+            if self.format == "columnar":
+                columns: dict[str, Any] = {
+                    "label": [s.label for s in spans],
+                    "start_char": [s.start for s in spans],
+                    "end_char": [s.end for s in spans],
+                    "masked_start": [s.masked_start for s in spans],
+                    "masked_end": [s.masked_end for s in spans],
+                }
+                if text:
+                    columns["text"] = [s.text for s in spans]
+                out["detected_columns"] = columns
+            elif text:
+                out["detected"] = [
+                    {
+                        "label": s.label,
+                        "text": s.text,
+                        "start_char": s.start,
+                        "end_char": s.end,
+                        "masked_start": s.masked_start,
+                        "masked_end": s.masked_end,
+                    }
+                    for s in spans
+                ]
+            else:
+                out["detected"] = [
+                    {
+                        "label": s.label,
+                        "start_char": s.start,
+                        "end_char": s.end,
+                        "masked_start": s.masked_start,
+                        "masked_end": s.masked_end,
+                    }
+                    for s in spans
+                ]
+            return out
+
+    output: OutputOptions | None = Field(
+        default=None, description="レスポンスの形式のオプション（省略時は全項目を entities 形式で返す）"
+    )
+
+    def mask_kwargs(self) -> dict[str, Any]:
+        """Masker.mask のキーワード引数へ正規化する（API と一括処理 CLI で共通）。"""
+        masking = self.masking
+        return {
+            "text": self.text,
+            "targets": self.targets,
+            "replacement": masking.replacement if masking and masking.replacement else "＊",
+            "preserve_length": masking.preserve_length if masking is not None else True,
+            "fixed_length": masking.fixed_length if masking is not None else None,
+        }
+
+    def response_payload(self, masked: str, spans: list[Any]) -> dict[str, Any]:
+        """output の指定に従ったレスポンス（MaskResponse の形の dict）。API と一括処理 CLI で共通。"""
+        return (self.output or _DEFAULT_OUTPUT).payload(self.text, masked, spans)
+
     # Pydantic v2 設定
     model_config = ConfigDict(
         json_schema_extra={
@@ -64,9 +168,14 @@ class MaskRequest(BaseModel):
 
 
 class MaskResponse(BaseModel):
-    original: str
-    masked: str
-    detected: list[Entity]
+    original: str | None = Field(default=None, description="入力テキスト（output.include_original=false の場合は省略）")
+    masked: str | None = Field(default=None, description="マスク後テキスト（output.include_masked=false の場合は省略）")
+    detected: list[Entity] | None = Field(
+        default=None, description="検出エンティティ（output.format=columnar の場合は省略）"
+    )
+    detected_columns: DetectedColumns | None = Field(
+        default=None, description="検出エンティティの列形式（output.format=columnar の場合のみ）"
+    )
 
     # Pydantic v2 設定
     model_config = ConfigDict(
@@ -95,3 +204,55 @@ class MaskResponse(BaseModel):
             }
         }
     )
+
+
+_DEFAULT_OUTPUT = MaskRequest.OutputOptions()
+
+
+class MaskBatchRequest(BaseModel):
+    items: list[MaskRequest] = Field(
+        min_length=1,
+        description="マスク対象の一覧（各要素は /mask のリクエストと同じ形式）",
+    )
+
+    # Pydantic v2 設定
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "items": [
+                    {"text": "太郎のメールは taro@example.com です。", "targets": ["PERSON", "EMAIL"]},
+                    {"text": "電話は 03-1234-5678 まで。", "masking": {"replacement": "#"}},
+                ]
+            }
+        }
+    )
+
+
+class MaskBatchItemResult(BaseModel):
+    index: int = Field(description="リクエストの items における位置")
+    result: MaskResponse | None = Field(default=None, description="成功時のマスク結果")
+    error: str | None = Field(default=None, description="失敗時のエラー内容（PII を含まない）")
+
+
+class MaskBatchResponse(BaseModel):
+    results: list[MaskBatchItemResult] = Field(description="items と同じ順序の処理結果")
+
+
+class MaskStreamChunk(BaseModel):
+    """/mask/stream が NDJSON の1行として返すチャンク結果（オフセットは全文基準）。"""
+
+    start: int = Field(description="チャンクの元テキスト上の開始位置")
+    end: int = Field(description="チャンクの元テキスト上の終了位置")
+    masked_start: int = Field(description="チャンクのマスク後テキスト上の開始位置")
+    masked_end: int = Field(description="チャンクのマスク後テキスト上の終了位置")
+    masked: str
+    detected: list[Entity]
+
+
+class MaskStreamSummary(BaseModel):
+    """/mask/stream の最終行。"""
+
+    done: bool = True
+    chars: int = Field(description="受信した元テキストの文字数")
+    masked_chars: int = Field(description="マスク後テキストの文字数")
+    detected_count: int
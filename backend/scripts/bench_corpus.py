@@ -0,0 +1,104 @@
+"""
+ベンチマーク用の合成コーパス（日本語）
+- シード固定で同じコーパスを再現します。
+- 文書長（文数）、文の長さ（読点で連結する節の数）、エンティティ密度（エンティティを含む文の割合）を
+  プロファイルで切り替えます。
+使い方（リポジトリルートで実行。生成結果の確認用）:
+    python backend/scripts/bench_corpus.py --profile medium --docs 3
+"""
+import argparse
+import random
+from dataclasses import dataclass
+
+NAMES = ["山田太郎", "佐藤花子", "鈴木一郎", "田中美咲", "高橋健太", "伊藤さくら", "渡辺翔", "中村愛"]
+PLACES = ["東京都", "大阪府", "札幌市", "福岡県", "名古屋市", "横浜市", "京都府", "仙台市"]
+ORGS = ["株式会社サンプル", "日本テスト工業", "みらい銀行", "さくら病院"]
+
+_ENTITY_CLAUSES = [
+    "{name}は{place}に住んでいます",
+    "昨日{name}から連絡がありました",
+    "{org}の{name}さんが担当します",
+    "{place}の支店で会議を行いました",
+    "連絡先は {email} です",
+    "電話番号は {phone} です",
+    "詳細は {url} を参照してください",
+]
+_PLAIN_CLAUSES = [
+    "資料は来週までに送付してください",
+    "本日の議題は予算の見直しです",
+    "天気が良いので外で昼食をとりました",
+    "次回の打ち合わせは午後に予定しています",
+    "品質の確認が完了しました",
+    "手順書の改訂版を共有します",
+]
+_ENDS = ["。", "。", "。", "！", "？"]
+
+
+@dataclass(frozen=True)
+class CorpusProfile:
+    """コーパスの形（文書あたりの文数、文あたりの節数、エンティティを含む文の割合）"""
+
+    docs: int
+    sentences: tuple[int, int]
+    clauses: tuple[int, int]
+    entity_ratio: float
+
+
+PROFILES: dict[str, CorpusProfile] = {
+    # チャット・フォーム入力程度の短文
+    "short": CorpusProfile(docs=400, sentences=(1, 3), clauses=(1, 2), entity_ratio=0.5),
+    # メール・議事録程度
+    "medium": CorpusProfile(docs=100, sentences=(10, 30), clauses=(1, 3), entity_ratio=0.3),
+    # 報告書程度の長文（長い文を含む）
+    "long": CorpusProfile(docs=10, sentences=(200, 400), clauses=(1, 6), entity_ratio=0.2),
+    # 名簿・問い合わせログのようにエンティティが密な文書
+    "dense": CorpusProfile(docs=50, sentences=(20, 40), clauses=(2, 4), entity_ratio=0.9),
+}
+
+
+def _clause(rng: random.Random, with_entity: bool, index: int) -> str:
+    if not with_entity:
+        return rng.choice(_PLAIN_CLAUSES)
+    return rng.choice(_ENTITY_CLAUSES).format(
+        name=rng.choice(NAMES),
+        place=rng.choice(PLACES),
+        org=rng.choice(ORGS),
+        email=f"user{index}@example.com",
+        phone=f"03-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        url=f"https://example.com/docs/{index}",
+    )
+
+
+def generate(profile: CorpusProfile, seed: int) -> list[str]:
+    """プロファイルに従って文書のリストを生成する（同じシードなら同じ結果）。"""
+    rng = random.Random(seed)
+    docs: list[str] = []
+    index = 0
+    for _ in range(profile.docs):
+        sentences: list[str] = []
+        for _ in range(rng.randint(*profile.sentences)):
+            clauses: list[str] = []
+            for _ in range(rng.randint(*profile.clauses)):
+                index += 1
+                clauses.append(_clause(rng, rng.random() < profile.entity_ratio, index))
+            sentences.append("、".join(clauses) + rng.choice(_ENDS))
+        docs.append("".join(sentences))
+    return docs
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成コーパスを出力します")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="medium", help="プロファイル (default: medium)")
+    parser.add_argument("--docs", type=int, default=3, help="出力する文書数 (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (default: 0)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    for doc in generate(PROFILES[args.profile], args.seed)[: args.docs]:
+        print(doc)
+
+
+if __name__ == "__main__":
+    main()
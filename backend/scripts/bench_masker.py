@@ -0,0 +1,181 @@
+"""
+マスク処理（Masker.mask）のベンチマーク
+- bench_corpus の合成コーパス（シード固定）をプロファイルごとに処理し、スループットを計測します。
+- stub: NER を正規表現の簡易スタブに置き換え、Python 側の処理（文分割・キャッシュ・補完・描画）のみを計測
+- real: 実モデル（ja_ginza）で計測
+- 処理段ごとの所要時間は /metrics と同じ記録（masker_stage_seconds）から求めます。
+- ピークメモリは tracemalloc（処理中に増えた Python のヒープ）で別途1回計測します（時間には含めません）。
+  プロセス全体の最大 RSS（モデルを含む）も併せて出力します。
+- --baseline を指定すると保存済みの結果と比較し、chars/s が許容幅を超えて低下したら終了コード 1 を返します。
+使い方（リポジトリルートで実行）:
+    python backend/scripts/bench_masker.py --mode stub --baseline backend/scripts/bench_baseline.stub.json
+    python backend/scripts/bench_masker.py --mode stub --save backend/scripts/bench_baseline.stub.json
+"""
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterable, Iterator
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+from backend.scripts.bench_corpus import NAMES, ORGS, PLACES, PROFILES, generate
+from backend.services.masker import Masker
+from backend.services.metrics import METRICS
+
+_STAGES = ("split", "ner", "regex", "dictionary", "merge", "render")
+
+
+class _StubNLP:
+    """コーパスの人名・地名・組織名を正規表現で返す NER スタブ（GiNZA の代替）"""
+
+    _LABELS = {**dict.fromkeys(NAMES, "Person"), **dict.fromkeys(PLACES, "GPE"), **dict.fromkeys(ORGS, "ORG")}
+    _RE = re.compile("|".join(map(re.escape, sorted(_LABELS, key=len, reverse=True))))
+
+    def pipe(self, texts: Iterable[str], **_kwargs: Any) -> Iterator[SimpleNamespace]:
+        for text in texts:
+            yield SimpleNamespace(
+                ents=[
+                    SimpleNamespace(label_=self._LABELS[m.group(0)], start_char=m.start(), end_char=m.end())
+                    for m in self._RE.finditer(text)
+                ]
+            )
+
+
+def process_rss_peak_bytes() -> int:
+    """プロセスの最大 RSS（モデルを含む全体。Linux の ru_maxrss は KiB 単位）。"""
+    import resource  # Windows には無いため局所import
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build_masker(mode: str, model: str, cache_size: int) -> Masker:
+    if mode == "stub":
+        with mock.patch("spacy.load", return_value=_StubNLP()):
+            return Masker(model_name=model, cache_size=cache_size)
+    return Masker(model_name=model, cache_size=cache_size)
+
+
+def _stage_seconds() -> dict[str, float]:
+    """masker_stage_seconds の段ごとの合計（秒）。"""
+    hist = METRICS.snapshot().hist
+    return {s: hist.get(("masker_stage_seconds", (("stage", s),)), [0.0, 0.0])[-2] for s in _STAGES}
+
+
+def run_profile(masker: Masker, docs: list[str], repeat: int) -> dict[str, Any]:
+    """コーパスを repeat 回処理し、最速回の結果を返す。"""
+    chars = sum(len(d) for d in docs)
+    masker.mask(docs[0])  # ウォームアップ（遅延初期化を計測から除外）
+    best: dict[str, Any] | None = None
+    for _ in range(repeat):
+        before = _stage_seconds()
+        entities = 0
+        t0 = time.perf_counter()
+        for doc in docs:
+            entities += len(masker.mask(doc)[1])
+        seconds = time.perf_counter() - t0
+        after = _stage_seconds()
+        if best is None or seconds < best["seconds"]:
+            best = {
+                "docs": len(docs),
+                "chars": chars,
+                "entities": entities,
+                "seconds": round(seconds, 4),
+                "docs_per_s": round(len(docs) / seconds, 1),
+                "chars_per_s": round(chars / seconds),
+                "stages_ms": {s: round((after[s] - before[s]) * 1000, 2) for s in _STAGES},
+            }
+    assert best is not None
+
+    tracemalloc.start()
+    for doc in docs:
+        masker.mask(doc)
+    best["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    tracemalloc.stop()
+    return best
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> bool:
+    """chars/s をベースラインと比較して表示する。許容幅を超える低下があれば False。"""
+    ok = True
+    for name, cur in results["profiles"].items():
+        base = baseline.get("profiles", {}).get(name)
+        if base is None:
+            print(f"[{name}] ベースラインなし")
+            continue
+        ratio = cur["chars_per_s"] / base["chars_per_s"]
+        status = "OK"
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+            ok = False
+        print(f"[{name}] chars/s {base['chars_per_s']} -> {cur['chars_per_s']} (x{ratio:.2f}) {status}")
+        for stage in _STAGES:
+            b, c = base["stages_ms"].get(stage, 0.0), cur["stages_ms"][stage]
+            if b > 0:
+                print(f"    {stage:<10} {b:>9.1f} ms -> {c:>9.1f} ms (x{c / b:.2f})")
+    return ok
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Masker.mask のスループットを計測します")
+    parser.add_argument("--mode", choices=["stub", "real"], default="stub", help="NER の実行方式 (default: stub)")
+    parser.add_argument("--model", default="ja_ginza", help="spaCy モデル名 (default: ja_ginza)")
+    parser.add_argument(
+        "--profile", action="append", choices=sorted(PROFILES), help="計測するプロファイル（複数可。既定: 全て）"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速回を採用） (default: 3)")
+    parser.add_argument("--cache-size", type=int, default=0, help="NER キャッシュの件数 (default: 0 = 無効)")
+    parser.add_argument("--baseline", help="比較するベースライン JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する chars/s の低下率 (default: 0.2)")
+    parser.add_argument("--save", help="結果を JSON で保存するパス（ベースラインの更新に使用）")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    masker = build_masker(args.mode, args.model, args.cache_size)
+    results: dict[str, Any] = {
+        "meta": {
+            "mode": args.mode,
+            "model": args.model if args.mode == "real" else None,
+            "seed": args.seed,
+            "cache_size": args.cache_size,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "profiles": {},
+    }
+    for name in args.profile or sorted(PROFILES):
+        res = run_profile(masker, generate(PROFILES[name], args.seed), args.repeat)
+        results["profiles"][name] = res
+        stages = " ".join(f"{s}={v:.1f}" for s, v in res["stages_ms"].items())
+        print(
+            f"[{name}] docs={res['docs']} chars={res['chars']} entities={res['entities']} "
+            f"{res['docs_per_s']} docs/s {res['chars_per_s']} chars/s peak={res['peak_mem_mb']} MB"
+        )
+        print(f"    stages(ms): {stages}")
+
+    results["meta"]["max_rss_mb"] = round(process_rss_peak_bytes() / 2**20, 1)
+    print(f"max RSS: {results['meta']['max_rss_mb']} MB")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"saved: {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("mode") != args.mode:
+            print("警告: ベースラインと実行方式が異なります")
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+マスク後オフセット計算のベンチマーク
+- 従来方式（検出スパンごとにマージ後スパンを全走査する O(d·m)）と、
+  描画時に記録した差分表から求める現行方式（Masker._apply）を比較します。
+- エンティティを大量に含む文書（正規表現で検出される EMAIL/PHONE）で計測し、両方式の結果の一致も確認します。
+使い方（リポジトリルートで実行）:
+    python backend/scripts/bench_offsets.py --entities 5000 --fixed-length 3
+"""
+import argparse
+import random
+import time
+
+from backend.services.masker import Masker, Span
+from backend.services.spans import SpanArrays
+
+
+def build_document(entities: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts: list[str] = []
+    for i in range(entities):
+        if rng.random() < 0.5:
+            parts.append(f"担当 user{i}@example.com まで。")
+        else:
+            parts.append(f"電話 03-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)} へ。")
+    return "".join(parts)
+
+
+def legacy_offsets(text: str, masked_offset_map: list[tuple[int, int, int]], s: Span) -> tuple[int, int]:
+    """従来方式: マージ後スパン (orig_start, orig_end, masked_len) を先頭から走査する。"""
+    masked_cursor = 0
+    orig_cursor = 0
+    masked_start = None
+    masked_end = None
+    for m_start, m_end, m_len in masked_offset_map:
+        if orig_cursor < m_start:
+            if orig_cursor <= s.start < m_start and masked_start is None:
+                masked_start = masked_cursor + (s.start - orig_cursor)
+            if orig_cursor < s.end <= m_start and masked_end is None:
+                masked_end = masked_cursor + (s.end - orig_cursor)
+            masked_cursor += m_start - orig_cursor
+            orig_cursor = m_start
+        if m_start <= s.start < m_end and masked_start is None:
+            masked_start = masked_cursor
+        if m_start < s.end <= m_end and masked_end is None:
+            masked_end = masked_cursor + m_len
+        masked_cursor += m_len
+        orig_cursor = m_end
+    if orig_cursor < len(text):
+        if masked_start is None and s.start >= orig_cursor:
+            masked_start = masked_cursor + (s.start - orig_cursor)
+        if masked_end is None and s.end >= orig_cursor:
+            masked_end = masked_cursor + (s.end - orig_cursor)
+    if masked_start is None:
+        masked_start = s.start
+    if masked_end is None:
+        masked_end = masked_start
+    return masked_start, masked_end
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="マスク後オフセット計算の効果を計測します")
+    parser.add_argument("--model", default="ja_ginza", help="spaCy モデル名 (default: ja_ginza)")
+    parser.add_argument("--entities", type=int, default=5000, help="文書あたりのエンティティ数 (default: 5000)")
+    parser.add_argument("--fixed-length", type=int, default=3, help="マスクの固定長 (default: 3)")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数 (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード (default: 0)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    masker = Masker(model_name=args.model, cache_size=0)
+    text = build_document(args.entities, args.seed)
+    allow_set = {"EMAIL", "PHONE"}
+
+    def best_of(fn):
+        best = float("inf")
+        result = None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - t0)
+        return best, result
+
+    # NER を除いた後段（正規表現補完・マージ・描画・オフセット計算）のみを計測する
+    t_new, (masked, detected) = best_of(
+        lambda: masker._apply(text, [], allow_set, "*", True, args.fixed_length)
+    )
+    starts, ends = (a.tolist() for a in SpanArrays.from_triples([(s.start, s.end, s.label) for s in detected]).merged())
+    offset_map = [(m_start, m_end, args.fixed_length) for m_start, m_end in zip(starts, ends, strict=True)]
+    t_old, old = best_of(lambda: [legacy_offsets(text, offset_map, s) for s in detected])
+
+    assert old == [(s.masked_start, s.masked_end) for s in detected], "従来方式と結果が一致しません"
+    print(f"chars={len(text)} entities={len(detected)} masked_chars={len(masked)}")
+    print(f"legacy O(d*m) offsets only: {t_old * 1000:.1f} ms")
+    print(f"_apply (render + offsets): {t_new * 1000:.1f} ms")
+    print(f"speedup: x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
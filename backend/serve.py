@@ -0,0 +1,318 @@
+"""
+pre-fork 方式の起動（python -m backend.serve）
+
+- 親プロセスで Masker（spaCy モデル）を1回だけロードしてから、ワーカプロセスを fork する
+  - ワーカはモデルのページを親プロセスと共有する（書き込まれたページのみ複製される）
+  - ウォームアップ（MASK_WARMUP_ROUNDS）も親で済ませるため、ワーカは起動直後から /ready が 200 になる
+  - fork 前に gc.freeze() し、ワーカの GC がモデルのオブジェクト（GC ヘッダ）へ書き込んで
+    ページが複製されるのを防ぐ（参照カウントの更新による複製は避けられない）
+- 親プロセスはリクエストを処理せず、ワーカの監視のみ行う
+  - ワーカが終了したら（異常終了・MASK_SERVE_MAX_REQUESTS 到達）補充する
+  - SIGTERM/SIGINT: 全ワーカへ SIGTERM を送り、処理中リクエストの完了を待って終了
+    （MASK_SERVE_GRACEFUL_TIMEOUT 秒を超えたワーカは SIGKILL）
+  - SIGHUP: 新しいワーカを起動してから旧ワーカを停止する（モデルは再ロードしない）
+  - SIGTTIN/SIGTTOU: ワーカを1つ増やす/減らす
+  - SIGUSR1: 親と各ワーカのメモリ内訳（RSS/PSS/固有/共有）をログに出す
+- MASK_EXECUTOR=inline はワーカのイベントループ上で、thread（既定）は実行器のワーカ1つで共有の Masker を使う
+  （thread でも MASK_WORKERS は無視され、モデルは再ロードしない）。process は共有できないため起動を拒否する
+
+使い方（リポジトリルートで実行）:
+    python -m backend.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, NoReturn
+
+from backend.services.metrics import process_memory
+from backend.settings import Settings
+
+if TYPE_CHECKING:
+    from backend.services.masker import Masker
+
+logger = logging.getLogger("app.serve")
+
+_MB = 2**20
+
+
+class PreforkSupervisor:
+    """ワーカプロセスを fork して監視する（親プロセス側）。"""
+
+    SIGNALS: tuple[signal.Signals, ...] = (
+        signal.SIGTERM,
+        signal.SIGINT,
+        signal.SIGHUP,
+        signal.SIGTTIN,
+        signal.SIGTTOU,
+        signal.SIGUSR1,
+    )
+    # 異常終了したワーカを補充するまでの最小間隔（起動直後に落ち続ける場合の空回り防止）
+    RESPAWN_BACKOFF: float = 1.0
+
+    def __init__(
+        self,
+        target: Callable[[], None],
+        workers: int,
+        graceful_timeout: float = 30.0,
+        memory_report_interval: float = 0.0,
+        poll_interval: float = 0.2,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers は1以上を指定してください")
+        self.target = target
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.memory_report_interval = memory_report_interval
+        self.poll_interval = poll_interval
+        # 稼働中のワーカ（起動順）と、停止を指示したワーカの SIGKILL 期限
+        self.pids: dict[int, float] = {}
+        self._retiring: dict[int, float] = {}
+        self._signals: list[int] = []
+        self._stopping = False
+        self._respawn_at = 0.0
+
+    def run(self) -> None:
+        """ワーカを起動し、停止シグナルを受けて全ワーカが終了するまで監視する。"""
+        for sig in self.SIGNALS:
+            signal.signal(sig, self._on_signal)
+        logger.info("prefork master started: pid=%d workers=%d", os.getpid(), self.workers)
+        next_report = time.monotonic() + self.memory_report_interval
+        while not (self._stopping and not self.pids):
+            self._tick()
+            if self.memory_report_interval > 0 and time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.memory_report_interval
+                self.report_memory()
+            time.sleep(self.poll_interval)
+        logger.info("prefork master stopped: pid=%d", os.getpid())
+
+    def _on_signal(self, signum: int, _frame: object) -> None:
+        # ハンドラ内では記録のみ行い、処理は監視ループで行う
+        self._signals.append(signum)
+
+    def _tick(self) -> None:
+        while self._signals:
+            self._handle_signal(self._signals.pop(0))
+        self._reap()
+        now = time.monotonic()
+        for pid, deadline in list(self._retiring.items()):
+            if now >= deadline:
+                logger.warning("worker did not stop in time, killing: pid=%d", pid)
+                self._kill(pid, signal.SIGKILL)
+                self._retiring[pid] = float("inf")
+        if self._stopping:
+            return
+        active = [pid for pid in self.pids if pid not in self._retiring]
+        if len(active) < self.workers and now >= self._respawn_at:
+            for _ in range(self.workers - len(active)):
+                self.spawn()
+        for pid in active[: max(0, len(active) - self.workers)]:
+            self._retire(pid)
+
+    def _handle_signal(self, signum: int) -> None:
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            if not self._stopping:
+                logger.info("prefork master stopping: workers=%d", len(self.pids))
+                self._stopping = True
+                for pid in list(self.pids):
+                    self._retire(pid)
+        elif signum == signal.SIGHUP and not self._stopping:
+            # 先に新ワーカを起動し、受付を止めないまま旧ワーカを停止する
+            old = [pid for pid in self.pids if pid not in self._retiring]
+            logger.info("rolling restart: workers=%d", len(old))
+            for pid in old:
+                self.spawn()
+                self._retire(pid)
+        elif signum == signal.SIGTTIN:
+            self.workers += 1
+            logger.info("workers increased: %d", self.workers)
+        elif signum == signal.SIGTTOU and self.workers > 1:
+            self.workers -= 1
+            logger.info("workers decreased: %d", self.workers)
+        elif signum == signal.SIGUSR1:
+            self.report_memory()
+
+    def spawn(self) -> int:
+        """ワーカを1つ fork する。"""
+        pid = os.fork()
+        if pid == 0:
+            self._run_child()
+        self.pids[pid] = time.monotonic()
+        logger.info("worker started: pid=%d", pid)
+        return pid
+
+    def _run_child(self) -> NoReturn:
+        status = 0
+        try:
+            for sig in self.SIGNALS:
+                signal.signal(sig, signal.SIG_DFL)
+            gc.enable()
+            self.target()
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:  # noqa: BLE001
+            logger.exception("worker failed: pid=%d", os.getpid())
+            status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        # 親プロセスから引き継いだ atexit 処理などを走らせないよう os._exit で終了する
+        os._exit(status)
+
+    def _retire(self, pid: int) -> None:
+        """ワーカへ停止（処理中リクエストの完了後に終了）を指示する。"""
+        if pid in self._retiring:
+            return
+        self._retiring[pid] = time.monotonic() + self.graceful_timeout
+        self._kill(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _kill(pid: int, sig: signal.Signals) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self) -> None:
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.pids.pop(pid, None)
+            retired = self._retiring.pop(pid, None) is not None
+            code = os.waitstatus_to_exitcode(status)
+            if retired or code == 0:
+                logger.info("worker stopped: pid=%d exit=%d", pid, code)
+            else:
+                logger.warning("worker exited unexpectedly: pid=%d exit=%d", pid, code)
+                self._respawn_at = time.monotonic() + self.RESPAWN_BACKOFF
+
+    def report_memory(self) -> None:
+        """親と各ワーカのメモリ内訳をログに出す（ホストのメモリ見積もり用）。"""
+        total_pss = 0
+        for role, pid in [("master", os.getpid()), *(("worker", p) for p in self.pids)]:
+            memory = process_memory(pid)
+            if memory is None:
+                logger.info("memory report unavailable: pid=%d (requires /proc/<pid>/smaps_rollup)", pid)
+                continue
+            total_pss += memory["pss"]
+            logger.info(
+                "memory: role=%s pid=%d rss=%.1fMB pss=%.1fMB unique=%.1fMB shared=%.1fMB",
+                role,
+                pid,
+                memory["rss"] / _MB,
+                memory["pss"] / _MB,
+                memory["unique"] / _MB,
+                memory["shared"] / _MB,
+            )
+        logger.info("memory total: pss=%.1fMB workers=%d", total_pss / _MB, len(self.pids))
+
+
+def parse_args(settings: Settings) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="モデルを共有する pre-fork 方式で API を起動します")
+    parser.add_argument("--host", default="0.0.0.0", help="待ち受けアドレス (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8000, help="待ち受けポート (default: 8000)")
+    parser.add_argument(
+        "--workers", type=int, default=settings.serve_workers, help="ワーカ数 (default: MASK_SERVE_WORKERS)"
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=settings.serve_max_requests,
+        help="ワーカを入れ替えるまでのリクエスト数 (default: MASK_SERVE_MAX_REQUESTS)",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=settings.serve_graceful_timeout,
+        help="停止時に処理中リクエストを待つ秒数 (default: MASK_SERVE_GRACEFUL_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--memory-report-interval",
+        type=float,
+        default=0.0,
+        help="メモリ内訳をログに出す間隔（秒。0 で SIGUSR1 受信時のみ） (default: 0)",
+    )
+    return parser.parse_args()
+
+
+def preload_masker(settings: Settings) -> Masker:
+    """
+    fork 前に親プロセスで Masker をロードし、ウォームアップまで済ませる。
+    - ワーカでは app.state.preloaded_masker として共有される（inline はそのまま、thread は実行器のワーカ1つで使う）
+    - process の実行器はワーカプロセスで自前にロードするため共有できず、起動を拒否する
+    """
+    if settings.executor_mode == "process":
+        raise SystemExit(
+            "MASK_EXECUTOR=process は pre-fork 起動では使えません（モデルを共有できないため）。"
+            "inline か thread を指定してください"
+        )
+    from backend.services.masker import Masker
+
+    t0 = time.perf_counter()
+    masker = Masker(**settings.masker_kwargs())
+    if masker.dictionary is not None:
+        # 親プロセスでは辞書を監視しない（各ワーカが after_fork で監視を始める）
+        masker.dictionary.close()
+    # ウォームアップも親で済ませ、初期化済みの状態をワーカで共有する（ワーカ側では省略される）
+    warmup_texts = settings.warmup_texts()
+    if warmup_texts:
+        masker.warm_up(warmup_texts)
+    logger.info(
+        "model preloaded: model=%s executor=%s warmed=%s seconds=%.2f",
+        masker.model_id,
+        settings.executor_mode,
+        masker.warmed,
+        time.perf_counter() - t0,
+    )
+    return masker
+
+
+def main() -> None:
+    settings = Settings.from_env()
+    args = parse_args(settings)
+    # ロード中に GC が走って空きの多いページが散らばるのを避ける（fork 前に freeze してから再開）
+    gc.disable()
+
+    import uvicorn
+
+    from backend.app import app
+
+    masker = preload_masker(settings)
+    app.state.preloaded_masker = masker
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+
+    def serve_worker() -> None:
+        masker.after_fork()
+        config = uvicorn.Config(
+            app,
+            limit_max_requests=args.max_requests or None,
+            timeout_graceful_shutdown=args.graceful_timeout or None,
+        )
+        uvicorn.Server(config).run(sockets=[sock])
+
+    PreforkSupervisor(
+        serve_worker,
+        workers=max(1, args.workers),
+        graceful_timeout=args.graceful_timeout,
+        memory_report_interval=args.memory_report_interval,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
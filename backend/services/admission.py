@@ -0,0 +1,73 @@
+"""
+受付制御（文字数で上限を設けた処理キュー）
+
+- 受け付けた要求の文字数の合計（待ち + 処理中）を上限 max_chars で抑える
+  - 上限を超える要求は QueueFull とし、ルーター側で 429/503 + Retry-After を返す
+  - 処理中の要求が無い場合は、上限より大きい要求でも受け付ける（永久に受け付けられない状態を避ける）
+- Retry-After は、直近の処理速度（文字/秒）で現在のキューを処理し切るまでの秒数の見積もり
+- イベントループ上でのみ呼び出す前提のためロックは取らない
+"""
+from __future__ import annotations
+
+import math
+import time
+
+
+class QueueFull(Exception):
+    """処理キューが上限に達している。retry_after: 再試行までの目安（秒）"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"queue full (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """文字数で上限を設けた受付制御。"""
+
+    # 処理速度の集計間隔（秒）と移動平均の重み
+    RATE_INTERVAL: float = 1.0
+    RATE_ALPHA: float = 0.3
+    # Retry-After の上限（秒）
+    MAX_RETRY_AFTER: int = 60
+
+    def __init__(self, max_chars: int) -> None:
+        # 0 以下で無制限（計測のみ行う）
+        self.max_chars = max_chars
+        self.chars: int = 0
+        self.requests: int = 0
+        self._rate: float | None = None
+        self._done_chars = 0
+        self._window_start = time.monotonic()
+
+    def admit(self, chars: int, force: bool = False) -> None:
+        """
+        文字数 chars の要求を受け付ける。上限を超える場合は QueueFull。
+        - force=True は上限を確認せずに計上する（応答開始後のストリームのチャンクなど）
+        """
+        if not force and self.max_chars > 0 and self.requests > 0 and self.chars + chars > self.max_chars:
+            raise QueueFull(self.retry_after())
+        self.chars += chars
+        self.requests += 1
+
+    def release(self, chars: int) -> None:
+        """受け付けた要求の処理が終わった（成功・失敗を問わず）。"""
+        self.chars -= chars
+        self.requests -= 1
+        self._done_chars += chars
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= self.RATE_INTERVAL:
+            rate = self._done_chars / elapsed
+            self._rate = rate if self._rate is None else self._rate + self.RATE_ALPHA * (rate - self._rate)
+            self._done_chars = 0
+            self._window_start = now
+
+    def full(self) -> bool:
+        """新しい要求を受け付けられない状態か（文字数が未知の要求の受付判定用）。"""
+        return self.max_chars > 0 and self.requests > 0 and self.chars >= self.max_chars
+
+    def retry_after(self) -> int:
+        """現在のキューを処理し切るまでの見積もり秒数（1〜MAX_RETRY_AFTER）。"""
+        if not self._rate:
+            return 1
+        return max(1, min(self.MAX_RETRY_AFTER, math.ceil(self.chars / self._rate)))
@@ -0,0 +1,147 @@
+"""
+/mask のマイクロバッチ処理
+
+- 並行して届いた /mask の要求をまとめ、Masker.mask_many（全要求の文を1回の nlp.pipe）で処理する
+- 結果は要求ごとの Future へ返す（要素単位の例外はその要求だけを失敗させる）
+
+待ち時間の調整:
+- 実行枠（inline: 1、thread/process: ワーカ数）に空きがあれば待たずに投入する
+  （1件だけのバッチは mask をそのまま呼ぶため、閑散時は従来と同じ）
+- 全枠が使用中の間に届いた要求はキューに溜まり、枠が空いた時点でまとめて投入する
+- 混雑時（投入時のキュー長の移動平均が 1 を超える）は、枠が空いても最大 window 秒だけ追加の要求を待つ
+  （移動平均が 2 に達するまでは比例して短く、max_items 件に達したら待たずに投入）
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from backend.services.metrics import METRICS
+
+# バッチの実行関数: (メソッド名, キーワード引数) -> 結果
+RunFn = Callable[..., Awaitable[Any]]
+
+
+class MicroBatcher:
+    """並行する mask 呼び出しを1回の mask_many にまとめるスケジューラ。"""
+
+    # 移動平均の重み（新しい観測値の比率）
+    EWMA_ALPHA: float = 0.2
+
+    def __init__(
+        self,
+        run: RunFn,
+        slots: int = 1,
+        max_items: int = 32,
+        max_chars: int = 50_000,
+        window: float = 0.005,
+    ) -> None:
+        if slots < 1 or max_items < 1 or max_chars < 1:
+            raise ValueError("slots/max_items/max_chars は1以上を指定してください")
+        self._run = run
+        self.slots = slots
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.window = window
+        self._queue: deque[tuple[dict[str, Any], asyncio.Future[Any]]] = deque()
+        self._in_flight = 0
+        self._load = 1.0
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task[None] | None = None
+        self._batches: set[asyncio.Task[None]] = set()
+
+    @property
+    def load(self) -> float:
+        """投入時のキュー長の移動平均（1 付近なら閑散）。"""
+        return self._load
+
+    async def submit(self, item: dict[str, Any]) -> Any:
+        """mask() のキーワード引数を投入し、(masked_text, detected_spans) を待つ。"""
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        fut: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._queue.append((item, fut))
+        assert self._wakeup is not None
+        self._wakeup.set()
+        return await fut
+
+    async def close(self) -> None:
+        """スケジューラを停止し、未処理の要求を失敗させる。"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        while self._queue:
+            _, fut = self._queue.popleft()
+            if not fut.done():
+                fut.set_exception(RuntimeError("マイクロバッチは停止しました"))
+
+    def _wait_seconds(self) -> float:
+        """混雑度に応じた追加の待ち時間（閑散時は 0）。"""
+        if self.max_items <= 1 or self._load <= 1.0:
+            return 0.0
+        return self.window * min(1.0, self._load - 1.0)
+
+    async def _dispatch_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue and self._in_flight < self.slots:
+                wait = self._wait_seconds()
+                if wait > 0 and len(self._queue) < self.max_items:
+                    await asyncio.sleep(wait)
+                batch = self._take()
+                if not batch:
+                    continue
+                self._in_flight += 1
+                task = asyncio.create_task(self._run_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    def _take(self) -> list[tuple[dict[str, Any], asyncio.Future[Any]]]:
+        """キューの先頭から max_items 件・max_chars 文字まで取り出す（取り消し済みは除く）。"""
+        self._load += self.EWMA_ALPHA * (len(self._queue) - self._load)
+        batch: list[tuple[dict[str, Any], asyncio.Future[Any]]] = []
+        chars = 0
+        while self._queue and len(batch) < self.max_items:
+            item, fut = self._queue[0]
+            if fut.done():
+                self._queue.popleft()
+                continue
+            size = len(item["text"])
+            if batch and chars + size > self.max_chars:
+                break
+            self._queue.popleft()
+            batch.append((item, fut))
+            chars += size
+        return batch
+
+    async def _run_batch(self, batch: list[tuple[dict[str, Any], asyncio.Future[Any]]]) -> None:
+        METRICS.observe("mask_microbatch_items", len(batch))
+        try:
+            if len(batch) == 1:
+                outputs: list[Any] = [await self._run("mask", **batch[0][0])]
+            else:
+                outputs = await self._run("mask_many", items=[item for item, _ in batch])
+        except BaseException as e:  # noqa: BLE001
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e if isinstance(e, Exception) else RuntimeError("中断されました"))
+            if not isinstance(e, Exception):
+                raise
+        else:
+            for (_, fut), out in zip(batch, outputs, strict=True):
+                if fut.done():
+                    continue
+                if isinstance(out, Exception):
+                    fut.set_exception(out)
+                else:
+                    fut.set_result(out)
+        finally:
+            self._in_flight -= 1
+            if self._wakeup is not None:
+                self._wakeup.set()
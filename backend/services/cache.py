@@ -0,0 +1,273 @@
+"""
+NER 結果のキャッシュ
+
+- NerCache: プロセス内 LRU
+- SqliteNerCache: ローカルディスク上の SQLite（同一ホストの全ワーカで共有、再起動後も有効）
+- TieredNerCache: プロセス内 LRU を前段に置いた2段構成
+
+共通:
+- キーは文のダイジェスト（呼び出し側で生成）。原文は保持しない
+- 値は文内オフセットとラベルのみ（例: ((0, 2, "PERSON"),)）
+- 件数上限を超えたら最も古く参照されたものから追い出す
+- ttl を指定した場合は期限切れのエントリをミスとして扱う
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+
+# 文内オフセット（開始, 終了, ラベル）の並び
+NerEntry = tuple[tuple[int, int, str], ...]
+
+
+class NerCache:
+    """文単位の NER 結果を保持する LRU キャッシュ。"""
+
+    def __init__(self, max_entries: int, ttl: float | None = None) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries は1以上を指定してください")
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._data: OrderedDict[bytes, tuple[float, NerEntry]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expired: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def after_fork(self) -> None:
+        """fork した子プロセスで呼ぶ。fork 時に他スレッドが保持していた可能性のあるロックを作り直す。"""
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> NerEntry | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if self.ttl is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys: Sequence[bytes]) -> list[NerEntry | None]:
+        return [self.get(k) for k in keys]
+
+    def put_many(self, items: Sequence[tuple[bytes, NerEntry]]) -> None:
+        for key, value in items:
+            self.put(key, value)
+
+    def put(self, key: bytes, value: NerEntry) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """監視用のカウンタ。"""
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+class SqliteNerCache:
+    """
+    SQLite による共有 NER キャッシュ。
+    - WAL モードで複数プロセスからの同時読み書きに対応する
+    - 参照時刻（atime）を近似 LRU の指標とし、上限超過時に古い順に削除する
+      （ヒットのたびに書き込まないよう、atime の更新は touch_interval 秒以上経過した場合のみ）
+    """
+
+    # 1 文あたりの IN 句パラメータ数の上限（SQLite の既定上限 999 未満）
+    _CHUNK = 500
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int,
+        ttl: float | None = None,
+        evict_every: int = 256,
+        touch_interval: float = 60.0,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries は1以上を指定してください")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.evict_every = evict_every
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        # fork 前の親プロセスから引き継いだ接続（子プロセスでは使わず、閉じもしない）
+        self._inherited: list[sqlite3.Connection] = []
+        self._puts_since_evict = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expired: int = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ner_cache (key BLOB PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, atime REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ner_cache_atime ON ner_cache (atime)")
+        return conn
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ner_cache").fetchone()[0]
+
+    def after_fork(self) -> None:
+        """
+        fork した子プロセスで呼ぶ。SQLite の接続は fork をまたいで使えないため開き直す。
+        - 引き継いだ接続を閉じると親プロセス側の WAL/ロック状態に影響しうるため、参照を保持したまま放置する
+        """
+        self._inherited.append(self._conn)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def get(self, key: bytes) -> NerEntry | None:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[bytes]) -> list[NerEntry | None]:
+        now = time.time()
+        found: dict[bytes, tuple[str, float, float]] = {}
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i : i + self._CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created, atime FROM ner_cache WHERE key IN ({marks})", chunk
+                )
+                found.update((k, (v, c, a)) for k, v, c, a in rows)
+            stale = [k for k, (_, _, a) in found.items() if now - a >= self.touch_interval]
+            if stale:
+                self._conn.executemany("UPDATE ner_cache SET atime = ? WHERE key = ?", [(now, k) for k in stale])
+
+            results: list[NerEntry | None] = []
+            for key in keys:
+                row = found.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                elif self.ttl is not None and row[1] + self.ttl < now:
+                    self.expired += 1
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(tuple((s, e, label) for s, e, label in json.loads(row[0])))
+            return results
+
+    def put(self, key: bytes, value: NerEntry) -> None:
+        self.put_many([(key, value)])
+
+    def put_many(self, items: Sequence[tuple[bytes, NerEntry]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, json.dumps(v, separators=(",", ":")), now, now) for k, v in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO ner_cache VALUES (?, ?, ?, ?)", rows)
+                self._puts_since_evict += len(rows)
+                if self._puts_since_evict >= self.evict_every:
+                    self._puts_since_evict = 0
+                    self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        """上限を超えた分を atime の古い順に削除する（トランザクション内で呼ぶ）。"""
+        count = self._conn.execute("SELECT COUNT(*) FROM ner_cache").fetchone()[0]
+        over = count - self.max_entries
+        if over > 0:
+            self._conn.execute(
+                "DELETE FROM ner_cache WHERE key IN (SELECT key FROM ner_cache ORDER BY atime LIMIT ?)", (over,)
+            )
+            self.evictions += over
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict[str, int]:
+        """監視用のカウンタ。"""
+        return {
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+class TieredNerCache:
+    """プロセス内 LRU（memory）を前段、共有キャッシュ（disk）を後段に置く2段キャッシュ。"""
+
+    def __init__(self, memory: NerCache, disk: SqliteNerCache) -> None:
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: bytes) -> NerEntry | None:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[bytes]) -> list[NerEntry | None]:
+        results = self.memory.get_many(keys)
+        missing = [i for i, v in enumerate(results) if v is None]
+        if missing:
+            from_disk = self.disk.get_many([keys[i] for i in missing])
+            promote: list[tuple[bytes, NerEntry]] = []
+            for i, value in zip(missing, from_disk, strict=True):
+                if value is not None:
+                    results[i] = value
+                    promote.append((keys[i], value))
+            self.memory.put_many(promote)
+        return results
+
+    def put(self, key: bytes, value: NerEntry) -> None:
+        self.put_many([(key, value)])
+
+    def put_many(self, items: Sequence[tuple[bytes, NerEntry]]) -> None:
+        self.memory.put_many(items)
+        self.disk.put_many(items)
+
+    def after_fork(self) -> None:
+        self.memory.after_fork()
+        self.disk.after_fork()
+
+    def stats(self) -> dict[str, int]:
+        """監視用のカウンタ（disk 側は disk_ 接頭辞）。"""
+        stats = self.memory.stats()
+        stats.update({f"disk_{k}": v for k, v in self.disk.stats().items()})
+        return stats
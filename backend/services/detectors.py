@@ -0,0 +1,235 @@
+"""
+正規表現による識別子検出
+
+- 有効なルールを1本の正規表現（名前付きグループ r0, r1, ... の選択）へまとめ、テキストを1回だけ走査する
+  - 選択全体をゼロ幅の先読みの中に置く。先読みは文字を消費しないため、別のルールの一致と重なる・入れ子になる
+    一致も欠落しない（例: POSTAL_CODE と PHONE、URL の中の EMAIL）
+  - 一致した位置では m.lastgroup でルールを引き、同じ位置から始まる後続のルールは「そのルールより後ろの選択」を
+    同じ位置で照合して拾う（照合はその位置だけで、テキストの再走査はしない）
+  - ルールごとに直前の一致の終端より後ろから始まるものだけを採る（ルール単体で finditer した結果と同じになる）
+  - 走査する正規表現は「一致の先頭になりうる文字」の文字クラス1文字で始め、先読みはその1文字の後読みの中に置く
+    （`[先頭文字](?<=(?=選択).)`）。先頭が文字クラスのため re が該当しない位置を高速に読み飛ばせる
+    （先読みで始めるとこの最適化が効かず、ルールごとに走査するより遅い）
+- コンパイル済みのプランは対象ラベルの組み合わせごとにキャッシュする
+- 組み込みルール（EMAIL/URL/PHONE）に加え、設定ファイル（JSON）の独自ルールを追加できる
+
+注意:
+- 捕捉グループ（後方参照の番号がずれる）や先頭のフラグ指定（(?i) など）を含む独自ルールは1本にまとめられないため、
+  そのルールだけ個別に走査する
+- 先頭文字の文字クラスは re の内部の構文解析（re._parser）から求める。求められないルールがある場合は任意の1文字
+  とする（読み飛ばしが効かないだけで結果は変わらない）
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from re import _constants as _sre
+from re import _parser as _sre_parse
+
+
+@dataclass(frozen=True)
+class RegexRule:
+    """正規表現ルール（label は公開ラベル）"""
+
+    label: str
+    pattern: str
+
+
+# 組み込みルール（並び順が同一位置での優先順位）
+BUILTIN_RULES: tuple[RegexRule, ...] = (
+    RegexRule("EMAIL", r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"),
+    RegexRule("URL", r"(?:https?://[^\s\u3000]+|www\.[^\s\u3000]+)"),
+    RegexRule("PHONE", r"\b(?:\+?\d{1,3}[- ]?)?(?:\d{2,4}[- ]?\d{2,4}[- ]?\d{3,4})\b"),
+)
+
+
+def load_rules(path: str | Path) -> tuple[RegexRule, ...]:
+    """
+    JSON ファイルから独自ルールを読み込む。
+    形式: [{"label": "POSTAL_CODE", "pattern": "〒?\\\\d{3}-\\\\d{4}"}, ...]
+    - ラベルは大文字へ正規化する
+    - パターンは読み込み時にコンパイルして検証する（不正なら ValueError）
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(data, list):
+        raise ValueError("正規表現ルールは配列で指定してください")
+    rules: list[RegexRule] = []
+    for i, item in enumerate(data):
+        try:
+            label = str(item["label"]).strip().upper()
+            pattern = str(item["pattern"])
+        except (TypeError, KeyError) as e:
+            raise ValueError(f"正規表現ルールの形式が不正です（{i} 番目）") from e
+        if not label or not pattern:
+            raise ValueError(f"正規表現ルールの label/pattern が空です（{i} 番目）")
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"正規表現ルール {label} のパターンが不正です: {e}") from e
+        rules.append(RegexRule(label, pattern))
+    return tuple(rules)
+
+
+@dataclass(frozen=True)
+class _Plan:
+    """対象ラベルの組み合わせに対するコンパイル済みの走査計画。"""
+
+    # まとめた正規表現（1本にまとめたルールが無ければ None）
+    combined: re.Pattern[str] | None
+    # rest[i]: ルール i より後ろのルールだけの選択（同じ位置での照合用。最後のルールは None）
+    rest: tuple[re.Pattern[str] | None, ...]
+    # 名前付きグループ名 -> (ルールの番号, ラベル)
+    groups: dict[str, tuple[int, str]]
+    # 1本にまとめられないルール（個別に走査する）
+    separate: tuple[tuple[re.Pattern[str], str], ...]
+
+
+def _combinable(pattern: str) -> bool:
+    """まとめた正規表現の中へ置いても単体と同じ意味になるルールか（捕捉グループ・先頭のフラグ指定が無い）。"""
+    try:
+        return re.compile(pattern).groups == 0 and re.compile(f"(?s:.)(?<=(?=(?:{pattern})).)") is not None
+    except re.error:
+        return False
+
+
+# 文字クラスの要素として書ける分類
+_CATEGORIES: dict[object, str] = {
+    _sre.CATEGORY_DIGIT: r"\d",
+    _sre.CATEGORY_NOT_DIGIT: r"\D",
+    _sre.CATEGORY_SPACE: r"\s",
+    _sre.CATEGORY_NOT_SPACE: r"\S",
+    _sre.CATEGORY_WORD: r"\w",
+    _sre.CATEGORY_NOT_WORD: r"\W",
+}
+_ZERO_WIDTH = (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT)
+_REPEATS = (_sre.MAX_REPEAT, _sre.MIN_REPEAT, _sre.POSSESSIVE_REPEAT)
+
+
+def _first_chars(items: list[tuple[object, object]], out: list[str]) -> bool:
+    """
+    構文解析済みの並び items の先頭で消費しうる文字を、文字クラスの要素として out へ追加する。
+    並び全体が空文字列に一致しうるなら True（続く要素の先頭文字も候補になる）。表せない要素は ValueError。
+    """
+    for op, av in items:
+        if op in _ZERO_WIDTH:
+            continue
+        if op is _sre.LITERAL:
+            out.append(f"\\U{av:08x}")
+            return False
+        if op is _sre.IN:
+            for item_op, item_av in av:
+                if item_op is _sre.LITERAL:
+                    out.append(f"\\U{item_av:08x}")
+                elif item_op is _sre.RANGE:
+                    out.append(f"\\U{item_av[0]:08x}-\\U{item_av[1]:08x}")
+                elif item_op is _sre.CATEGORY and item_av in _CATEGORIES:
+                    out.append(_CATEGORIES[item_av])
+                else:
+                    raise ValueError(item_op)
+            return False
+        if op is _sre.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if add_flags & re.IGNORECASE:
+                raise ValueError(op)
+            if not _first_chars(sub, out):
+                return False
+        elif op is _sre.ATOMIC_GROUP:
+            if not _first_chars(av, out):
+                return False
+        elif op is _sre.BRANCH:
+            nullable = [_first_chars(branch, out) for branch in av[1]]
+            if not any(nullable):
+                return False
+        elif op in _REPEATS:
+            minimum, _, sub = av
+            if not _first_chars(sub, out) and minimum > 0:
+                return False
+        else:
+            raise ValueError(op)
+    return True
+
+
+def _first_char_class(patterns: Iterable[str]) -> str | None:
+    """いずれかのパターンの空でない一致の先頭になりうる文字の文字クラス（求められなければ None）。"""
+    out: list[str] = []
+    try:
+        for pattern in patterns:
+            _first_chars(list(_sre_parse.parse(pattern)), out)
+    except Exception:  # noqa: BLE001 - 内部の構文解析の変化も含め、読み飛ばしを省くだけ
+        return None
+    return "[" + "".join(dict.fromkeys(out)) + "]" if out else None
+
+
+def _alternation(rules: tuple[RegexRule, ...], start: int) -> str:
+    """ルール start 以降の選択を、名前付きグループ r<番号> としてゼロ幅の先読みに置いた正規表現。"""
+    return "(?=" + "|".join(f"(?P<r{i}>{rules[i].pattern})" for i in range(start, len(rules))) + ")"
+
+
+class RegexDetector:
+    """複数の正規表現ルールを1パスで適用する検出器。"""
+
+    def __init__(self, rules: Iterable[RegexRule] = BUILTIN_RULES) -> None:
+        self.rules: tuple[RegexRule, ...] = tuple(rules)
+        self.labels: frozenset[str] = frozenset(r.label for r in self.rules)
+        # 有効ラベル集合 -> 走査計画。該当ルールが無ければ None
+        self._plans: dict[frozenset[str], _Plan | None] = {}
+
+    def _plan(self, allow_set: Iterable[str]) -> _Plan | None:
+        """対象ラベルに対応するコンパイル済みプランを返す（初回のみコンパイル）。"""
+        key = self.labels.intersection(allow_set)
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+        rules = [r for r in self.rules if r.label in key]
+        joined = tuple(r for r in rules if _combinable(r.pattern))
+        plan: _Plan | None = None
+        if rules:
+            combined = None
+            if joined:
+                first = _first_char_class(r.pattern for r in joined) or "(?s:.)"
+                combined = re.compile(f"{first}(?<={_alternation(joined, 0)}.)")
+            plan = _Plan(
+                combined=combined,
+                rest=tuple(
+                    re.compile(_alternation(joined, i + 1)) if i + 1 < len(joined) else None
+                    for i in range(len(joined))
+                ),
+                groups={f"r{i}": (i, r.label) for i, r in enumerate(joined)},
+                separate=tuple((re.compile(r.pattern), r.label) for r in rules if r not in joined),
+            )
+        self._plans[key] = plan
+        return plan
+
+    def find(self, text: str, allow_set: Iterable[str]) -> list[tuple[int, int, str]]:
+        """
+        対象ラベルの一致を (開始, 終了, ラベル) の昇順で返す（空一致は除外）。
+        ルールごとに finditer した結果の和集合（同じ範囲・ラベルの重複は1件にまとめる）。
+        """
+        plan = self._plan(allow_set)
+        if plan is None:
+            return []
+        found: set[tuple[int, int, str]] = set()
+        rest, groups = plan.rest, plan.groups
+        # ルールごとの直前の一致の終端（これより前から始まる一致は、その一致の途中からの部分一致）
+        next_start = [0] * len(groups)
+        for m in plan.combined.finditer(text) if plan.combined is not None else ():
+            pos = m.start()
+            hit: re.Match[str] | None = m
+            while hit is not None:
+                name = hit.lastgroup
+                assert name is not None
+                i, label = groups[name]
+                end = hit.end(name)
+                if end > pos and pos >= next_start[i]:
+                    found.add((pos, end, label))
+                    next_start[i] = end
+                # 同じ位置から始まる、後続のルールの一致
+                after = rest[i]
+                hit = after.match(text, pos) if after is not None else None
+        for pattern, label in plan.separate:
+            found.update((m.start(), m.end(), label) for m in pattern.finditer(text) if m.end() > m.start())
+        return sorted(found)
@@ -0,0 +1,191 @@
+"""
+ユーザ辞書による検出
+
+- 辞書ファイル（TSV: 表記<TAB>ラベル）の語を Aho-Corasick オートマトンで一括照合する
+  （照合コストは本文長と一致数に比例し、辞書の語数には依存しない）
+- 重なる一致は最左最長のものを採る（「山田」と「山田太郎」なら「山田太郎」）
+- 英数字で始まる/終わる語は、前後が英数字の場合は一致としない（「Ann」が「Annual」に一致しないように）
+
+ホットリロード:
+- 監視スレッドが一定間隔でファイルの更新（mtime/サイズ）を確認し、
+  変更があれば新しいオートマトンを構築して参照を差し替える
+- 照合側は参照を1回読むだけなのでロック不要（構築中も旧オートマトンで処理を継続する）
+- 読み込みに失敗した場合は旧オートマトンを維持する（ファイルは一時ファイルからの rename で置き換えることを推奨）
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+
+# ラベル列を省略した行のラベル
+DEFAULT_LABEL: str = "PERSON"
+
+
+def load_entries(path: str | Path, default_label: str = DEFAULT_LABEL) -> list[tuple[str, str]]:
+    """
+    辞書ファイルを読み込み (表記, ラベル) のリストを返す。
+    - 空行と # で始まる行は無視する
+    - ラベルは大文字へ正規化する。省略時は default_label
+    """
+    entries: list[tuple[str, str]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            term, _, label = line.partition("\t")
+            term = term.strip()
+            if term:
+                entries.append((term, label.strip().upper() or default_label))
+    return entries
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """Aho-Corasick オートマトン（構築後は不変）。"""
+
+    def __init__(self, entries: Iterable[tuple[str, str]]) -> None:
+        # ノードごとの遷移・失敗遷移・出力（語長, ラベル）
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[tuple[int, str], ...]] = [()]
+        labels: set[str] = set()
+        size = 0
+        for term, label in entries:
+            node = 0
+            for ch in term:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            if not self._out[node]:
+                size += 1
+            # 同じ表記が重複した場合は後の行を優先
+            self._out[node] = ((len(term), label),)
+            labels.add(label)
+        self.size: int = size
+        self.labels: frozenset[str] = frozenset(labels)
+        self._build_fail()
+
+    def _build_fail(self) -> None:
+        """幅優先で失敗遷移を張り、失敗先の出力を併合する。"""
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text: str, allow_set: Iterable[str]) -> list[tuple[int, int, str]]:
+        """対象ラベルの一致を最左最長・重なり無しで (開始, 終了, ラベル) の昇順に返す。"""
+        allow = self.labels.intersection(allow_set)
+        if not allow:
+            return []
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: list[tuple[int, int, str]] = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, label in out[node]:
+                if label in allow:
+                    hits.append((i + 1 - length, i + 1, label))
+        if not hits:
+            return []
+
+        n = len(text)
+        hits.sort(key=lambda h: (h[0], -h[1]))
+        result: list[tuple[int, int, str]] = []
+        last = 0
+        for start, end, label in hits:
+            if start < last:
+                continue
+            # 英数字の語の途中に一致したものは除外
+            if _is_word(text[start]) and start > 0 and _is_word(text[start - 1]):
+                continue
+            if _is_word(text[end - 1]) and end < n and _is_word(text[end]):
+                continue
+            result.append((start, end, label))
+            last = end
+        return result
+
+
+class DictionaryDetector:
+    """ユーザ辞書の検出器。ファイルの更新を監視してオートマトンを差し替える。"""
+
+    def __init__(
+        self,
+        path: str | Path,
+        default_label: str = DEFAULT_LABEL,
+        reload_interval: float = 5.0,
+    ) -> None:
+        self.path = Path(path)
+        self.default_label = default_label.upper()
+        self.reload_interval = reload_interval
+        self._logger = logging.getLogger("app.dictionary")
+        self._matcher = AhoCorasick(())
+        self._stamp: tuple[int, int] | None = None
+        # 起動時の読み込み失敗は設定誤りとして例外にする
+        self.reload_if_changed()
+        self._stop = threading.Event()
+        self._start_watcher()
+
+    @property
+    def labels(self) -> frozenset[str]:
+        return self._matcher.labels
+
+    @property
+    def size(self) -> int:
+        return self._matcher.size
+
+    def reload_if_changed(self) -> bool:
+        """ファイルが更新されていれば再構築して差し替える。差し替えた場合 True。"""
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        matcher = AhoCorasick(load_entries(self.path, self.default_label))
+        # 参照の代入のみで切り替える（照合中のリクエストは旧オートマトンを使い切る）
+        self._matcher, self._stamp = matcher, stamp
+        self._logger.info("dictionary loaded: path=%s entries=%d", self.path, matcher.size)
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload_if_changed()
+            except Exception:  # noqa: BLE001
+                self._logger.exception("dictionary reload failed: path=%s", self.path)
+
+    def _start_watcher(self) -> None:
+        if self.reload_interval > 0:
+            threading.Thread(target=self._watch, name="dictionary-reload", daemon=True).start()
+
+    def close(self) -> None:
+        """監視スレッドを停止する。"""
+        self._stop.set()
+
+    def after_fork(self) -> None:
+        """fork した子プロセスで呼ぶ。スレッドは fork で引き継がれないため監視スレッドを起動し直す。"""
+        self._stop = threading.Event()
+        self._start_watcher()
+
+    def find(self, text: str, allow_set: Iterable[str]) -> list[tuple[int, int, str]]:
+        return self._matcher.find(text, allow_set)
@@ -0,0 +1,203 @@
+"""
+マスク処理の実行器
+
+- inline: イベントループ上で直接実行（従来動作）
+- thread: スレッドプールで実行
+- process: プロセスプールで実行（spawn で起動）
+
+注意:
+- spaCy パイプラインはスレッド間で安全に共有できないため、プールの各ワーカが自前の Masker を保持する。
+  - ロード済みの Masker（pre-fork 起動時に親プロセスでロードしたもの）を渡した場合は、
+    thread のワーカ1つでそれを使う（モデルを再ロードしない。process では渡せない）
+- ワーカは起動時に Masker をロードし、ウォームアップ用の文を処理してから受け付ける。
+- 投入中のタスク数がワーカ数に達した状態（プール飽和）は WARNING でログに出す。
+- process 時はワーカで記録したメトリクスの差分を結果と一緒に受け取り、親プロセスで合算する。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from backend.services.masker import Masker
+from backend.services.metrics import METRICS
+
+# ワーカ（スレッド/プロセス）ごとの Masker。プロセスの場合もタスクは初期化したスレッドで実行される
+_local = threading.local()
+# このプロセス内で生成したワーカの Masker（thread 時の統計集計用）
+_workers: list[Masker] = []
+_workers_lock = threading.Lock()
+
+# 飽和ログの最小間隔（秒）。高負荷時にログが溢れないように間引く
+SATURATION_LOG_INTERVAL: float = 1.0
+
+
+def _init_worker(masker_kwargs: dict[str, Any], warmup_texts: Sequence[str] = ()) -> None:
+    """ワーカ起動時に Masker をロードし、ウォームアップする。"""
+    _local.masker = Masker(**masker_kwargs)
+    if warmup_texts:
+        _local.masker.warm_up(warmup_texts)
+    with _workers_lock:
+        _workers.append(_local.masker)
+
+
+def _init_shared_worker(masker: Masker) -> None:
+    """ワーカ起動時に、ロード済みの Masker をそのまま使う（ロード・ウォームアップは済んでいる前提）。"""
+    _local.masker = masker
+    with _workers_lock:
+        _workers.append(masker)
+
+
+def _call_worker(method: str, kwargs: dict[str, Any]) -> Any:
+    """ワーカ内の Masker のメソッドを呼び出す。"""
+    return getattr(_local.masker, method)(**kwargs)
+
+
+def _call_worker_metered(method: str, kwargs: dict[str, Any]) -> tuple[Any, Any]:
+    """ワーカプロセス用: 結果と、この呼び出しで記録したメトリクスの差分を返す。"""
+    return _call_worker(method, kwargs), METRICS.drain()
+
+
+def _ping() -> bool:
+    return hasattr(_local, "masker")
+
+
+class MaskExecutor:
+    """Masker の呼び出しをイベントループ外へ逃がす実行器。"""
+
+    MODES: tuple[str, ...] = ("inline", "thread", "process")
+
+    def __init__(
+        self,
+        mode: str = "inline",
+        max_workers: int = 2,
+        masker_kwargs: dict[str, Any] | None = None,
+        warmup_texts: Sequence[str] = (),
+        shared_masker: Masker | None = None,
+    ) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"未知の実行方式です: {mode}")
+        if max_workers < 1:
+            raise ValueError("max_workers は1以上を指定してください")
+        if shared_masker is not None:
+            if mode == "process":
+                raise ValueError("ロード済みの Masker は process の実行器では共有できません")
+            # 1つの Masker を複数スレッドから同時に呼ばないよう、ワーカは1つに限る
+            max_workers = 1
+        self.mode = mode
+        self.max_workers = max_workers
+        self._masker_kwargs: dict[str, Any] = dict(masker_kwargs or {})
+        self._warmup_texts: tuple[str, ...] = tuple(warmup_texts)
+        self._shared_masker = shared_masker
+        self._pool: Executor | None = None
+        # 投入中タスク数（イベントループ上でのみ増減するためロック不要）
+        self._in_flight: int = 0
+        self._last_saturation_log: float = 0.0
+        self._logger = logging.getLogger("app.executor")
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        """
+        プールを起動し、全ワーカで Masker のロード（とウォームアップ）を済ませる。
+        - 初回リクエストでモデルロードが走らないよう、ワーカ数ぶんの ping を投げて待つ
+        """
+        if self.mode == "inline" or self._pool is not None:
+            return
+        if self.mode == "thread" and self._shared_masker is not None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="masker",
+                initializer=_init_shared_worker,
+                initargs=(self._shared_masker,),
+            )
+        elif self.mode == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="masker",
+                initializer=_init_worker,
+                initargs=(self._masker_kwargs, self._warmup_texts),
+            )
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._masker_kwargs, self._warmup_texts),
+            )
+        futures = [self._pool.submit(_ping) for _ in range(self.max_workers)]
+        for f in futures:
+            f.result()
+        self._logger.info(
+            "mask executor started: mode=%s workers=%d shared=%s",
+            self.mode,
+            self.max_workers,
+            self._shared_masker is not None,
+        )
+
+    def local_maskers(self, masker: Masker | None) -> list[Masker]:
+        """
+        このプロセスから参照できる Masker の一覧（統計の集計用）。
+        - inline: 渡された masker、thread: 各ワーカスレッドの Masker
+        - process: ワーカプロセス内にあるため参照できない（空）
+        """
+        if self.mode == "inline":
+            return [masker] if masker is not None else []
+        if self.mode == "thread":
+            with _workers_lock:
+                return list(_workers)
+        return []
+
+    def shutdown(self) -> None:
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        if self.mode == "thread":
+            with _workers_lock:
+                _workers.clear()
+
+    async def run(self, masker: Masker | None, method: str, **kwargs: Any) -> Any:
+        """
+        Masker のメソッドを実行する。
+        - inline 時は渡された masker をその場で呼び出す
+        - thread/process 時はワーカ側の Masker で実行し、結果を待つ
+        """
+        if self._pool is None:
+            if masker is None:
+                raise RuntimeError("Masker が初期化されていません")
+            return getattr(masker, method)(**kwargs)
+
+        if self._in_flight >= self.max_workers:
+            self._log_saturation()
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.mode == "thread":
+                return await loop.run_in_executor(self._pool, _call_worker, method, kwargs)
+            # process: ワーカ内で記録したメトリクスを親プロセスへ合算する
+            result, delta = await loop.run_in_executor(self._pool, _call_worker_metered, method, kwargs)
+            METRICS.merge(delta)
+            return result
+        finally:
+            self._in_flight -= 1
+
+    def _log_saturation(self) -> None:
+        now = time.monotonic()
+        if now - self._last_saturation_log < SATURATION_LOG_INTERVAL:
+            return
+        self._last_saturation_log = now
+        self._logger.warning(
+            "mask executor saturated: mode=%s workers=%d in_flight=%d queued=%d",
+            self.mode,
+            self.max_workers,
+            self._in_flight,
+            self._in_flight - self.max_workers + 1,
+        )
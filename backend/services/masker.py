@@ -1,19 +1,160 @@
 """
 マスキングサービス
 
-- 文分割（日本語向けの簡易ルールベース）
+- 文分割（日本語向けの簡易ルールベース）と NER ウィンドウへの詰め直し
 - GiNZA による NER 抽出
-- EMAIL/URL/PHONE の正規表現補完
-- 重複/重なりスパンのマージ（マスキング適用用）
-- マスク文字列の生成（replacement/preserve_length/fixed_length）
+- 正規表現による補完（EMAIL/URL/PHONE と設定ファイルの独自ルール。1本にまとめて1回だけ走査し、重なる一致も拾う）
+- ユーザ辞書による補完（Aho-Corasick。ファイル更新時に差し替え）
+- 処理段ごとの所要時間・入力サイズ・検出件数をメトリクスへ記録（backend.services.metrics）
+- 起動時のウォームアップ
+- 重複/重なりスパンのマージとマスク文字列の生成（replacement/preserve_length/fixed_length）
+  - 検出結果は内部では (start, end, label) のタプルで扱い、Span は戻り値を作るときにだけ生成する
+  - スパンが VECTORIZE_MIN_SPANS 件以上の文書は NumPy の配列演算で行う（backend.services.spans）
+- 処理期限（deadline）の確認（NER のウィンドウごとに確認し、期限切れは DeadlineExceeded で打ち切る）
 
 注意:
-- 返却する detected は元の検出スパン（全文オフセット）。
+- 返却する detected は元の検出スパン（全文オフセット）。masked_start/masked_end にマスク後オフセットを設定する。
 - 実際のマスク適用はマージ後スパンに対して行う。
 """
+import hashlib
+import logging
 import re
-from collections.abc import Iterable
+import time
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from backend.services.cache import NerCache, SqliteNerCache, TieredNerCache
+from backend.services.detectors import BUILTIN_RULES, RegexDetector, load_rules
+from backend.services.dictionary import DictionaryDetector
+from backend.services.metrics import METRICS
+
+# 日本語向けの文末記号と、その直後に文末へ含める閉じ括弧/引用符
+SENT_END: str = "。．！？!?"
+CLOSERS: str = "」』］】）】〉》”’\"]"
+# 文末（終端記号 + 直後の閉じ括弧・引用符）。文分割は1パスの finditer で行う
+RE_SENT_END: re.Pattern[str] = re.compile(f"[{re.escape(SENT_END)}][{re.escape(CLOSERS)}]*")
+# 長い文を分割してよい位置（この文字の直後で切る）。空白類も対象
+SOFT_BREAKS: str = "、，,；;：:"
+
+# パイプラインプロファイル（spacy.load で除外するコンポーネント名）
+# - full: モデルの全コンポーネントを使用
+# - ner: mask は doc.ents のみ参照するため、tok2vec/ner 以外を除外（ja_ginza の構成に基づく）
+PIPELINE_PROFILES: dict[str, tuple[str, ...]] = {
+    "full": (),
+    "ner": ("parser", "attribute_ruler", "morphologizer", "compound_splitter", "bunsetu_recognizer"),
+}
+
+# targets 省略時のマスク対象（独自の正規表現ルールのラベルは Masker 側で追加する）
+DEFAULT_TARGETS: tuple[str, ...] = ("PERSON", "LOCATION", "ORGANIZATION", "EMAIL", "PHONE", "URL")
+
+
+# ウォームアップ用のサンプル文（各検出器と、長文の分割・ウィンドウの詰め直しを一通り通す）
+WARMUP_TEXTS: tuple[str, ...] = (
+    "山田太郎さん（東京都千代田区、株式会社サンプル）の連絡先は taro@example.com、電話は 03-1234-5678 です。"
+    "詳細は https://example.com/docs を参照してください。",
+    "、".join(["佐藤花子は大阪府の支店で会議を行いました"] * 20) + "。",
+)
+
+
+# これ以上のスパン数では、マージ・描画を NumPy の配列演算で行う
+# （未満では配列の準備（ラベルの番号付け・ソート）のコストが Python のループを上回る）
+VECTORIZE_MIN_SPANS: int = 256
+
+
+class DeadlineExceeded(Exception):
+    """処理期限（deadline）を過ぎたため処理を打ち切った。"""
+
+
+def _expired(deadline: float | None) -> bool:
+    """deadline（time.time() の絶対時刻）を過ぎているか。None は期限なし。"""
+    return deadline is not None and time.time() >= deadline
+
+
+def _observe_stage(stage: str, seconds: float) -> None:
+    METRICS.observe("masker_stage_seconds", seconds, _STAGE_LABELS[stage])
+
+
+# 処理段のラベル（記録のたびにタプルを作らないよう事前に用意）
+_STAGE_LABELS: dict[str, tuple[tuple[str, str], ...]] = {
+    stage: (("stage", stage),) for stage in ("split", "ner", "regex", "dictionary", "merge", "render")
+}
+
+
+def repeat_to_length(token: str, length: int) -> str:
+    """token を繰り返して指定長にし、超過分は切り詰める。"""
+    if length <= 0:
+        return ""
+    times, rem = divmod(length, len(token))
+    return token * times + token[:rem]
+
+
+def sentence_spans(text: str, re_sent_end: re.Pattern[str] = RE_SENT_END) -> list[tuple[int, int]]:
+    """
+    日本語向けの簡易文分割。
+    - 句点/終端記号（。．！？!?）を境界とみなし、その直後の閉じ括弧・引用符も文末に含める。
+    - 最後に残ったテキストも文として扱う。
+    - 事前コンパイル済みパターンで1回だけ走査する（部分文字列のコピーなし、O(n)）。
+    """
+    spans: list[tuple[int, int]] = []
+    i: int = 0
+    n: int = len(text)
+    for m in re_sent_end.finditer(text):
+        spans.append((i, m.end()))
+        i = m.end()
+    if i < n or not spans:
+        spans.append((i, n))
+    return spans
+
+
+def _split_long(text: str, start: int, end: int, budget: int, soft_breaks: str) -> Iterator[tuple[int, int]]:
+    """
+    budget を超える区間を分割する（句読点の無い長大な連続テキスト向け）。
+    - 上限位置から後半分の範囲で区切り文字/空白を後ろ向きに探し、その直後で切る
+    - 見つからなければ上限位置で切る
+    """
+    while end - start > budget:
+        cut = start + budget
+        lo = start + budget // 2
+        k = cut
+        while k > lo and not (text[k - 1] in soft_breaks or text[k - 1].isspace()):
+            k -= 1
+        if k > lo:
+            cut = k
+        yield (start, cut)
+        start = cut
+    yield (start, end)
+
+
+def ner_windows(
+    text: str, sent_spans: list[tuple[int, int]], window_chars: int, soft_breaks: str = SOFT_BREAKS
+) -> list[tuple[int, int]]:
+    """
+    文スパンを NER 用のウィンドウへ詰め直す。
+    - 連続する短い文を window_chars 以内で結合する（NER 呼び出し回数を文数ではなく文字数に比例させる）
+    - window_chars を超える文は _split_long で分割する
+    - 隣接していない文（間の文がキャッシュ済みの場合など）は結合しない
+    - 先頭から貪欲に詰めるため、ウィンドウの開始位置から後ろの分け方はそれより前の文に依らない
+    """
+    if window_chars <= 0:
+        return sent_spans
+    windows: list[tuple[int, int]] = []
+    w_start: int | None = None
+    w_end: int = 0
+    for s_start, s_end in sent_spans:
+        for p_start, p_end in _split_long(text, s_start, s_end, window_chars, soft_breaks):
+            if w_start is not None and p_start == w_end and p_end - w_start <= window_chars:
+                w_end = p_end
+                continue
+            if w_start is not None:
+                windows.append((w_start, w_end))
+            w_start, w_end = p_start, p_end
+    if w_start is not None:
+        windows.append((w_start, w_end))
+    return windows
 
 
 @dataclass
@@ -24,52 +165,120 @@ class Span:
     end: int
     label: str
     text: str
+    # マスク後テキストでのオフセット（mask() が設定する）
+    masked_start: int = 0
+    masked_end: int = 0
 
 
 class Masker:
     """GiNZA ベースのマスキングユーティリティ（ステートフル）。"""
 
-    def __init__(self, model_name: str = "ja_ginza") -> None:
-        # モデルは起動時にロードして保持（初回リクエストの重さを避ける）
+    def __init__(
+        self,
+        model_name: str = "ja_ginza",
+        batch_size: int = 64,
+        n_process: int = 1,
+        window_chars: int = 256,
+        pipeline: str = "ner",
+        exclude: Iterable[str] | None = None,
+        cache_size: int = 10000,
+        cache_ttl: float | None = None,
+        cache_dir: str | None = None,
+        disk_cache_size: int = 1_000_000,
+        regex_rules_file: str | None = None,
+        dictionary_file: str | None = None,
+        dictionary_reload_interval: float = 5.0,
+    ) -> None:
         # CI の OpenAPI 生成時など、トップレベルimportで重依存を解決しないため局所import
         import spacy
 
-        self.nlp = spacy.load(model_name)
+        self._logger = logging.getLogger("app.masker")
+        if pipeline not in PIPELINE_PROFILES:
+            raise ValueError(f"未知のパイプラインプロファイルです: {pipeline}")
+        # exclude を明示した場合はプロファイルより優先
+        self.excluded: tuple[str, ...] = tuple(exclude) if exclude is not None else PIPELINE_PROFILES[pipeline]
+        # モデルは起動時にロードして保持（初回リクエストの重さを避ける）
+        t0 = time.perf_counter()
+        self.nlp = spacy.load(model_name, exclude=list(self.excluded))
+        self.load_seconds: float = time.perf_counter() - t0
+        self._logger.info("pipeline loaded: model=%s seconds=%.2f", model_name, self.load_seconds)
+        # warm_up() を実行済みか（pre-fork 時は親プロセスで実行済みならワーカでは省略する）
+        self.warmed: bool = False
+        # モデルの識別子（名前/バージョン/除外コンポーネント）。キャッシュキーに含める
+        version = getattr(self.nlp, "meta", {}).get("version", "")
+        self.model_id: str = f"{model_name}@{version}-{','.join(self.excluded)}"
+        # 文単位の NER 結果キャッシュ
+        # - プロセス内 LRU（cache_size<=0 で無効）
+        # - cache_dir 指定時は SQLite の共有キャッシュを後段に置く（同一ホストのワーカ間で共有）
+        memory = NerCache(cache_size, cache_ttl) if cache_size > 0 else None
+        disk = (
+            SqliteNerCache(Path(cache_dir) / "ner_cache.sqlite3", disk_cache_size, cache_ttl)
+            if cache_dir
+            else None
+        )
+        self.cache: NerCache | SqliteNerCache | TieredNerCache | None = memory if disk is None else disk
+        if memory is not None and disk is not None:
+            self.cache = TieredNerCache(memory, disk)
+        self._cache_salt: bytes = self.model_id.encode("utf-8") + b"\0"
+        # nlp.pipe に渡すバッチサイズ/プロセス数（n_process>1 は spaCy 側でプロセスを起動）
+        self.batch_size: int = batch_size
+        self.n_process: int = n_process
+        # NER ウィンドウの文字数上限（0 以下で文単位のまま。短文の結合/長文の分割を行わない）
+        self.window_chars: int = window_chars
         # 日本語向けの閉じ括弧/引用符と終端記号
-        self.closers: str = "」』］】）】〉》”’\"]"
-        self.sent_end: str = "。．！？!?"
-        # 代表的な識別子の正規表現
-        self.re_email = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
-        self.re_url = re.compile(r"(https?://[^\s\u3000]+|www\.[^\s\u3000]+)")
-        self.re_phone = re.compile(
-            r"\b(?:\+?\d{1,3}[- ]?)?(?:\d{2,4}[- ]?\d{2,4}[- ]?\d{3,4})\b"
+        self.closers: str = CLOSERS
+        self.sent_end: str = SENT_END
+        # 文末（終端記号 + 直後の閉じ括弧・引用符）。文分割は1パスの finditer で行う
+        self.re_sent_end: re.Pattern[str] = RE_SENT_END
+        # 長い文を分割してよい位置（この文字の直後で切る）。空白類も対象
+        self.soft_breaks: str = SOFT_BREAKS
+        # 代表的な識別子（組み込み）と独自ルールの正規表現。対象ラベルごとにコンパイル済みのプランを使う
+        custom = load_rules(regex_rules_file) if regex_rules_file else ()
+        self.regex = RegexDetector(custom + BUILTIN_RULES)
+        # targets 省略時の対象。独自ルールのラベルも含める
+        self.default_targets: tuple[str, ...] = DEFAULT_TARGETS + tuple(
+            dict.fromkeys(r.label for r in custom if r.label not in DEFAULT_TARGETS)
+        )
+        # ユーザ辞書（未指定なら無効）。辞書のラベルは targets 省略時の対象に含める
+        self.dictionary: DictionaryDetector | None = (
+            DictionaryDetector(dictionary_file, reload_interval=dictionary_reload_interval)
+            if dictionary_file
+            else None
         )
 
-    def _sentence_spans(self, text: str) -> list[tuple[int, int]]:
+    def warm_up(self, texts: Iterable[str] = WARMUP_TEXTS) -> float:
+        """
+        サンプル文を一通り処理し、初回呼び出し時の遅延初期化を済ませる。所要時間（秒）を返す。
+        - NER キャッシュは使わない（毎回 NER を通す。キャッシュの件数・統計も汚さない）
+        - メトリクスには記録しない
         """
-        日本語向けの簡易文分割。
-        - 句点/終端記号（。．！？!?）を境界とみなし、その直後の閉じ括弧・引用符も文末に含める。
-        - 最後に残ったテキストも文として扱う。
-        """
-        spans: list[tuple[int, int]] = []
-        i: int = 0
-        n: int = len(text)
-        while i < n:
-            # 終端記号を探す
-            m = re.search(f"[{self.sent_end}]", text[i:])
-            if not m:
-                spans.append((i, n))
-                break
-            end_idx = i + m.end()
-            # 直後の閉じ括弧・引用符を含める
-            j = end_idx
-            while j < n and text[j] in self.closers:
-                j += 1
-            spans.append((i, j))
-            i = j
-        if not spans:
-            spans.append((0, n))
-        return spans
+        t0 = time.perf_counter()
+        cache, self.cache = self.cache, None
+        try:
+            with METRICS.discarded():
+                for text in texts:
+                    self.mask(text)
+        finally:
+            self.cache = cache
+        self.warmed = True
+        return time.perf_counter() - t0
+
+    def _sentence_spans(self, text: str) -> list[tuple[int, int]]:
+        """日本語向けの簡易文分割（sentence_spans）。"""
+        return sentence_spans(text, self.re_sent_end)
+
+    def _ner_windows(self, text: str, sent_spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """文スパンを NER 用のウィンドウへ詰め直す（ner_windows）。"""
+        return ner_windows(text, sent_spans, self.window_chars, self.soft_breaks)
+
+    def _allow_set(self, targets: list[str] | None) -> set[str]:
+        """マスク対象ラベルの集合（省略時は既定集合）。"""
+        if targets:
+            return {t.upper() for t in targets}
+        allow = set(self.default_targets)
+        if self.dictionary is not None:
+            allow |= self.dictionary.labels
+        return allow
 
     @staticmethod
     def _map_label(ent_label: str) -> str | None:
@@ -89,44 +298,126 @@ class Masker:
             return "URL"
         return None
 
-    def _regex_pii(self, text: str, allow: Iterable[str]) -> list[Span]:
-        spans: list[Span] = []
-        allow_set = set(allow)
-        if "EMAIL" in allow_set:
-            for m in self.re_email.finditer(text):
-                spans.append(Span(m.start(), m.end(), "EMAIL", m.group(0)))
-        if "URL" in allow_set:
-            for m in self.re_url.finditer(text):
-                spans.append(Span(m.start(), m.end(), "URL", m.group(0)))
-        if "PHONE" in allow_set:
-            for m in self.re_phone.finditer(text):
-                spans.append(Span(m.start(), m.end(), "PHONE", m.group(0)))
-        return spans
+    def _ner_spans(
+        self,
+        text: str,
+        sent_spans: list[tuple[int, int]],
+        allow_set: set[str],
+        deadline: float | None = None,
+    ) -> list[tuple[int, int, str]]:
+        """文スパンを NER ウィンドウへ詰め直して NER を実行し、全文オフセットの (start, end, label) を返す。"""
+        return self._ner_batch([(text, sent_spans, allow_set)], deadline)[0]
 
-    @staticmethod
-    def _merge_spans(spans: list[Span]) -> list[Span]:
-        """重複/隣接をマージ（ラベルは先頭スパンを維持、text は後で未参照）。"""
-        if not spans:
-            return []
-        spans_sorted = sorted(spans, key=lambda s: (s.start, -s.end))
-        merged: list[Span] = []
-        cur = spans_sorted[0]
-        for s in spans_sorted[1:]:
-            if s.start <= cur.end:  # 重なり or 隣接
-                cur.end = max(cur.end, s.end)
+    def _ner_batch(
+        self,
+        jobs: list[tuple[str, list[tuple[int, int]], set[str]]],
+        deadline: float | None = None,
+    ) -> list[list[tuple[int, int, str]]]:
+        """
+        複数テキストの NER を1回の nlp.pipe で実行し、テキストごとの NER スパン (start, end, label) を返す。
+        - jobs: (text, sent_spans, allow_set) のリスト
+        - キャッシュ済みの文は NER を省略し、未キャッシュの文だけをウィンドウへ詰めて流す
+        - nlp.pipe は入力順に Doc を返すため、(テキスト番号, ウィンドウ開始位置) と zip で対応付ける
+        - deadline を過ぎたらウィンドウの区切りで DeadlineExceeded を送出する（キャッシュへは保存しない）
+        """
+        # (start, end, label) の全文オフセット。ラベルは公開ラベルへ正規化済み（allow_set では未絞り込み）
+        found: list[list[tuple[int, int, str]]] = [[] for _ in jobs]
+        misses: list[list[tuple[int, int]]] = []
+        refs: list[tuple[int, int, int]] = []
+        for k, (text, sent_spans, _) in enumerate(jobs):
+            job_misses = sent_spans if self.cache is None else self._lookup_cached(text, sent_spans, found[k])
+            misses.append(job_misses)
+            refs.extend((k, w_start, w_end) for (w_start, w_end) in self._ner_windows(text, job_misses))
+
+        fresh: list[list[tuple[int, int, str]]] = [[] for _ in jobs]
+        sents = (jobs[k][0][w_start:w_end] for (k, w_start, w_end) in refs)
+        docs = self.nlp.pipe(sents, batch_size=self.batch_size, n_process=self.n_process)
+        for (k, w_start, _), doc in zip(refs, docs, strict=True):
+            if _expired(deadline):
+                raise DeadlineExceeded
+            for ent in doc.ents:
+                mapped = self._map_label(ent.label_)
+                if mapped:
+                    fresh[k].append((w_start + ent.start_char, w_start + ent.end_char, mapped))
+
+        results: list[list[tuple[int, int, str]]] = []
+        for k, (text, _, allow_set) in enumerate(jobs):
+            ents = fresh[k]
+            if self.cache is not None:
+                self._store_cached(text, misses[k], ents)
+                ents = sorted(found[k] + ents)
+            results.append([ent for ent in ents if ent[2] in allow_set])
+        return results
+
+    def _cache_key(self, sentence: str) -> bytes:
+        """キャッシュキー（モデル識別子 + 文のダイジェスト）。原文は保持しない。"""
+        return hashlib.blake2b(self._cache_salt + sentence.encode("utf-8"), digest_size=16).digest()
+
+    def _lookup_cached(
+        self, text: str, sent_spans: list[tuple[int, int]], out: list[tuple[int, int, str]]
+    ) -> list[tuple[int, int]]:
+        """キャッシュ済みの文の検出結果を out へ追加し、未キャッシュの文スパンを返す。"""
+        assert self.cache is not None
+        keys = [self._cache_key(text[s_start:s_end]) for (s_start, s_end) in sent_spans]
+        misses: list[tuple[int, int]] = []
+        for (s_start, s_end), hit in zip(sent_spans, self.cache.get_many(keys), strict=True):
+            if hit is None:
+                misses.append((s_start, s_end))
             else:
-                merged.append(cur)
-                cur = s
-        merged.append(cur)
-        return merged
+                out.extend((s_start + s, s_start + e, label) for (s, e, label) in hit)
+        return misses
 
-    @staticmethod
-    def _repeat_to_length(token: str, length: int) -> str:
-        """token を繰り返して指定長にし、超過分は切り詰める。"""
-        if length <= 0:
-            return ""
-        times, rem = divmod(length, len(token))
-        return token * times + token[:rem]
+    def _store_cached(
+        self, text: str, sent_spans: list[tuple[int, int]], ents: list[tuple[int, int, str]]
+    ) -> None:
+        """
+        NER を実行した文ごとに、文内オフセットへ変換した検出結果をキャッシュする。
+        - ents は開始位置の昇順であること
+        - 文をまたぐエンティティがある文は、単独で解析した結果と異なり得るためキャッシュしない
+        """
+        assert self.cache is not None
+        items: list[tuple[bytes, tuple[tuple[int, int, str], ...]]] = []
+        i = 0
+        carry = -1  # 文をまたぐエンティティの終了位置（ここまでの文はキャッシュしない）
+        for s_start, s_end in sent_spans:
+            rel: list[tuple[int, int, str]] = []
+            cacheable = s_start >= carry
+            while i < len(ents) and ents[i][0] < s_end:
+                start, end, label = ents[i]
+                i += 1
+                if end > s_end:
+                    cacheable = False
+                    carry = max(carry, end)
+                elif start >= s_start:
+                    rel.append((start - s_start, end - s_start, label))
+            if cacheable:
+                items.append((self._cache_key(text[s_start:s_end]), tuple(rel)))
+        self.cache.put_many(items)
+
+    def cache_stats(self) -> dict[str, int] | None:
+        """NER キャッシュの監視用カウンタ（無効時は None）。"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def after_fork(self) -> None:
+        """
+        fork した子プロセスで呼ぶ（pre-fork 起動用。backend/serve.py）。
+        - ロック・SQLite 接続・辞書の監視スレッドは fork で引き継げないため作り直す
+        - spaCy パイプラインは読み取り専用として親プロセスのページを共有する
+        """
+        if self.cache is not None:
+            self.cache.after_fork()
+        if self.dictionary is not None:
+            self.dictionary.after_fork()
+
+    def _regex_pii(self, text: str, allow: Iterable[str]) -> list[tuple[int, int, str]]:
+        """有効な正規表現ルールを1本にまとめた正規表現で適用する（テキストの走査は1回。backend.services.detectors）。"""
+        return self.regex.find(text, allow)
+
+    def _dictionary_pii(self, text: str, allow: Iterable[str]) -> list[tuple[int, int, str]]:
+        """ユーザ辞書の語を検出する（辞書が無効なら空）。"""
+        if self.dictionary is None:
+            return []
+        return self.dictionary.find(text, allow)
 
     def mask(
         self,
@@ -135,105 +426,215 @@ class Masker:
         replacement: str = "＊",
         preserve_length: bool = True,
         fixed_length: int | None = None,
+        deadline: float | None = None,
+        ner_spans: list[Span] | None = None,
     ) -> tuple[str, list[Span]]:
         """
         テキストを対象ラベルでマスクする。
 
+        deadline: 処理期限（time.time() の絶対時刻）。開始時と NER のウィンドウごとに確認し、
+          過ぎていれば DeadlineExceeded を送出する
+        ner_spans: 別途求めた NER の検出結果（全文オフセット。detect_ner をチャンクごとに並列実行した場合など）。
+          指定時は文分割・NER を省略し、正規表現・ユーザ辞書の補完とマスク適用のみ行う
         戻り値: (masked_text, detected_spans)
-          - detected_spans は全文オフセット・元検出スパン（マージ前）
-        """
-        allow = targets or [
-            "PERSON",
-            "LOCATION",
-            "ORGANIZATION",
-            "EMAIL",
-            "PHONE",
-            "URL",
-        ]
-        allow_set = {t.upper() for t in allow}
+          - detected_spans は全文オフセット・元検出スパン（マージ前）。masked_start/masked_end はマスク後オフセット
+        """
+        if _expired(deadline):
+            raise DeadlineExceeded
+        allow_set = self._allow_set(targets)
+        if ner_spans is not None:
+            detected = [(s.start, s.end, s.label) for s in ner_spans if s.label in allow_set]
+            return self._apply(text, detected, allow_set, replacement, preserve_length, fixed_length)
+        detected = self._detect_ner(text, allow_set, deadline)
+        return self._apply(text, detected, allow_set, replacement, preserve_length, fixed_length)
 
-        detected: list[Span] = []
+    def detect_ner(
+        self, text: str, targets: list[str] | None = None, deadline: float | None = None
+    ) -> list[Span]:
+        """
+        NER のみを実行し、対象ラベルの検出スパン（text 内のオフセット）を返す。
+        - 大きな文書をチャンクに分けて並列に NER を実行する場合に使う（backend.services.parallel）
+        """
+        if _expired(deadline):
+            raise DeadlineExceeded
+        detected = self._detect_ner(text, self._allow_set(targets), deadline)
+        return [Span(s, e, label, text[s:e]) for (s, e, label) in detected]
 
-        # 文分割
+    def _detect_ner(self, text: str, allow_set: set[str], deadline: float | None) -> list[tuple[int, int, str]]:
+        # 文分割 → キャッシュ照会 → ウィンドウへ詰め直し → NER（バッチ実行）
+        t0 = time.perf_counter()
         sent_spans = self._sentence_spans(text)
-        for (s_start, s_end) in sent_spans:
-            sent = text[s_start:s_end]
-            doc = self.nlp(sent)
-            for ent in doc.ents:
-                mapped = self._map_label(ent.label_)
-                if mapped and mapped in allow_set:
-                    start = s_start + ent.start_char
-                    end = s_start + ent.end_char
-                    detected.append(Span(start, end, mapped, text[start:end]))
+        t1 = time.perf_counter()
+        detected = self._ner_spans(text, sent_spans, allow_set, deadline)
+        _observe_stage("split", t1 - t0)
+        _observe_stage("ner", time.perf_counter() - t1)
+        return detected
 
-        # 正規表現での補完
-        detected.extend(self._regex_pii(text, allow_set))
+    def mask_many(self, items: list[dict[str, Any]]) -> list[tuple[str, list[Span]] | Exception]:
+        """
+        複数テキストをまとめてマスクする（NER は全件の文を1回の nlp.pipe に流す）。
 
-        # マージはマスク適用用にのみ
-        merged = self._merge_spans([Span(s.start, s.end, s.label, s.text) for s in detected])
+        items: mask() と同じキーワード引数の dict のリスト
+        戻り値: 入力順の結果リスト。各要素は (masked_text, detected_spans) または、
+          その要素の処理で発生した例外（他の要素の処理は継続する）
+        - deadline は要素ごと。期限切れの要素は DeadlineExceeded とし、NER は全要素が期限切れになった時点で打ち切る
+        """
+        results: dict[int, tuple[str, list[Span]] | Exception] = {}
+        live: list[int] = []
+        jobs: list[tuple[str, list[tuple[int, int]], set[str]]] = []
+        for i, item in enumerate(items):
+            if _expired(item.get("deadline")):
+                results[i] = DeadlineExceeded()
+                continue
+            text = item["text"]
+            t0 = time.perf_counter()
+            sent_spans = self._sentence_spans(text)
+            _observe_stage("split", time.perf_counter() - t0)
+            jobs.append((text, sent_spans, self._allow_set(item.get("targets"))))
+            live.append(i)
+        # 期限の無い要素が1つでもあれば打ち切らない
+        deadlines = [items[i].get("deadline") for i in live]
+        batch_deadline = None if None in deadlines else max(deadlines, default=None)
+        # NER はバッチ全体で1回の記録
+        t0 = time.perf_counter()
+        try:
+            ner_results = self._ner_batch(jobs, batch_deadline)
+        except DeadlineExceeded:
+            for i in live:
+                results[i] = DeadlineExceeded()
+            return [results[i] for i in range(len(items))]
+        _observe_stage("ner", time.perf_counter() - t0)
+
+        for i, (text, _, allow_set), detected in zip(live, jobs, ner_results, strict=True):
+            item = items[i]
+            if _expired(item.get("deadline")):
+                results[i] = DeadlineExceeded()
+                continue
+            try:
+                results[i] = self._apply(
+                    text,
+                    detected,
+                    allow_set,
+                    item.get("replacement", "＊"),
+                    item.get("preserve_length", True),
+                    item.get("fixed_length"),
+                )
+            except Exception as e:  # noqa: BLE001
+                results[i] = e
+        return [results[i] for i in range(len(items))]
+
+    @staticmethod
+    def _merge_regions(detected: list[tuple[int, int, str]]) -> list[list[int]]:
+        """重複/隣接をまとめた領域 [start, end] のリスト（開始位置の昇順）。"""
+        regions: list[list[int]] = []
+        for start, end, _ in sorted(detected):
+            if regions and start <= regions[-1][1]:  # 重なり or 隣接
+                if end > regions[-1][1]:
+                    regions[-1][1] = end
+            else:
+                regions.append([start, end])
+        return regions
 
-        # マスク適用しつつ、マスク後オフセットを計算
+    @staticmethod
+    def _render(
+        text: str,
+        detected: list[tuple[int, int, str]],
+        regions: list[list[int]],
+        replacement: str,
+        preserve_length: bool,
+        fixed_length: int | None,
+    ) -> tuple[str, list[int], list[int]]:
+        """
+        マージ後の領域をマスクし、(masked_text, masked_starts, masked_ends) を返す（オフセットはスパンごと・入力順）。
+        - マスク後も長さが同じ領域では領域内の相対位置を保つ
+        - 長さが変わる領域（fixed_length / preserve_length=False）では領域全体を指す
+        """
         result: list[str] = []
         last = 0
-        masked_offset_map: list[tuple[int, int, int]] = []  # (orig_start, orig_end, masked_len)
-        for sp in merged:
-            if last < sp.start:
-                result.append(text[last:sp.start])
-            span_len = sp.end - sp.start
-            if fixed_length is not None:
-                repl = self._repeat_to_length(replacement, fixed_length)
+        delta = 0  # ここまでのマスクによる長さの増減（マスク後位置 = 原文位置 + delta）
+        region_starts: list[int] = []
+        placed: list[tuple[int, int, int]] = []  # (orig_end, masked_start, masked_len)
+        fixed = repeat_to_length(replacement, fixed_length) if fixed_length is not None else None
+        for start, end in regions:
+            if last < start:
+                result.append(text[last:start])
+            span_len = end - start
+            if fixed is not None:
+                repl = fixed
             elif preserve_length:
-                repl = self._repeat_to_length(replacement, span_len)
+                repl = repeat_to_length(replacement, span_len)
             else:
                 repl = replacement
             result.append(repl)
-            masked_offset_map.append((sp.start, sp.end, len(repl)))
-            last = sp.end
+            region_starts.append(start)
+            placed.append((end, start + delta, len(repl)))
+            delta += len(repl) - span_len
+            last = end
         if last < len(text):
             result.append(text[last:])
 
-        masked = "".join(result)
-
-        # 元スパンごとに masked 側の start/end を算出
-        def calc_masked_offsets(s: Span) -> tuple[int, int]:
-            masked_cursor = 0
-            orig_cursor = 0
-            masked_start = None
-            masked_end = None
-            for m_start, m_end, m_len in masked_offset_map:
-                # 原文の未マスク領域の長さ
-                if orig_cursor < m_start:
-                    gap = m_start - orig_cursor
-                    if s.start >= orig_cursor and s.start < m_start and masked_start is None:
-                        masked_start = masked_cursor + (s.start - orig_cursor)
-                    if s.end > orig_cursor and s.end <= m_start and masked_end is None:
-                        masked_end = masked_cursor + (s.end - orig_cursor)
-                    masked_cursor += gap
-                    orig_cursor = m_start
-                # マスク領域
-                if s.start >= m_start and s.start < m_end and masked_start is None:
-                    masked_start = masked_cursor
-                if s.end > m_start and s.end <= m_end and masked_end is None:
-                    masked_end = masked_cursor + m_len
-                masked_cursor += m_len
-                orig_cursor = m_end
-            # 残りの未マスク領域
-            if orig_cursor < len(text):
-                if masked_start is None and s.start >= orig_cursor:
-                    masked_start = masked_cursor + (s.start - orig_cursor)
-                if masked_end is None and s.end >= orig_cursor:
-                    masked_end = masked_cursor + (s.end - orig_cursor)
-            # フォールバック
-            if masked_start is None:
-                masked_start = s.start
-            if masked_end is None:
-                masked_end = masked_start
-            return masked_start, masked_end
-
-        detected_with_masked: list[Span] = []
-        # 既存の Span を再利用し、後段で router で masked_* を組み立てるため保持
-        for s in detected:
-            _ = calc_masked_offsets(s)
-            detected_with_masked.append(s)
-
-        return masked, detected_with_masked
+        # 元スパンごとに masked 側の start/end を求める（各スパンはいずれかのマージ後領域に含まれる）
+        masked_starts: list[int] = []
+        masked_ends: list[int] = []
+        for start, end, _ in detected:
+            k = bisect_right(region_starts, start) - 1
+            r_start = region_starts[k]
+            r_end, m_start, m_len = placed[k]
+            if m_len == r_end - r_start:
+                masked_starts.append(m_start + (start - r_start))
+                masked_ends.append(m_start + (end - r_start))
+            else:
+                masked_starts.append(m_start)
+                masked_ends.append(m_start + m_len)
+        return "".join(result), masked_starts, masked_ends
+
+    def _apply(
+        self,
+        text: str,
+        detected: list[tuple[int, int, str]],
+        allow_set: set[str],
+        replacement: str,
+        preserve_length: bool,
+        fixed_length: int | None,
+    ) -> tuple[str, list[Span]]:
+        """
+        NER 検出結果 (start, end, label) に正規表現・ユーザ辞書の検出を補完し、マージしてマスクを適用する。
+        - スパンが VECTORIZE_MIN_SPANS 件以上なら、マージ・描画・マスク後オフセットの計算を配列演算で行う
+        """
+        # 正規表現・ユーザ辞書での補完
+        t0 = time.perf_counter()
+        detected = detected + self._regex_pii(text, allow_set)
+        t1 = time.perf_counter()
+        detected += self._dictionary_pii(text, allow_set)
+        t2 = time.perf_counter()
+
+        # マージはマスク適用用にのみ
+        if len(detected) >= VECTORIZE_MIN_SPANS:
+            # CI の OpenAPI 生成時など、トップレベルimportで重依存を解決しないため局所import
+            from backend.services.spans import SpanArrays, render
+
+            spans = SpanArrays.from_triples(detected)
+            arrays = spans.merged()
+            t3 = time.perf_counter()
+            masked, starts_arr, ends_arr = render(text, spans, arrays, replacement, preserve_length, fixed_length)
+            masked_starts, masked_ends = starts_arr.tolist(), ends_arr.tolist()
+        else:
+            regions = self._merge_regions(detected)
+            t3 = time.perf_counter()
+            masked, masked_starts, masked_ends = self._render(
+                text, detected, regions, replacement, preserve_length, fixed_length
+            )
+        result = [
+            Span(s, e, label, text[s:e], m_s, m_e)
+            for (s, e, label), m_s, m_e in zip(detected, masked_starts, masked_ends, strict=True)
+        ]
+
+        _observe_stage("regex", t1 - t0)
+        _observe_stage("dictionary", t2 - t1)
+        _observe_stage("merge", t3 - t2)
+        _observe_stage("render", time.perf_counter() - t3)
+        METRICS.observe("masker_input_chars", len(text))
+        METRICS.observe("masker_entities", len(result))
+        for label, n in Counter(label for _, _, label in detected).items():
+            METRICS.inc("masker_detected_total", (("label", label),), n)
+        return masked, result
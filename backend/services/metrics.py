@@ -0,0 +1,220 @@
+"""
+処理メトリクス（Prometheus テキスト形式）
+
+- ヒストグラム/カウンタをスレッドごとのシャードに記録する（記録時はロックを取らない）
+- 出力時に全シャードを合算する（シャードの登録時のみロックを取る）
+- process 実行時はワーカプロセスで記録した差分（drain）を親プロセスへ返して合算する（merge）
+
+記録する値:
+- masker_stage_seconds{stage}: Masker 内の処理段ごとの所要時間
+  （split / ner / regex / dictionary / merge / render）
+- masker_input_chars: 入力テキストの文字数
+- masker_entities: 1文書あたりの検出件数
+- masker_detected_total{label}: ラベルごとの検出件数
+- mask_microbatch_items: /mask のマイクロバッチ1回あたりの要求数
+"""
+from __future__ import annotations
+
+import os
+import threading
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+# ヒストグラムの定義（名前 -> (説明, バケット上限)）
+HISTOGRAMS: dict[str, tuple[str, tuple[float, ...]]] = {
+    "masker_stage_seconds": (
+        "Masker の処理段ごとの所要時間（秒）",
+        (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    "masker_input_chars": (
+        "入力テキストの文字数",
+        (100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000),
+    ),
+    "masker_entities": (
+        "1文書あたりの検出件数",
+        (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000),
+    ),
+    "mask_microbatch_items": (
+        "/mask のマイクロバッチ1回あたりの要求数",
+        (1, 2, 4, 8, 16, 32, 64, 128),
+    ),
+}
+
+# カウンタの定義（名前 -> 説明）
+COUNTERS: dict[str, str] = {
+    "masker_detected_total": "ラベルごとの検出件数",
+    "mask_rejected_total": "受付制御で拒否したリクエスト数（理由別）",
+    "mask_deadline_exceeded_total": "処理期限を過ぎて打ち切ったリクエスト数",
+}
+
+# (メトリクス名, ラベルの組) -> 値
+_Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class _Shard:
+    """1スレッド分の記録領域。ヒストグラムはバケットごとの件数（非累積）+ [合計, 件数]。"""
+
+    __slots__ = ("hist", "counters")
+
+    def __init__(self) -> None:
+        self.hist: dict[_Key, list[float]] = {}
+        self.counters: dict[_Key, float] = {}
+
+
+class Metrics:
+    """スレッドごとのシャードに記録し、出力時に合算するレジストリ。"""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[_Shard] = []
+        # 他プロセスから受け取った差分の合算先
+        self._merged = _Shard()
+        self._shards.append(self._merged)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, name: str, value: float, labels: tuple[tuple[str, str], ...] = ()) -> None:
+        """ヒストグラムへ値を記録する。"""
+        hist = self._shard().hist
+        key = (name, labels)
+        h = hist.get(key)
+        if h is None:
+            h = hist[key] = [0.0] * (len(HISTOGRAMS[name][1]) + 3)
+        h[bisect_left(HISTOGRAMS[name][1], value)] += 1
+        h[-2] += value
+        h[-1] += 1
+
+    def inc(self, name: str, labels: tuple[tuple[str, str], ...] = (), amount: float = 1) -> None:
+        """カウンタを加算する。"""
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def drain(self) -> tuple[dict[_Key, list[float]], dict[_Key, float]]:
+        """このスレッドで記録した値を取り出して空にする（ワーカプロセスから親へ返す用）。"""
+        shard = self._shard()
+        hist, counters = shard.hist, shard.counters
+        shard.hist, shard.counters = {}, {}
+        return hist, counters
+
+    @contextmanager
+    def discarded(self) -> Iterator[None]:
+        """このスレッドでブロック内に記録した値を捨てる（ウォームアップ用）。"""
+        shard = self._shard()
+        saved = shard.hist, shard.counters
+        shard.hist, shard.counters = {}, {}
+        try:
+            yield
+        finally:
+            shard.hist, shard.counters = saved
+
+    def merge(self, delta: tuple[dict[_Key, list[float]], dict[_Key, float]]) -> None:
+        """drain した差分を合算する。"""
+        hist, counters = delta
+        with self._lock:
+            _add(self._merged, hist, counters)
+
+    def snapshot(self) -> _Shard:
+        """全シャードの合算。"""
+        total = _Shard()
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # 記録中のスレッドと競合しないよう、要素をコピーしてから合算する
+            _add(total, dict(list(shard.hist.items())), dict(list(shard.counters.items())))
+        return total
+
+    def render(self, gauges: Iterable[tuple[str, str, float]] = ()) -> str:
+        """Prometheus テキスト形式で出力する。gauges: (名前, 説明, 値) の並び。"""
+        total = self.snapshot()
+        lines: list[str] = []
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_fmt(value)}"]
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (n, labels), h in sorted(total.hist.items()):
+                if n != name:
+                    continue
+                cumulative = 0.0
+                for le, count in zip((*buckets, "+Inf"), h, strict=False):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, le=le)} {_fmt(cumulative)}")
+                lines.append(f"{name}_sum{_labels(labels)} {_fmt(h[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {_fmt(h[-1])}")
+        for name, help_text in COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (n, labels), value in sorted(total.counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _add(target: _Shard, hist: dict[_Key, list[float]], counters: dict[_Key, float]) -> None:
+    for key, h in hist.items():
+        t = target.hist.get(key)
+        if t is None:
+            target.hist[key] = list(h)
+        else:
+            for i, v in enumerate(h):
+                t[i] += v
+    for key, v in counters.items():
+        target.counters[key] = target.counters.get(key, 0) + v
+
+
+def _labels(labels: tuple[tuple[str, str], ...], le: float | str | None = None) -> str:
+    pairs = [f'{k}="{v}"' for k, v in labels]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def process_rss_bytes() -> int:
+    """このプロセスの常駐メモリ（RSS）。/proc が無い環境では最大 RSS で代用する。"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource  # Windows には無いため局所import
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_memory(pid: int | str = "self") -> dict[str, int] | None:
+    """
+    プロセスのメモリ内訳（バイト）。/proc/<pid>/smaps_rollup が読めない環境では None。
+    - rss: 常駐メモリ
+    - pss: 共有ページをプロセス数で按分した値（全プロセスの合計がホストの実使用量の目安）
+    - unique: このプロセスだけが使うページ（USS。プロセスを1つ増やしたときに増える量の目安）
+    - shared: 他プロセスと共有しているページ（pre-fork 時のモデル等）
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            fields = {
+                key: int(rest.split()[0]) * 1024
+                for key, _, rest in (line.partition(":") for line in f)
+                if rest.strip().endswith("kB")
+            }
+    except (OSError, ValueError, IndexError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+# プロセス共通のレジストリ
+METRICS = Metrics()
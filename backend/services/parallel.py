@@ -0,0 +1,76 @@
+"""
+大きな文書の文書内並列処理
+
+- 文書をチャンクに分け（split_chunks）、チャンクごとの NER（Masker.detect_ner）を
+  実行器のワーカへ並列に投入する
+- 各チャンクの検出スパンを全文オフセットへずらして結合し、最後に全文に対して1回だけ
+  Masker.mask(ner_spans=...) で正規表現・ユーザ辞書の補完とマスク適用を行う
+  - 正規表現・辞書はチャンクに分けずに全文を走査するため、チャンク境界をまたぐ一致も
+    欠落・重複しない（NER に比べて十分速いため並列化の対象外とする）
+
+チャンクの切断位置:
+- NER は複数の文を window_chars 以内のウィンドウへ詰めて実行する（Masker._ner_windows）ため、
+  単に文境界で切るとウィンドウの分け方（NER が見る文脈）が変わりうる
+- そこで全文に対するウィンドウの開始位置のうち、文の先頭でもある位置でのみ切る
+  （ウィンドウは先頭から貪欲に詰めるため、その位置以降の分け方は一括処理と同じになる）
+- 長大な文の途中では切らない（その文を含むチャンクは上限を超えうる）
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from backend.services.masker import Span, ner_windows, sentence_spans
+
+# Masker のメソッドを実行する関数: (メソッド名, キーワード引数) -> 結果
+RunFn = Callable[..., Awaitable[Any]]
+
+
+def chunk_size(length: int, workers: int, max_chunk_chars: int) -> int:
+    """
+    チャンクの文字数（max_chunk_chars 以下）。
+    - ワーカあたり2チャンク以上になる大きさにし、チャンクごとの処理時間の偏りを均す
+    """
+    return max(1, min(max_chunk_chars, math.ceil(length / (2 * max(1, workers)))))
+
+
+def split_chunks(text: str, chunk_chars: int, window_chars: int) -> list[tuple[int, str]]:
+    """
+    text を (全文オフセット, チャンク) のリストへ分割する。
+    - 切るのは NER ウィンドウの開始位置かつ文の先頭のみ。次のウィンドウを加えると chunk_chars を超える時点で切る
+    - window_chars: Masker の NER ウィンドウの文字数上限（MASK_NER_WINDOW_CHARS）
+    """
+    sents = sentence_spans(text)
+    sent_starts = {start for start, _ in sents}
+    cuts: list[int] = [0]
+    for w_start, w_end in ner_windows(text, sents, window_chars):
+        if w_start > cuts[-1] and w_end - cuts[-1] > chunk_chars and w_start in sent_starts:
+            cuts.append(w_start)
+    cuts.append(len(text))
+    return [(start, text[start:end]) for start, end in zip(cuts, cuts[1:], strict=False)]
+
+
+async def mask_parallel(
+    run: RunFn,
+    text: str,
+    workers: int,
+    max_chunk_chars: int,
+    window_chars: int = 256,
+    **kwargs: Any,
+) -> tuple[str, list[Span]]:
+    """
+    text をチャンクに分けて NER を並列に実行し、(masked_text, detected_spans) を返す。
+    window_chars: ワーカの Masker の NER ウィンドウの文字数上限（チャンクの切断位置を揃えるため）
+    kwargs: Masker.mask と同じキーワード引数（targets/replacement/preserve_length/fixed_length/deadline）
+    """
+    ner_kwargs = {k: kwargs[k] for k in ("targets", "deadline") if k in kwargs}
+    chunks = split_chunks(text, chunk_size(len(text), workers, max_chunk_chars), window_chars)
+    results = await asyncio.gather(*(run("detect_ner", text=chunk, **ner_kwargs) for _, chunk in chunks))
+    ner_spans = [
+        Span(start + s.start, start + s.end, s.label, s.text)
+        for (start, _), spans in zip(chunks, results, strict=True)
+        for s in spans
+    ]
+    return await run("mask", text=text, ner_spans=ner_spans, **kwargs)
@@ -0,0 +1,135 @@
+"""
+大きな入力ファイルのシャード分割と再開用マニフェスト（一括マスク CLI の --job-dir）
+
+- 入力をメモリマップし、shard_bytes ごとの位置から次の改行までを境界としてバイト範囲のシャードに分ける
+  （レコードの途中で切らない。分割時に読むのは境界付近のみ）
+- 各シャードはワーカがメモリマップ上の自分の範囲だけを読み、1行ずつデコードして処理する
+  （ファイル全体をメモリへ読み込まないため、RAM より大きい入力も扱える）
+  - 先頭の UTF-8 BOM は読み飛ばす。UTF-8 として不正な行は置換せず、その行だけを失敗として扱う
+- ジョブディレクトリの manifest.json に入力（パス・サイズ・更新時刻）・処理条件・シャードごとの完了状態を記録する
+  - 出力は一時ファイルへ書いてから rename し、マニフェストも同様に置き換える（途中で落ちても壊れない）
+  - 再実行時は同じ入力・条件であることを確認し、完了済みのシャードを飛ばす
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import mmap
+import os
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ManifestMismatch(Exception):
+    """ジョブディレクトリのマニフェストが、今回の入力・処理条件と一致しない。"""
+
+
+@dataclass
+class Shard:
+    index: int
+    start: int
+    end: int
+    output: str
+    done: bool = False
+    docs: int = 0
+    errors: int = 0
+
+
+@dataclass
+class JobManifest:
+    input: str
+    size: int
+    mtime_ns: int
+    # 出力に影響する処理条件（入力形式・マスク方法・シャードの大きさ）
+    options: dict[str, Any]
+    shards: list[Shard] = field(default_factory=list)
+    version: int = MANIFEST_VERSION
+
+    @classmethod
+    def plan(cls, input_path: str, options: dict[str, Any], shard_bytes: int, suffix: str) -> JobManifest:
+        """入力をシャードに分割した新しいマニフェストを作る。"""
+        stat = os.stat(input_path)
+        shards = [
+            Shard(index=i, start=start, end=end, output=f"shard-{i:05d}{suffix}")
+            for i, (start, end) in enumerate(plan_shards(input_path, shard_bytes))
+        ]
+        return cls(
+            input=os.path.abspath(input_path),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            options=options,
+            shards=shards,
+        )
+
+    @classmethod
+    def load(cls, job_dir: Path) -> JobManifest | None:
+        path = job_dir / MANIFEST_NAME
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        data["shards"] = [Shard(**s) for s in data.get("shards", [])]
+        return cls(**data)
+
+    def save(self, job_dir: Path) -> None:
+        """マニフェストを一時ファイルへ書いてから置き換える。"""
+        tmp = job_dir / (MANIFEST_NAME + ".tmp")
+        tmp.write_text(json.dumps(asdict(self), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, job_dir / MANIFEST_NAME)
+
+    def check(self, other: JobManifest) -> None:
+        """同じ入力・処理条件のジョブか確認する（異なれば ManifestMismatch）。"""
+        for key in ("version", "input", "size", "mtime_ns", "options"):
+            if getattr(self, key) != getattr(other, key):
+                raise ManifestMismatch(f"ジョブディレクトリの {key} が今回の実行と異なります")
+
+    def pending(self, job_dir: Path) -> list[Shard]:
+        """未完了のシャード（完了済みでも出力が無いものを含む）。"""
+        return [s for s in self.shards if not (s.done and (job_dir / s.output).exists())]
+
+
+def plan_shards(path: str, shard_bytes: int) -> list[tuple[int, int]]:
+    """ファイルを改行位置で揃えたバイト範囲 [start, end) に分ける。"""
+    if shard_bytes < 1:
+        raise ValueError("shard_bytes は1以上を指定してください")
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges: list[tuple[int, int]] = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + shard_bytes, size)
+            if end < size:
+                nl = mm.find(b"\n", end - 1)
+                end = size if nl < 0 else nl + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_records(path: str, start: int, end: int) -> Iterator[tuple[int, str | None]]:
+    """
+    バイト範囲 [start, end) の各行を (行頭のバイト位置, 改行を除いた行) として返す。
+    - ファイル先頭の UTF-8 BOM は行に含めない
+    - UTF-8 としてデコードできない行は None（内容を推測で置き換えない）
+    """
+    if start >= end:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        if pos == 0 and mm[: len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+            pos = len(codecs.BOM_UTF8)
+        while pos < end:
+            nl = mm.find(b"\n", pos, end)
+            stop = end if nl < 0 else nl + 1
+            try:
+                line: str | None = mm[pos:stop].decode("utf-8").rstrip("\r\n")
+            except UnicodeDecodeError:
+                line = None
+            yield pos, line
+            pos = stop
@@ -0,0 +1,106 @@
+"""
+検出スパンの列指向ストア（NumPy 配列）
+
+- 検出結果を start/end の配列で保持し、マージ・マスクの描画・マスク後オフセットの計算を配列演算で行う
+  （エンティティの多い文書で、スパンごとの Python の処理を避ける）
+- 配列の準備のコストがあるため、Masker はスパンが VECTORIZE_MIN_SPANS 件以上の場合にだけ使う
+- ラベルは配列演算に使わないため保持しない（ラベルごとの集計は Masker 側で行う）
+- numpy は spaCy の依存でもあるが、CI の OpenAPI 生成では入れないため Masker 側で局所importする
+
+注意:
+- マージは重なり・隣接するスパンを1つの領域にまとめる（開始位置の昇順、同じ開始位置では長い方が先）
+- 描画はマージ後の領域ごとにマスク文字列へ置き換える。区間の文字列化だけは Python の文字列操作で行う
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from backend.services.masker import repeat_to_length
+
+
+@dataclass(frozen=True)
+class SpanArrays:
+    """検出スパンの開始・終了位置の列（入力順）。"""
+
+    starts: np.ndarray
+    ends: np.ndarray
+
+    @classmethod
+    def from_triples(cls, triples: list[tuple[int, int, str]]) -> SpanArrays:
+        """(start, end, label) のリストから作る（ラベルは捨てる）。"""
+        if not triples:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty)
+        starts, ends, _ = zip(*triples, strict=True)
+        return cls(np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def merged(self) -> tuple[np.ndarray, np.ndarray]:
+        """重なり・隣接をまとめた領域の (starts, ends)（開始位置の昇順）。"""
+        if not len(self):
+            return self.starts, self.ends
+        order = np.lexsort((-self.ends, self.starts))
+        starts = self.starts[order]
+        ends = self.ends[order]
+        # 直前までの終了位置の最大値より後ろから始まるスパンが新しい領域の先頭
+        reach = np.maximum.accumulate(ends)
+        heads = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1])))
+        return starts[heads], np.maximum.reduceat(ends, heads)
+
+
+def render(
+    text: str,
+    spans: SpanArrays,
+    regions: tuple[np.ndarray, np.ndarray],
+    replacement: str,
+    preserve_length: bool,
+    fixed_length: int | None,
+) -> tuple[str, np.ndarray, np.ndarray]:
+    """
+    マージ後の領域（spans.merged()）をマスク文字列へ置き換え、(masked_text, masked_starts, masked_ends) を返す。
+    masked_starts/masked_ends はスパンごと（入力順）のマスク後オフセット。
+    - マスク後も長さが同じ領域では領域内の相対位置を保つ
+    - 長さが変わる領域（fixed_length / preserve_length=False）では領域全体を指す
+    """
+    r_starts, r_ends = regions
+    if not len(r_starts):
+        return text, spans.starts, spans.ends
+    r_lens = r_ends - r_starts
+    if fixed_length is not None:
+        repl: str | None = repeat_to_length(replacement, fixed_length)
+        m_lens = np.full_like(r_lens, len(repl))
+    elif preserve_length:
+        repl = None
+        m_lens = r_lens
+    else:
+        repl = replacement
+        m_lens = np.full_like(r_lens, len(repl))
+    # 領域のマスク後開始位置 = 原文の開始位置 + それより前の領域による長さの増減の累積
+    deltas = m_lens - r_lens
+    m_starts = r_starts + np.cumsum(deltas) - deltas
+
+    # 領域の間（マスクしない部分）を切り出し、マスク文字列と交互に連結する
+    bounds = zip([0, *r_ends.tolist()], [*r_starts.tolist(), len(text)], strict=True)
+    gaps = [text[a:b] for a, b in bounds]
+    if repl is not None:
+        masked = repl.join(gaps)
+    else:
+        # マスク文字列は長さごとに1回だけ作る
+        lengths = r_lens.tolist()
+        repls = {n: repeat_to_length(replacement, n) for n in set(lengths)}
+        parts: list[str] = [""] * (2 * len(gaps) - 1)
+        parts[0::2] = gaps
+        parts[1::2] = [repls[n] for n in lengths]
+        masked = "".join(parts)
+
+    # スパンごとに含まれる領域を求め、マスク後オフセットへ変換する
+    k = np.searchsorted(r_starts, spans.starts, side="right") - 1
+    base = m_starts[k]
+    rel = spans.starts - r_starts[k]
+    same = m_lens[k] == r_lens[k]
+    masked_starts = np.where(same, base + rel, base)
+    masked_ends = np.where(same, base + rel + (spans.ends - spans.starts), base + m_lens[k])
+    return masked, masked_starts, masked_ends
@@ -0,0 +1,82 @@
+"""
+ストリーミング入力のチャンク分割
+
+- 受信したバイト列を UTF-8 として逐次デコードし、文境界でチャンクへ切り出す
+- バッファには未処理の末尾のみを保持する（文書サイズに依らずメモリは一定）
+- 切り出したチャンクには全文オフセット（開始位置）を付与する
+
+切断位置:
+- 全角の文末記号（。．！？）と直後の閉じ括弧・引用符
+- 半角の ! / ? は直後が空白の場合のみ（URL のクエリ文字列などを切らないため）
+- 改行
+- 上記が max_chars 以内に無い場合は max_chars で強制的に切る
+"""
+from __future__ import annotations
+
+import codecs
+import re
+
+from backend.services.masker import CLOSERS, SENT_END
+
+_WIDE_ENDS = "".join(c for c in SENT_END if not c.isascii())
+_ASCII_ENDS = "".join(c for c in SENT_END if c.isascii())
+_CLOSERS = re.escape(CLOSERS)
+_RE_CUT = re.compile(
+    f"(?:[{re.escape(_WIDE_ENDS)}][{_CLOSERS}]*|[{re.escape(_ASCII_ENDS)}][{_CLOSERS}]*(?=\\s))|\\n"
+)
+
+
+class SentenceChunker:
+    """受信テキストを文境界で区切り、(全文オフセット, チャンク) を順に取り出す。"""
+
+    def __init__(self, chunk_chars: int = 4096, max_chars: int | None = None) -> None:
+        if chunk_chars < 1:
+            raise ValueError("chunk_chars は1以上を指定してください")
+        self.chunk_chars = chunk_chars
+        self.max_chars = max(max_chars or chunk_chars * 4, chunk_chars)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf: str = ""
+        # 次に切り出すチャンクの全文オフセット
+        self.offset: int = 0
+
+    def feed(self, data: bytes) -> list[tuple[int, str]]:
+        """受信データを追加し、切り出せるチャンクを返す（無ければ空）。"""
+        return self.feed_text(self._decoder.decode(data))
+
+    def feed_text(self, text: str) -> list[tuple[int, str]]:
+        """デコード済みのテキストを追加し、切り出せるチャンクを返す（無ければ空）。"""
+        self._buf += text
+        chunks: list[tuple[int, str]] = []
+        while len(self._buf) >= self.chunk_chars:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunks.append(self._take(cut))
+        return chunks
+
+    def close(self) -> list[tuple[int, str]]:
+        """入力終端。残りのバッファをチャンクとして返す。"""
+        self._buf += self._decoder.decode(b"", final=True)
+        return [self._take(len(self._buf))] if self._buf else []
+
+    def _find_cut(self) -> int | None:
+        """
+        max_chars 以内で最後の切断位置を返す。
+        - バッファ末尾に接する境界は採用しない（続く閉じ括弧や空白が未着の可能性があるため）
+        """
+        limit = min(len(self._buf) - 1, self.max_chars)
+        cut: int | None = None
+        for m in _RE_CUT.finditer(self._buf, 0, limit + 1):
+            if m.end() > limit:
+                break
+            cut = m.end()
+        if cut is None and len(self._buf) >= self.max_chars:
+            cut = self.max_chars
+        return cut
+
+    def _take(self, cut: int) -> tuple[int, str]:
+        chunk, self._buf = self._buf[:cut], self._buf[cut:]
+        start = self.offset
+        self.offset += len(chunk)
+        return start, chunk
+
@@ -0,0 +1,141 @@
+"""
+CSV/TSV のストリーミング処理
+
+- 受信したバイト列を UTF-8（BOM 付きも可）として逐次デコードし、完結したレコード（行）単位で切り出す
+  - 引用符で囲まれたフィールド内の改行を含むレコードも1レコードとして扱う
+    （csv モジュールと同じく、フィールド先頭の引用符だけを囲みとみなす。`5" screen` のような途中の引用符は文字）
+  - バッファには未完結の末尾のみを保持する（ファイルサイズに依らずメモリは一定）
+- レコードの解析・書き出しは標準の csv モジュールで行う（バッチ単位で1回）
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import re
+
+# 形式 -> 区切り文字
+DELIMITERS: dict[str, str] = {"csv": ",", "tsv": "\t"}
+
+
+class CsvFormatError(ValueError):
+    """入力が CSV/TSV として扱えない（1レコードが長すぎるなど）。"""
+
+
+class CsvRecordSplitter:
+    """
+    受信データを完結したレコード（改行込みの生テキスト）単位で切り出す。
+    - レコードの区切りは csv.reader（既定の方言: quotechar='"', doublequote=True）の解釈に合わせる
+    """
+
+    def __init__(self, delimiter: str = ",", max_record_chars: int = 1_000_000) -> None:
+        self.max_record_chars = max_record_chars
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf: str = ""
+        # 引用符と区切り文字の位置だけを走査する
+        self._tokens = re.compile(f'["{re.escape(delimiter)}]')
+        # 未完結のレコード（行の集まり）と、行末が引用符で囲まれたフィールドの途中かどうか
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._open_quote = False
+
+    def feed(self, data: bytes) -> list[str]:
+        """受信データを追加し、完結したレコードを返す（無ければ空）。"""
+        self._buf += self._decoder.decode(data)
+        cut = self._buf.rfind("\n") + 1
+        if cut == 0:
+            self._check_size(len(self._buf))
+            return []
+        lines, self._buf = self._buf[:cut], self._buf[cut:]
+        return self._collect([line + "\n" for line in lines[:-1].split("\n")])
+
+    def close(self) -> list[str]:
+        """入力終端。残りをレコードとして返す（引用符が閉じていなくても返し、解析側で扱う）。"""
+        self._buf += self._decoder.decode(b"", final=True)
+        records = self._collect([self._buf] if self._buf else [])
+        self._buf = ""
+        if self._pending:
+            records.append("".join(self._pending))
+            self._pending = []
+        return records
+
+    def _collect(self, lines: list[str]) -> list[str]:
+        records: list[str] = []
+        for line in lines:
+            if '"' in line:
+                self._open_quote = self._ends_in_quotes(line, self._open_quote)
+            if not self._open_quote and not self._pending:
+                records.append(line)
+                continue
+            self._pending.append(line)
+            self._pending_chars += len(line)
+            self._check_size(self._pending_chars)
+            if not self._open_quote:
+                records.append("".join(self._pending))
+                self._pending = []
+                self._pending_chars = 0
+        return records
+
+    def _ends_in_quotes(self, line: str, in_quotes: bool) -> bool:
+        """
+        行末で引用符で囲まれたフィールドの途中かどうか（in_quotes は行頭での状態）。
+        - 引用符はフィールド先頭にあるときだけ囲みを開く。囲みの中の "" はエスケープ
+        - 閉じ引用符の直後が区切り文字・引用符以外なら、以降はそのフィールドの文字（csv.reader の strict=False と同じ）
+        """
+        field_start = 0  # 囲まれていないフィールドの先頭位置（-1: 先頭を過ぎた）
+        closed_at = -1  # 直前に囲みを閉じた引用符の位置（-1: なし）
+        for m in self._tokens.finditer(line):
+            pos, char = m.start(), m.group()
+            if in_quotes:
+                if char == '"':
+                    in_quotes, closed_at = False, pos
+                continue
+            if closed_at >= 0:
+                if pos == closed_at + 1:
+                    if char == '"':
+                        in_quotes = True  # "" はエスケープされた引用符
+                    else:
+                        field_start = pos + 1
+                    closed_at = -1
+                    continue
+                closed_at, field_start = -1, -1
+            if char != '"':
+                field_start = pos + 1
+            elif pos == field_start:
+                in_quotes = True
+        return in_quotes
+
+    def _check_size(self, chars: int) -> None:
+        if chars > self.max_record_chars:
+            raise CsvFormatError(f"1レコードが {self.max_record_chars} 文字を超えています")
+
+
+def parse_records(records: list[str], delimiter: str) -> list[list[str]]:
+    """レコードの生テキストをフィールドのリストへ解析する（空行は空のリスト。行の並びを入力と揃える）。"""
+    return list(csv.reader(io.StringIO("".join(records)), delimiter=delimiter))
+
+
+def write_rows(rows: list[list[str]], delimiter: str) -> str:
+    """フィールドのリストを CSV/TSV のテキストへ書き出す（改行は \\n）。"""
+    out = io.StringIO()
+    csv.writer(out, delimiter=delimiter, lineterminator="\n").writerows(rows)
+    return out.getvalue()
+
+
+def resolve_columns(columns: list[str] | None, header: list[str] | None) -> list[int] | None:
+    """
+    マスク対象の列番号（0 始まり）を求める。None は全列。
+    - columns: 列名（header がある場合）または列番号。省略時は全列
+    - 存在しない列は CsvFormatError
+    """
+    if not columns:
+        return None
+    indexes: list[int] = []
+    for col in columns:
+        if header is not None and col in header:
+            indexes.append(header.index(col))
+        elif col.isdigit() and (header is None or int(col) < len(header)):
+            indexes.append(int(col))
+        else:
+            raise CsvFormatError(f"列が見つかりません: {col}")
+    return sorted(set(indexes))
@@ -0,0 +1,92 @@
+"""
+レスポンスの直列化（JSON / MessagePack）
+
+- Accept ヘッダから返す形式を決める（既定は JSON。MessagePack は msgpack がインストールされている場合のみ）
+- dict をそのまま直列化する（レスポンスモデルの検証・jsonable_encoder を通さない）
+- msgpack は任意の依存のため、最初に必要になった時点で import する
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+from typing import Any
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# MessagePack として受け付けるメディアタイプ
+_MSGPACK_TYPES: frozenset[str] = frozenset({MSGPACK, "application/x-msgpack", "application/vnd.msgpack"})
+
+
+class NotAcceptable(Exception):
+    """Accept ヘッダに対応できる形式が無い。"""
+
+
+def msgpack_available() -> bool:
+    return importlib.util.find_spec("msgpack") is not None
+
+
+def _parse_accept(accept: str) -> list[tuple[str, float]]:
+    """Accept ヘッダを (メディアタイプ, q) のリストへ分解する（記載順）。"""
+    items: list[tuple[str, float]] = []
+    for part in accept.split(","):
+        media, *params = (p.strip() for p in part.split(";"))
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        items.append((media.lower(), q))
+    return items
+
+
+def negotiate(accept: str | None) -> str:
+    """
+    返す形式（JSON または MSGPACK）を決める。
+    - 対応する形式が無い場合は JSON（従来どおり）。MessagePack を求められたが msgpack が無い場合は NotAcceptable
+    - 各形式の q は、最も具体的に一致する項目（完全一致 > application/* > */*）の値とする
+    - q の大きい形式を優先し、同じなら具体的に・先に書かれた形式を優先する。それも同じなら JSON
+    """
+    if not accept or not accept.strip():
+        return JSON
+    items = _parse_accept(accept)
+    candidates = [JSON, MSGPACK] if msgpack_available() else [JSON]
+    best: tuple[float, int, int] | None = None
+    chosen: str | None = None
+    for candidate in candidates:
+        match: tuple[int, int, float] | None = None  # (具体度, 位置, q)
+        for pos, (media, q) in enumerate(items):
+            if media == candidate or (candidate == MSGPACK and media in _MSGPACK_TYPES):
+                specificity = 2
+            elif media == "application/*":
+                specificity = 1
+            elif media == "*/*":
+                specificity = 0
+            else:
+                continue
+            if match is None or specificity > match[0]:
+                match = (specificity, pos, q)
+        if match is None or match[2] <= 0:
+            continue
+        score = (match[2], match[0], -match[1])
+        if best is None or score > best:
+            best, chosen = score, candidate
+    if chosen is None:
+        if any(media in _MSGPACK_TYPES and q > 0 for media, q in items):
+            raise NotAcceptable
+        return JSON
+    return chosen
+
+
+def encode(payload: Any, media_type: str) -> bytes:
+    """payload（dict/list/str/int/bool/None の組み合わせ）を直列化する。"""
+    if media_type == MSGPACK:
+        import msgpack  # 任意の依存のため局所import
+
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,191 @@
+"""
+アプリ設定
+
+- 環境変数から一度だけ読み込み、lifespan で app.state.settings に保持する
+- 不正値は既定値へフォールバックする（起動を止めない）
+
+環境変数:
+- MASK_MODEL: spaCy モデル名（既定 ja_ginza）
+- MASK_EXECUTOR: inline/thread/process（マスク処理の実行方式。既定 thread）
+- MASK_WORKERS: thread/process 時のワーカ数（既定 2）
+- MASK_NER_BATCH_SIZE: nlp.pipe のバッチサイズ（既定 64）
+- MASK_NER_N_PROCESS: nlp.pipe のプロセス数（既定 1）
+- MASK_NER_WINDOW_CHARS: NER ウィンドウの文字数上限（既定 256。0 で文単位のまま）
+- MASK_PIPELINE: full/ner（spaCy パイプラインのプロファイル。既定 ner）
+- MASK_PIPELINE_EXCLUDE: 除外するコンポーネント名（カンマ区切り。指定時はプロファイルより優先）
+- MASK_BATCH_MAX_ITEMS: /mask/batch の最大要素数（既定 1000）
+- MASK_MICROBATCH_MAX_ITEMS: 並行する /mask をまとめる最大件数（既定 32。1 で無効）
+- MASK_MICROBATCH_MAX_CHARS: マイクロバッチ1回あたりの最大文字数（既定 50000）
+- MASK_MICROBATCH_WINDOW_MS: 混雑時に追加の要求を待つ最大時間（ミリ秒。既定 5。閑散時は待たない）
+- MASK_PARALLEL_MIN_CHARS: この文字数以上の /mask は NER をワーカへ並列に投入する（既定 0 = 無効。thread/process のみ）
+- MASK_PARALLEL_CHUNK_CHARS: 並列処理のチャンク文字数の上限（既定 50000）
+- MASK_QUEUE_MAX_CHARS: 受け付ける処理待ち + 処理中の文字数の上限（既定 1000000。0 で無制限）
+- MASK_QUEUE_REJECT_STATUS: 上限超過時のステータス 503/429（既定 503。Retry-After を付与）
+- MASK_REQUEST_TIMEOUT_MS: 処理期限の既定値・上限（ミリ秒。既定 0 = なし。X-Request-Timeout-Ms で短縮可）
+- MASK_CSV_BATCH_ROWS: /mask/csv で1回の NER にまとめる行数（既定 256）
+- MASK_STREAM_CHUNK_CHARS: /mask/stream のチャンク文字数の目安（既定 4096）
+- MASK_NER_CACHE_SIZE: 文単位 NER キャッシュの最大件数（既定 10000。0 で無効）
+- MASK_NER_CACHE_TTL: NER キャッシュの有効期間（秒。既定 0 = 無期限）
+- MASK_NER_CACHE_DIR: 共有ディスクキャッシュ（SQLite）の配置ディレクトリ（未設定で無効）
+- MASK_NER_CACHE_DISK_SIZE: 共有ディスクキャッシュの最大件数（既定 1000000）
+- MASK_REGEX_RULES_FILE: 独自の正規表現ルール（JSON）のパス（未設定で組み込みルールのみ）
+- MASK_DICTIONARY_FILE: ユーザ辞書（TSV: 表記<TAB>ラベル）のパス（未設定で無効）
+- MASK_DICTIONARY_RELOAD: ユーザ辞書の更新確認の間隔（秒。既定 5。0 で再読み込みしない）
+- MASK_WARMUP_ROUNDS: 起動時のウォームアップの回数（既定 1。0 で無効）
+- MASK_WARMUP_FILE: ウォームアップに使うサンプル文のファイル（空行区切りで複数。未設定で組み込みの文）
+- MASK_SERVE_WORKERS: pre-fork 起動（backend/serve.py）のワーカプロセス数（既定 2）
+- MASK_SERVE_MAX_REQUESTS: ワーカを入れ替えるまでの処理リクエスト数（既定 0 = 入れ替えない）
+- MASK_SERVE_GRACEFUL_TIMEOUT: ワーカ停止時に処理中リクエストの完了を待つ秒数（既定 30）
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from backend.services.executor import MaskExecutor
+from backend.services.masker import PIPELINE_PROFILES, WARMUP_TEXTS
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value.strip() if value and value.strip() else default
+
+
+def _env_int(name: str, default: int, minimum: int | None = None) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+    except Exception:  # noqa: BLE001
+        return default
+    if minimum is not None and value < minimum:
+        return default
+    return value
+
+
+def _env_float(name: str, default: float, minimum: float | None = None) -> float:
+    try:
+        value = float(os.getenv(name, str(default)))
+    except Exception:  # noqa: BLE001
+        return default
+    if minimum is not None and value < minimum:
+        return default
+    return value
+
+
+def _env_list(name: str) -> tuple[str, ...] | None:
+    """カンマ区切りの環境変数を読む。未設定なら None（空文字は空タプル）。"""
+    value = os.getenv(name)
+    if value is None:
+        return None
+    return tuple(v.strip() for v in value.split(",") if v.strip())
+
+
+def _env_choice(name: str, default: str, choices: tuple[str, ...]) -> str:
+    value = _env_str(name, default).lower()
+    return value if value in choices else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """アプリ全体の設定値（不変）。"""
+
+    model_name: str = "ja_ginza"
+    executor_mode: str = "thread"
+    executor_workers: int = 2
+    ner_batch_size: int = 64
+    ner_n_process: int = 1
+    ner_window_chars: int = 256
+    pipeline: str = "ner"
+    pipeline_exclude: tuple[str, ...] | None = None
+    batch_max_items: int = 1000
+    microbatch_max_items: int = 32
+    microbatch_max_chars: int = 50_000
+    microbatch_window_ms: float = 5.0
+    parallel_min_chars: int = 0
+    parallel_chunk_chars: int = 50_000
+    queue_max_chars: int = 1_000_000
+    queue_reject_status: int = 503
+    request_timeout_ms: float = 0.0
+    csv_batch_rows: int = 256
+    stream_chunk_chars: int = 4096
+    ner_cache_size: int = 10000
+    ner_cache_ttl: float = 0.0
+    ner_cache_dir: str | None = None
+    ner_cache_disk_size: int = 1_000_000
+    regex_rules_file: str | None = None
+    dictionary_file: str | None = None
+    dictionary_reload: float = 5.0
+    warmup_rounds: int = 1
+    warmup_file: str | None = None
+    serve_workers: int = 2
+    serve_max_requests: int = 0
+    serve_graceful_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> Settings:
+        """環境変数から設定を構築する。"""
+        return cls(
+            model_name=_env_str("MASK_MODEL", cls.model_name),
+            executor_mode=_env_choice("MASK_EXECUTOR", cls.executor_mode, MaskExecutor.MODES),
+            executor_workers=_env_int("MASK_WORKERS", cls.executor_workers, minimum=1),
+            ner_batch_size=_env_int("MASK_NER_BATCH_SIZE", cls.ner_batch_size, minimum=1),
+            ner_n_process=_env_int("MASK_NER_N_PROCESS", cls.ner_n_process, minimum=1),
+            ner_window_chars=_env_int("MASK_NER_WINDOW_CHARS", cls.ner_window_chars, minimum=0),
+            pipeline=_env_choice("MASK_PIPELINE", cls.pipeline, tuple(PIPELINE_PROFILES)),
+            pipeline_exclude=_env_list("MASK_PIPELINE_EXCLUDE"),
+            batch_max_items=_env_int("MASK_BATCH_MAX_ITEMS", cls.batch_max_items, minimum=1),
+            microbatch_max_items=_env_int("MASK_MICROBATCH_MAX_ITEMS", cls.microbatch_max_items, minimum=1),
+            microbatch_max_chars=_env_int("MASK_MICROBATCH_MAX_CHARS", cls.microbatch_max_chars, minimum=1),
+            microbatch_window_ms=_env_float("MASK_MICROBATCH_WINDOW_MS", cls.microbatch_window_ms, minimum=0.0),
+            parallel_min_chars=_env_int("MASK_PARALLEL_MIN_CHARS", cls.parallel_min_chars, minimum=0),
+            parallel_chunk_chars=_env_int("MASK_PARALLEL_CHUNK_CHARS", cls.parallel_chunk_chars, minimum=1),
+            queue_max_chars=_env_int("MASK_QUEUE_MAX_CHARS", cls.queue_max_chars, minimum=0),
+            queue_reject_status=int(
+                _env_choice("MASK_QUEUE_REJECT_STATUS", str(cls.queue_reject_status), ("503", "429"))
+            ),
+            request_timeout_ms=_env_float("MASK_REQUEST_TIMEOUT_MS", cls.request_timeout_ms, minimum=0.0),
+            csv_batch_rows=_env_int("MASK_CSV_BATCH_ROWS", cls.csv_batch_rows, minimum=1),
+            stream_chunk_chars=_env_int("MASK_STREAM_CHUNK_CHARS", cls.stream_chunk_chars, minimum=1),
+            ner_cache_size=_env_int("MASK_NER_CACHE_SIZE", cls.ner_cache_size, minimum=0),
+            ner_cache_ttl=_env_float("MASK_NER_CACHE_TTL", cls.ner_cache_ttl, minimum=0.0),
+            ner_cache_dir=os.getenv("MASK_NER_CACHE_DIR") or None,
+            ner_cache_disk_size=_env_int("MASK_NER_CACHE_DISK_SIZE", cls.ner_cache_disk_size, minimum=1),
+            regex_rules_file=os.getenv("MASK_REGEX_RULES_FILE") or None,
+            dictionary_file=os.getenv("MASK_DICTIONARY_FILE") or None,
+            dictionary_reload=_env_float("MASK_DICTIONARY_RELOAD", cls.dictionary_reload, minimum=0.0),
+            warmup_rounds=_env_int("MASK_WARMUP_ROUNDS", cls.warmup_rounds, minimum=0),
+            warmup_file=os.getenv("MASK_WARMUP_FILE") or None,
+            serve_workers=_env_int("MASK_SERVE_WORKERS", cls.serve_workers, minimum=1),
+            serve_max_requests=_env_int("MASK_SERVE_MAX_REQUESTS", cls.serve_max_requests, minimum=0),
+            serve_graceful_timeout=_env_float(
+                "MASK_SERVE_GRACEFUL_TIMEOUT", cls.serve_graceful_timeout, minimum=0.0
+            ),
+        )
+
+    def masker_kwargs(self) -> dict[str, Any]:
+        """Masker のコンストラクタ引数（プロセスへ渡せるよう dict で返す）。"""
+        return {
+            "model_name": self.model_name,
+            "batch_size": self.ner_batch_size,
+            "n_process": self.ner_n_process,
+            "window_chars": self.ner_window_chars,
+            "pipeline": self.pipeline,
+            "exclude": self.pipeline_exclude,
+            "cache_size": self.ner_cache_size,
+            "cache_ttl": self.ner_cache_ttl or None,
+            "cache_dir": self.ner_cache_dir,
+            "disk_cache_size": self.ner_cache_disk_size,
+            "regex_rules_file": self.regex_rules_file,
+            "dictionary_file": self.dictionary_file,
+            "dictionary_reload_interval": self.dictionary_reload,
+        }
+
+    def warmup_texts(self) -> tuple[str, ...]:
+        """ウォームアップで処理する文（回数ぶん繰り返す）。ファイルは空行区切りで複数の文書として読む。"""
+        if self.warmup_rounds <= 0:
+            return ()
+        texts = WARMUP_TEXTS
+        if self.warmup_file:
+            with open(self.warmup_file, encoding="utf-8") as f:
+                texts = tuple(t.strip() for t in f.read().split("\n\n") if t.strip())
+        return texts * self.warmup_rounds
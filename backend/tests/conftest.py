@@ -0,0 +1,13 @@
+"""
+テスト共通の設定
+
+- inline_executor: マスク処理をイベントループ上で実行する（MASK_EXECUTOR=inline）
+  app.state.masker を Fake に差し替えるテストで使う
+  （既定の thread ではワーカが自前の Masker をロードし、差し替えが効かない）
+"""
+import pytest
+
+
+@pytest.fixture
+def inline_executor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("MASK_EXECUTOR", "inline")
@@ -4,6 +4,7 @@
 - 目的: FastAPI リクエスト/レスポンスの基本項目がログされること
 - PII保護: 既定では原文本文(text)はログに含めない
 - デバッグ時: 環境変数で有効化した場合のみ原文本文をログに含める
+- 本文のダイジェストはイベントループではなくログ書き込みのスレッドで計算する
 """
 from __future__ import annotations
 
@@ -11,14 +12,18 @@ import hashlib
 import json
 import logging
 import os
+import threading
 from typing import Any
 
 import pytest
 from backend.app import app
-from backend.middlewares.logging import setup_access_log_middleware
+from backend.middlewares.logging import AccessLogConfig, flush_access_log, setup_access_log_middleware
 from backend.services.masker import Span
 from fastapi.testclient import TestClient
 
+# app.state.masker を Fake に差し替えるため、マスク処理はイベントループ上で実行する
+pytestmark = pytest.mark.usefixtures("inline_executor")
+
 
 class _FakeMasker:
     """ルーターの動作を軽量化するための簡易スタブ。"""
@@ -72,6 +77,8 @@ def test_access_log_basic_without_body(monkeypatch: pytest.MonkeyPatch, caplog:
         caplog.set_level(logging.INFO, logger="app.access")
         res = client.post("/mask", json=body)
         assert res.status_code == 200
+        # ログはバックグラウンドで書き出されるため待つ
+        flush_access_log()
 
         # JSONメッセージを直接パース（caplog.records から message を取得）
         found_out = False
@@ -123,6 +130,8 @@ def test_access_log_with_debug_body(monkeypatch: pytest.MonkeyPatch, caplog: pyt
         caplog.set_level(logging.INFO, logger="app.access")
         res = client.post("/mask", json=body)
         assert res.status_code == 200
+        # ログはバックグラウンドで書き出されるため待つ
+        flush_access_log()
 
         # 本文がどこかのログ行に含まれること（JSONの req_body に入る）
         included = False
@@ -142,3 +151,86 @@ def test_access_log_with_debug_body(monkeypatch: pytest.MonkeyPatch, caplog: pyt
                     in_has_len = True
         assert included, "デバッグ時の本文ログが見つかりませんでした"
         assert in_has_len, "デバッグ時の IN ログに req_body_len がありません"
+
+
+def test_access_log_summary_from_router_channel(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """
+    OUT ログのマスク結果要約はルーターが渡した値を使い、リクエストIDはレスポンスヘッダにも返す。
+    """
+    monkeypatch.setenv("LOG_JSON", "true")
+    monkeypatch.setattr("backend.app.Masker", lambda *_args, **_kwargs: _FakeMasker())
+
+    with TestClient(app) as client:
+        client.app.state.masker = _FakeMasker()
+        caplog.set_level(logging.INFO, logger="app.access")
+        res = client.post("/mask", json={"text": "abcdefgWXYZhij"}, headers={"X-Request-ID": "req-1"})
+        assert res.status_code == 200
+        assert res.headers["X-Request-ID"] == "req-1"
+        flush_access_log()
+
+        logs = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.access"]
+        events = [(o["event"], o["request_id"]) for o in logs if o["path"] == "/mask"]
+        assert events == [("IN", "req-1"), ("OUT", "req-1")]
+        out = logs[-1]
+        assert out["masked_len"] == len(res.json()["masked"])
+        assert out["detected_count"] == 1
+        assert "masked_preview" not in out
+
+
+def test_body_digest_computed_on_writer_thread(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    threads: list[str] = []
+
+    def _recording(text: str) -> str:
+        threads.append(threading.current_thread().name)
+        return _digest(text)
+
+    monkeypatch.setenv("LOG_JSON", "true")
+    monkeypatch.setattr("backend.middlewares.logging._sha256_hex", _recording)
+    monkeypatch.setattr("backend.app.Masker", lambda *_args, **_kwargs: _FakeMasker())
+
+    with TestClient(app) as client:
+        client.app.state.masker = _FakeMasker()
+        caplog.set_level(logging.INFO, logger="app.access")
+        assert client.post("/mask", json={"text": "abcdefgWXYZhij"}).status_code == 200
+        flush_access_log()
+
+    logs = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.access"]
+    assert [o["req_body_digest"] for o in logs if o["event"] == "IN"] == [_digest("abcdefgWXYZhij")]
+    assert threads == ["access-log"]
+
+
+class _BrokenMasker(_FakeMasker):
+    def mask(self, *_args: Any, **_kwargs: Any) -> tuple[str, list[Span]]:
+        raise RuntimeError
+
+
+def test_sampling_keeps_errors(monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture) -> None:
+    """
+    LOG_SAMPLE=0 でも 5xx のリクエストは IN/OUT とも出力する。
+    """
+    monkeypatch.setenv("LOG_SAMPLE", "0")
+    monkeypatch.setattr("backend.app.Masker", lambda *_args, **_kwargs: _FakeMasker())
+
+    with TestClient(app) as client:
+        caplog.set_level(logging.INFO, logger="app.access")
+        client.app.state.masker = _FakeMasker()
+        assert client.post("/mask", json={"text": "abcdefgWXYZhij"}).status_code == 200
+        client.app.state.masker = _BrokenMasker()
+        assert client.post("/mask", json={"text": "abcdefgWXYZhij"}).status_code == 500
+        flush_access_log()
+
+        logs = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.access"]
+        assert [(o["event"], o.get("status")) for o in logs] == [("IN", None), ("OUT", 500)]
+        assert logs[0]["req_body_len"] == len("abcdefgWXYZhij")
+
+
+def test_sampling_by_request_id_is_deterministic() -> None:
+    config = AccessLogConfig(sample=0.25, sample_by_id=True)
+    ids = [f"req-{i}" for i in range(4000)]
+    first = [config.sampled(i) for i in ids]
+    assert first == [config.sampled(i) for i in ids]
+    assert 0.2 < sum(first) / len(ids) < 0.3
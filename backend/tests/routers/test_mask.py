@@ -1,10 +1,17 @@
 """
 ルーター層のユニットテスト
 
-- app.state.masker を Fake に置き換えてルートの入出力のみ検証
+- app.state.masker を Fake に置き換えてルートの入出力のみ検証（MASK_EXECUTOR=inline）
+- /mask/csv はマスク後の CSV/TSV をそのまま返し、列ごとの検出件数はトレーラで返すこと
+- 既定の thread 実行器でも /mask・/mask/batch が各ワーカの Masker で処理されること（Masker のロードは Fake に置き換え）
 """
+import json
+
+import msgpack
+import pytest
 from backend.app import app
-from backend.services.masker import Span
+from backend.services.admission import AdmissionController
+from backend.services.masker import DeadlineExceeded, Span
 from fastapi.testclient import TestClient
 
 
@@ -18,11 +25,27 @@ class _FakeMasker:
         fixed_length: int | None,  # noqa: ARG002 - テスト用Fakeのため未使用
     ) -> tuple[str, list[Span]]:
         # 固定のスパンを返す（EMAILとして [7, 11) をマスク）
-        detected = [Span(start=7, end=11, label="EMAIL", text=text[7:11])]
-        masked = text[:7] + (replacement * (4 if preserve_length else 1)) + text[11:]
+        repl = replacement * (4 if preserve_length else 1)
+        detected = [Span(7, 11, "EMAIL", text[7:11], masked_start=7, masked_end=7 + len(repl))]
+        masked = text[:7] + repl + text[11:]
         return masked, detected
 
+    def mask_many(self, items: list[dict]) -> list:
+        # "boom" を含む要素は要素単位の失敗として例外を返す
+        return [RuntimeError() if "boom" in it["text"] else self.mask(**it) for it in items]
+
+
+
+class _WorkerFakeMasker(_FakeMasker):
+    """thread 実行器のワーカがロードする Masker の代わり"""
 
+    def __init__(self, **_kwargs) -> None:
+        pass
+
+    def warm_up(self, _texts) -> float:
+        return 0.0
+
+@pytest.mark.usefixtures("inline_executor")
 def test_router_uses_app_state_masker() -> None:
     with TestClient(app) as client:
         client.app.state.masker = _FakeMasker()
@@ -33,3 +56,257 @@ def test_router_uses_app_state_masker() -> None:
         assert body["original"] == payload["text"]
         assert body["masked"][7:11] == "＊＊＊＊"
         assert any(d["label"] == "EMAIL" for d in body["detected"])
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_batch_preserves_order_and_reports_item_errors() -> None:
+    with TestClient(app) as client:
+        client.app.state.masker = _FakeMasker()
+        payload = {
+            "items": [
+                {"text": "abcdefgWXYZhij"},
+                {"text": ""},
+                {"text": "boom-boom-boom"},
+                {"text": "0123456789abcd", "masking": {"replacement": "#", "preserve_length": False}},
+            ]
+        }
+        res = client.post("/mask/batch", json=payload)
+        assert res.status_code == 200
+        results = res.json()["results"]
+        assert [r["index"] for r in results] == [0, 1, 2, 3]
+        assert results[0]["result"]["masked"][7:11] == "＊＊＊＊"
+        assert results[1]["error"] == "text は必須です"
+        assert results[2]["error"] == "内部エラー"
+        assert results[2]["result"] is None
+        assert results[3]["result"]["masked"] == "0123456#bcd"
+        # マスク後オフセットはサービスの値をそのまま返す
+        assert results[3]["result"]["detected"][0]["masked_end"] == 8
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_output_projection_columnar_and_msgpack(monkeypatch) -> None:
+    with TestClient(app) as client:
+        client.app.state.masker = _FakeMasker()
+        text = "abcdefgWXYZhij"
+        output = {"include_original": False, "include_entity_text": False}
+        body = client.post("/mask", json={"text": text, "output": output}).json()
+        assert body == {
+            "masked": "abcdefg＊＊＊＊hij",
+            "detected": [{"label": "EMAIL", "start_char": 7, "end_char": 11, "masked_start": 7, "masked_end": 11}],
+        }
+
+        output = {"include_original": False, "include_masked": False, "format": "columnar"}
+        res = client.post("/mask/batch", json={"items": [{"text": text, "output": output}, {"text": ""}]})
+        assert res.json()["results"] == [
+            {
+                "index": 0,
+                "result": {
+                    "detected_columns": {
+                        "label": ["EMAIL"],
+                        "start_char": [7],
+                        "end_char": [11],
+                        "masked_start": [7],
+                        "masked_end": [11],
+                        "text": ["WXYZ"],
+                    }
+                },
+                "error": None,
+            },
+            {"index": 1, "result": None, "error": "text は必須です"},
+        ]
+
+        res = client.post("/mask", json={"text": text}, headers={"Accept": "application/msgpack"})
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(res.content) == client.post("/mask", json={"text": text}).json()
+
+        # msgpack が無い環境で MessagePack のみを求められた場合は 406
+        monkeypatch.setattr("backend.services.wire.msgpack_available", lambda: False)
+        res = client.post("/mask", json={"text": text}, headers={"Accept": "application/msgpack"})
+        assert res.status_code == 406
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_queue_full_rejects_with_retry_after(monkeypatch) -> None:
+    monkeypatch.setenv("MASK_QUEUE_REJECT_STATUS", "429")
+    with TestClient(app) as client:
+        client.app.state.masker = _FakeMasker()
+        admission = AdmissionController(max_chars=20)
+        client.app.state.admission = admission
+        # 処理中の要求（10文字）がある状態で、上限を超える要求は拒否される
+        admission.admit(10)
+        res = client.post("/mask", json={"text": "abcdefgWXYZhij"})
+        assert res.status_code == 429
+        assert int(res.headers["Retry-After"]) >= 1
+        res = client.post("/mask/batch", json={"items": [{"text": "abcdefgWXYZ"}]})
+        assert res.status_code == 429
+        # 上限内なら受け付け、処理後に解放される
+        res = client.post("/mask", json={"text": "abcdefgWXY"})
+        assert res.status_code == 200
+        assert (admission.chars, admission.requests) == (10, 1)
+        metrics = client.get("/metrics").text
+        assert 'mask_rejected_total{reason="queue_full"} 2' in metrics
+        assert "mask_queue_chars 10" in metrics
+
+
+class _DeadlineMasker(_FakeMasker):
+    """deadline を受け取ったら期限切れとして扱うスタブ"""
+
+    def mask(self, text: str, deadline: float | None = None, **kwargs) -> tuple[str, list[Span]]:
+        if deadline is not None:
+            raise DeadlineExceeded
+        return super().mask(text, **kwargs)
+
+    def mask_many(self, items: list[dict]) -> list:
+        return [DeadlineExceeded() if "deadline" in it else self.mask(**it) for it in items]
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_request_timeout_header() -> None:
+    with TestClient(app) as client:
+        client.app.state.masker = _DeadlineMasker()
+        headers = {"X-Request-Timeout-Ms": "50"}
+        res = client.post("/mask", json={"text": "abcdefgWXYZhij"}, headers=headers)
+        assert res.status_code == 504
+        res = client.post("/mask/batch", json={"items": [{"text": "abcdefgWXYZhij"}]}, headers=headers)
+        assert res.status_code == 504
+        res = client.post("/mask", json={"text": "abcdefgWXYZhij"}, headers={"X-Request-Timeout-Ms": "-1"})
+        assert res.status_code == 400
+        # ヘッダが無ければ期限なし
+        assert client.post("/mask", json={"text": "abcdefgWXYZhij"}).status_code == 200
+        assert "mask_deadline_exceeded_total 2" in client.get("/metrics").text
+
+
+class _DigitMasker:
+    """数字を PHONE としてマスクする簡易スタブ（チャンク単位の呼び出しを記録）"""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def mask(self, text: str, **_kwargs) -> tuple[str, list[Span]]:
+        self.calls.append(text)
+        detected = [Span(i, i + 1, "PHONE", c, i, i + 1) for i, c in enumerate(text) if c.isdigit()]
+        return "".join("＊" if c.isdigit() else c for c in text), detected
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_stream_emits_ndjson_with_global_offsets(monkeypatch) -> None:
+    monkeypatch.setenv("MASK_STREAM_CHUNK_CHARS", "8")
+    text = "電話は0120です。明日1時に。あとで3回！"
+    with TestClient(app) as client:
+        masker = _DigitMasker()
+        client.app.state.masker = masker
+
+        def _body():
+            data = text.encode("utf-8")
+            for i in range(0, len(data), 5):
+                yield data[i : i + 5]
+
+        res = client.post("/mask/stream", content=_body(), headers={"Content-Type": "text/plain"})
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in res.text.splitlines()]
+        chunks, summary = lines[:-1], lines[-1]
+        assert len(chunks) == len(masker.calls) > 1
+        assert "".join(c["masked"] for c in chunks) == "電話は＊＊＊＊です。明日＊時に。あとで＊回！"
+        detected = [d for c in chunks for d in c["detected"]]
+        assert [text[d["start_char"]] for d in detected] == list("012013")
+        assert summary == {"done": True, "chars": len(text), "masked_chars": len(text), "detected_count": 6}
+
+
+class _DigitBatchMasker(_DigitMasker):
+    def mask_many(self, items: list[dict]) -> list:
+        return [self.mask(**it) for it in items]
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_csv_masks_selected_columns_in_row_batches(monkeypatch) -> None:
+    monkeypatch.setenv("MASK_CSV_BATCH_ROWS", "2")
+    text = 'id,name,tel\n1,山田,03-1234\n\n2,"佐藤\n花子",090\n3,鈴木,\n'
+    with TestClient(app) as client:
+        masker = _DigitBatchMasker()
+        client.app.state.masker = masker
+        res = client.post(
+            "/mask/csv", params={"columns": ["tel"]}, content=text.encode(), headers={"Content-Type": "text/csv"}
+        )
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/csv")
+        # マスク後の CSV をそのまま返す（空行も保つ。空のセルは NER に流さない）
+        assert res.text == 'id,name,tel\n1,山田,＊＊-＊＊＊＊\n\n2,"佐藤\n花子",＊＊＊\n3,鈴木,\n'
+        assert masker.calls == ["03-1234", "090"]
+        # TE: trailers が無ければトレーラは送らない
+        assert "trailer" not in res.headers
+
+        res = client.post("/mask/csv", params={"columns": ["email"]}, content=text.encode())
+        assert res.status_code == 400
+
+        res = client.post("/mask/csv", params={"format": "tsv", "header": "false"}, content=b"a\t12\n")
+        assert res.headers["content-type"].startswith("text/tab-separated-values")
+        assert res.text == "a\t＊＊\n"
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_csv_reports_counts_in_trailers() -> None:
+    text = "id,氏名,tel\n1,山田2,03-1234\n\n"
+    messages: list[dict] = []
+
+    async def call() -> None:
+        # サーバがトレーラ（ASGI の http.response.trailers 拡張）に対応している場合
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/mask/csv",
+            "raw_path": b"/mask/csv",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"text/csv"), (b"te", b"trailers")],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+            "extensions": {"http.response.trailers": {}},
+        }
+        chunks = [{"type": "http.request", "body": text.encode(), "more_body": False}]
+
+        async def receive() -> dict:
+            return chunks.pop(0) if chunks else {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            messages.append(message)
+
+        await app(scope, receive, send)
+
+    with TestClient(app) as client:
+        client.app.state.masker = _DigitBatchMasker()
+        client.portal.call(call)
+    start = messages[0]
+    assert start["trailers"] is True
+    assert (b"trailer", b"X-Mask-Rows, X-Mask-Detected, X-Mask-Detected-Count") in start["headers"]
+    body = b"".join(m["body"] for m in messages if m["type"] == "http.response.body")
+    assert body.decode() == "id,氏名,tel\n＊,山田＊,＊＊-＊＊＊＊\n\n"
+    assert messages[-1]["type"] == "http.response.trailers"
+    assert dict(messages[-1]["headers"]) == {
+        b"x-mask-rows": b"2",
+        b"x-mask-detected": b"id=1&%E6%B0%8F%E5%90%8D=1&tel=6",
+        b"x-mask-detected-count": b"8",
+    }
+
+
+def test_thread_executor_serves_mask_and_batch(monkeypatch) -> None:
+    monkeypatch.delenv("MASK_EXECUTOR", raising=False)
+    monkeypatch.setenv("MASK_WORKERS", "2")
+    monkeypatch.setattr("backend.services.executor.Masker", _WorkerFakeMasker)
+    with TestClient(app) as client:
+        assert client.app.state.mask_executor.mode == "thread"
+        assert client.app.state.masker is None
+        res = client.post("/mask", json={"text": "abcdefgWXYZhij"})
+        assert res.status_code == 200
+        assert res.json()["masked"] == "abcdefg＊＊＊＊hij"
+        payload = {"items": [{"text": "abcdefgWXYZhij"}, {"text": "boom-boom-boom"}]}
+        results = client.post("/mask/batch", json=payload).json()["results"]
+        assert results[0]["result"]["masked"] == "abcdefg＊＊＊＊hij"
+        assert results[1]["error"] == "内部エラー"
+        maskers = client.app.state.mask_executor.local_maskers(None)
+        assert maskers
+        assert all(isinstance(m, _WorkerFakeMasker) for m in maskers)
@@ -0,0 +1,50 @@
+"""
+AdmissionController のユニットテスト
+
+- 文字数の上限で受付を判定し、処理中の要求が無ければ上限を超える要求も受け付けること
+- Retry-After を処理速度から見積もること
+"""
+import pytest
+from backend.services.admission import AdmissionController, QueueFull
+
+
+def test_rejects_when_chars_exceed_limit() -> None:
+    ctl = AdmissionController(max_chars=100)
+    # 処理中が無ければ上限を超える要求も受け付ける
+    ctl.admit(150)
+    assert ctl.full()
+    with pytest.raises(QueueFull) as exc:
+        ctl.admit(1)
+    assert exc.value.retry_after >= 1
+    ctl.release(150)
+    ctl.admit(60)
+    ctl.admit(40)
+    with pytest.raises(QueueFull):
+        ctl.admit(1)
+    # 応答開始後のチャンクなどは上限を確認せずに計上できる
+    ctl.admit(10, force=True)
+    assert (ctl.chars, ctl.requests) == (110, 3)
+
+
+def test_unlimited_only_tracks() -> None:
+    ctl = AdmissionController(max_chars=0)
+    for _ in range(3):
+        ctl.admit(10**6)
+    assert not ctl.full()
+    assert ctl.chars == 3 * 10**6
+
+
+def test_retry_after_from_measured_rate(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [0.0]
+    monkeypatch.setattr("backend.services.admission.time.monotonic", lambda: now[0])
+    ctl = AdmissionController(max_chars=1000)
+    assert ctl.retry_after() == 1
+    # 2秒で 2000 文字を処理 → 1000 文字/秒
+    for _ in range(2):
+        ctl.admit(1000)
+        now[0] += 1.0
+        ctl.release(1000)
+    ctl.admit(5000)
+    assert ctl.retry_after() == 5
+    ctl.admit(10**6, force=True)
+    assert ctl.retry_after() == AdmissionController.MAX_RETRY_AFTER
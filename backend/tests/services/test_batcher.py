@@ -0,0 +1,90 @@
+"""
+MicroBatcher のユニットテスト
+
+- 閑散時は待たずに mask をそのまま呼ぶこと
+- 実行枠が埋まっている間の要求を1回の mask_many にまとめ、結果と例外を要求ごとに返すこと
+- max_items / max_chars でバッチを分けること
+"""
+import asyncio
+from typing import Any
+
+import pytest
+from backend.services.batcher import MicroBatcher
+
+
+class _Recorder:
+    """実行関数のスタブ。最初の呼び出しは gate が開くまで枠を占有する。"""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, list[str]]] = []
+        self.gate = asyncio.Event()
+
+    async def run(self, method: str, **kwargs: Any) -> Any:
+        if method == "mask":
+            self.calls.append((method, [kwargs["text"]]))
+            if len(self.calls) == 1:
+                await self.gate.wait()
+            return (kwargs["text"].upper(), [])
+        texts = [it["text"] for it in kwargs["items"]]
+        self.calls.append((method, texts))
+        return [ValueError(t) if t == "boom" else (t.upper(), []) for t in texts]
+
+
+def test_idle_request_is_not_batched() -> None:
+    async def _main() -> None:
+        rec = _Recorder()
+        rec.gate.set()
+        batcher = MicroBatcher(rec.run, slots=1, max_items=8)
+        assert await batcher.submit({"text": "a"}) == ("A", [])
+        assert await batcher.submit({"text": "b"}) == ("B", [])
+        await batcher.close()
+        assert rec.calls == [("mask", ["a"]), ("mask", ["b"])]
+
+    asyncio.run(_main())
+
+
+def test_requests_queued_while_busy_share_one_batch() -> None:
+    async def _main() -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher(rec.run, slots=1, max_items=8, window=0)
+        first = asyncio.create_task(batcher.submit({"text": "first"}))
+        await asyncio.sleep(0.01)
+        # 実行枠が埋まっている間に届いた要求
+        rest = [asyncio.create_task(batcher.submit({"text": t})) for t in ("x", "boom", "y")]
+        await asyncio.sleep(0.01)
+        rec.gate.set()
+        assert await first == ("FIRST", [])
+        results = await asyncio.gather(*rest, return_exceptions=True)
+        await batcher.close()
+        assert rec.calls == [("mask", ["first"]), ("mask_many", ["x", "boom", "y"])]
+        # 結果は要求ごと。要素単位の例外はその要求だけを失敗させる
+        assert results[0] == ("X", [])
+        assert results[2] == ("Y", [])
+        assert isinstance(results[1], ValueError)
+        assert batcher.load > 1.0
+
+    asyncio.run(_main())
+
+
+@pytest.mark.parametrize(
+    ("limits", "expected"),
+    [
+        ({"max_items": 2}, [["a", "b"], ["c", "d"], ["e"]]),
+        ({"max_chars": 3}, [["a", "b", "c"], ["d", "e"]]),
+    ],
+)
+def test_batches_split_by_limits(limits: dict[str, int], expected: list[list[str]]) -> None:
+    async def _main() -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher(rec.run, slots=1, window=0, **{"max_items": 8, **limits})
+        first = asyncio.create_task(batcher.submit({"text": "0"}))
+        await asyncio.sleep(0.01)
+        rest = [asyncio.create_task(batcher.submit({"text": t})) for t in "abcde"]
+        await asyncio.sleep(0.01)
+        rec.gate.set()
+        await asyncio.gather(first, *rest)
+        await batcher.close()
+        # 1件だけのバッチは mask で処理される
+        assert [texts for _, texts in rec.calls[1:]] == expected
+
+    asyncio.run(_main())
@@ -0,0 +1,92 @@
+"""
+NerCache のユニットテスト
+
+- LRU 追い出し、TTL、監視用カウンタを検証
+- SQLite 共有キャッシュ: インスタンス間の共有、上限での追い出し、保存内容、fork 後の接続の作り直し
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+import pytest
+from backend.services.cache import NerCache, SqliteNerCache, TieredNerCache
+
+
+def test_lru_eviction_and_counters() -> None:
+    cache = NerCache(max_entries=2)
+    cache.put(b"a", ((0, 2, "PERSON"),))
+    cache.put(b"b", ())
+    assert cache.get(b"a") == ((0, 2, "PERSON"),)  # a を最近参照に
+    cache.put(b"c", ())  # 最も古い b が追い出される
+    assert cache.get(b"b") is None
+    assert cache.get(b"c") == ()
+    assert cache.stats() == {
+        "size": 2,
+        "max_entries": 2,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+        "expired": 0,
+    }
+
+
+def test_ttl_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr("backend.services.cache.time.monotonic", lambda: now[0])
+    cache = NerCache(max_entries=10, ttl=5)
+    cache.put(b"a", ())
+    now[0] += 4
+    assert cache.get(b"a") == ()
+    now[0] += 2
+    assert cache.get(b"a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expired"] == 1
+
+
+def test_sqlite_cache_shared_between_instances(tmp_path: Path) -> None:
+    path = tmp_path / "ner_cache.sqlite3"
+    writer = SqliteNerCache(path, max_entries=100)
+    writer.put_many([(b"k1", ((0, 2, "PERSON"),)), (b"k2", ())])
+    # 別ワーカ（別接続）からも参照できる
+    reader = SqliteNerCache(path, max_entries=100)
+    assert reader.get_many([b"k1", b"k2", b"k3"]) == [((0, 2, "PERSON"),), (), None]
+    assert (reader.hits, reader.misses) == (2, 1)
+    # 保存されるのはオフセットとラベルのみ
+    rows = sqlite3.connect(path).execute("SELECT value FROM ner_cache ORDER BY key").fetchall()
+    assert rows == [('[[0,2,"PERSON"]]',), ("[]",)]
+
+
+def test_sqlite_cache_bounded(tmp_path: Path) -> None:
+    cache = SqliteNerCache(tmp_path / "c.sqlite3", max_entries=3, evict_every=1)
+    for i in range(5):
+        cache.put(bytes([i]), ())
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 2
+
+
+def test_sqlite_cache_after_fork_reconnects(tmp_path: Path) -> None:
+    cache = SqliteNerCache(tmp_path / "c.sqlite3", max_entries=10)
+    cache.put(b"parent", ())
+    pid = os.fork()
+    if pid == 0:
+        # 子プロセス: 接続を開き直して読み書きできること
+        try:
+            cache.after_fork()
+            cache.put(b"child", ((0, 1, "PERSON"),))
+            ok = cache.get(b"parent") == ()
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # 親プロセスの接続はそのまま使え、子の書き込みも見える
+    assert cache.get(b"child") == ((0, 1, "PERSON"),)
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path: Path) -> None:
+    disk = SqliteNerCache(tmp_path / "c.sqlite3", max_entries=10)
+    disk.put(b"k", ((1, 3, "EMAIL"),))
+    tiered = TieredNerCache(NerCache(max_entries=10), disk)
+    assert tiered.get(b"k") == ((1, 3, "EMAIL"),)
+    assert tiered.memory.get(b"k") == ((1, 3, "EMAIL"),)
+    stats = tiered.stats()
+    assert (stats["misses"], stats["disk_hits"]) == (1, 1)
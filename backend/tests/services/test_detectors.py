@@ -0,0 +1,86 @@
+"""
+RegexDetector のユニットテスト
+
+- 検出結果がルールごとの走査の和集合になること、対象ラベルごとのプランのキャッシュ、独自ルールの読み込みを検証
+- 全ルールを1本の正規表現にまとめること（まとめられないルールのみ個別に走査すること）
+"""
+import json
+import re
+from pathlib import Path
+
+import pytest
+from backend.services.detectors import BUILTIN_RULES, RegexDetector, RegexRule, load_rules
+
+_EXAMPLE_RULES = Path(__file__).resolve().parents[2] / "config" / "regex_rules.example.json"
+
+
+def _per_rule(rules, text: str) -> list[tuple[int, int, str]]:
+    return sorted({(m.start(), m.end(), r.label) for r in rules for m in re.finditer(r.pattern, text)})
+
+
+def test_find_matches_per_rule_scans() -> None:
+    text = "連絡は taro@example.com、03-1234-5678、https://example.com/a へ。予備 hanako@example.jp"
+    detector = RegexDetector()
+    found = detector.find(text, {"EMAIL", "URL", "PHONE"})
+    assert found == _per_rule(BUILTIN_RULES, text)
+    assert [label for *_, label in found] == ["EMAIL", "PHONE", "URL", "EMAIL"]
+
+
+def test_overlapping_rules_are_not_dropped() -> None:
+    # 郵便番号のルールが電話番号の先頭に一致しても、電話番号全体を検出する（マスク範囲が縮まない）
+    rules = load_rules(_EXAMPLE_RULES) + BUILTIN_RULES
+    detector = RegexDetector(rules)
+    text = "携帯は 090-1234-5678 です。資料 https://example.com/u?to=taro@example.com"
+    found = detector.find(text, {r.label for r in rules})
+    assert found == _per_rule(rules, text)
+    assert (4, 17, "PHONE") in found
+    assert (4, 12, "POSTAL_CODE") in found
+    assert [text[s:e] for s, e, label in found if label == "EMAIL"] == ["taro@example.com"]
+
+
+def test_rules_combined_into_one_pattern() -> None:
+    rules = load_rules(_EXAMPLE_RULES) + BUILTIN_RULES
+    detector = RegexDetector(rules)
+    plan = detector._plan({r.label for r in rules})
+    assert plan is not None
+    assert plan.combined is not None
+    assert plan.separate == ()
+    assert [label for _, label in plan.groups.values()] == [r.label for r in rules]
+
+
+def test_uncombinable_rules_scanned_separately() -> None:
+    # 捕捉グループ（後方参照）・先頭のフラグ指定はまとめず、ルール単体の意味で走査する
+    rules = (RegexRule("REPEAT", r"(\d)\1{3}"), RegexRule("CODE", r"(?i)id-\d+"), *BUILTIN_RULES)
+    detector = RegexDetector(rules)
+    text = "ID-42 と 7777、連絡は a@example.com"
+    found = detector.find(text, {r.label for r in rules})
+    assert found == _per_rule(rules, text)
+    assert [label for _, label in detector._plan({r.label for r in rules}).separate] == ["REPEAT", "CODE"]
+    assert {label for *_, label in found} == {"REPEAT", "CODE", "EMAIL"}
+
+
+def test_plan_cached_per_target_set() -> None:
+    detector = RegexDetector()
+    assert detector.find("a@example.com 03-1234-5678", {"EMAIL", "PERSON"}) == [(0, 13, "EMAIL")]
+    detector.find("x", {"PERSON", "EMAIL"})
+    detector.find("x", {"PERSON"})
+    # ルールの無いラベルはプランのキーから除かれる
+    assert set(detector._plans) == {frozenset({"EMAIL"}), frozenset()}
+    assert detector._plans[frozenset()] is None
+
+
+def test_load_example_rules() -> None:
+    detector = RegexDetector(load_rules(_EXAMPLE_RULES) + BUILTIN_RULES)
+    text = "カード 4111-1111-1111-1111、番号 1234 5678 9012、〒100-0001"
+    labels = {"CREDIT_CARD", "MY_NUMBER", "POSTAL_CODE", "PHONE"}
+    found = [(text[s:e], label) for s, e, label in detector.find(text, labels)]
+    assert ("4111-1111-1111-1111", "CREDIT_CARD") in found
+    assert ("1234 5678 9012", "MY_NUMBER") in found
+    assert ("〒100-0001", "POSTAL_CODE") in found
+
+
+def test_load_rules_rejects_invalid_pattern(tmp_path: Path) -> None:
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"label": "bad", "pattern": "("}]), encoding="utf-8")
+    with pytest.raises(ValueError, match="BAD"):
+        load_rules(path)
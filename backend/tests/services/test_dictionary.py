@@ -0,0 +1,59 @@
+"""
+ユーザ辞書（Aho-Corasick）のユニットテスト
+
+- 素朴な全探索との一致、最左最長の選択、英数字語の境界、ファイル更新時の差し替えを検証
+"""
+import os
+import random
+from pathlib import Path
+
+from backend.services.dictionary import AhoCorasick, DictionaryDetector, load_entries
+
+
+def test_matches_naive_search() -> None:
+    rng = random.Random(0)
+    alphabet = "あいうアイ"
+    terms = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(40)}
+    text = "".join(rng.choice(alphabet) for _ in range(500))
+    matcher = AhoCorasick((t, "X") for t in terms)
+    # 最左最長・重なり無しの素朴実装
+    expected: list[tuple[int, int, str]] = []
+    i = 0
+    while i < len(text):
+        ends = [i + len(t) for t in terms if text.startswith(t, i)]
+        if ends:
+            expected.append((i, max(ends), "X"))
+            i = max(ends)
+        else:
+            i += 1
+    assert matcher.find(text, {"X"}) == expected
+
+
+def test_leftmost_longest_and_word_boundary() -> None:
+    matcher = AhoCorasick([("山田", "PERSON"), ("山田太郎", "PERSON"), ("Ann", "PERSON"), ("青嵐", "PROJECT")])
+    text = "山田太郎とAnnがAnnualの青嵐を担当"
+    found = [(text[s:e], label) for s, e, label in matcher.find(text, {"PERSON", "PROJECT"})]
+    assert found == [("山田太郎", "PERSON"), ("Ann", "PERSON"), ("青嵐", "PROJECT")]
+    assert matcher.find(text, {"EMAIL"}) == []
+
+
+def test_load_entries_default_label(tmp_path: Path) -> None:
+    path = tmp_path / "dict.tsv"
+    path.write_text("# comment\n\n山田太郎\n青嵐\tproject\n", encoding="utf-8")
+    assert load_entries(path) == [("山田太郎", "PERSON"), ("青嵐", "PROJECT")]
+
+
+def test_reload_swaps_matcher(tmp_path: Path) -> None:
+    path = tmp_path / "dict.tsv"
+    path.write_text("山田太郎\n", encoding="utf-8")
+    detector = DictionaryDetector(path, reload_interval=0)
+    before = detector._matcher
+    assert detector.reload_if_changed() is False
+
+    path.write_text("山田太郎\n佐藤花子\n", encoding="utf-8")
+    os.utime(path, ns=(0, 10**18))
+    assert detector.reload_if_changed() is True
+    assert detector.size == 2
+    assert [e for *_, e in detector.find("佐藤花子", {"PERSON"})] == ["PERSON"]
+    # 差し替え前の参照（処理中のリクエスト）は旧辞書のまま使える
+    assert before.find("佐藤花子", {"PERSON"}) == []
@@ -0,0 +1,66 @@
+"""
+MaskExecutor のユニットテスト
+
+- spaCy のロードはスタブ化し、実行方式ごとの呼び出し経路のみ検証
+"""
+import asyncio
+import logging
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+import pytest
+from backend.services.executor import MaskExecutor
+
+
+class _FakeDoc:
+    def __init__(self, ents: list[Any]):
+        self.ents = ents
+
+
+class _FakeNLP:
+    """GiNZA の代替スタブ（テスト用）"""
+
+    def __call__(self, _text: str) -> _FakeDoc:
+        return _FakeDoc(ents=[])
+
+    def pipe(self, texts: Iterable[str], **_kwargs: Any) -> Iterator[_FakeDoc]:
+        for t in texts:
+            yield self(t)
+
+
+@pytest.fixture(autouse=True)
+def _stub_spacy(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: _FakeNLP())
+
+
+def test_unknown_mode_rejected() -> None:
+    with pytest.raises(ValueError, match="未知の実行方式"):
+        MaskExecutor(mode="gpu")
+
+
+def test_thread_mode_uses_worker_owned_masker() -> None:
+    executor = MaskExecutor(mode="thread", max_workers=2, masker_kwargs={"model_name": "ja_ginza"})
+    executor.start()
+    try:
+        text = "連絡先は taro@example.com です。"
+        masked, detected = asyncio.run(executor.run(None, "mask", text=text, targets=["EMAIL"]))
+        assert [s.label for s in detected] == ["EMAIL"]
+        assert "taro@example.com" not in masked
+        assert executor.in_flight == 0
+    finally:
+        executor.shutdown()
+
+
+def test_saturation_is_logged(caplog: pytest.LogCaptureFixture) -> None:
+    executor = MaskExecutor(mode="thread", max_workers=1)
+    executor.start()
+    caplog.set_level(logging.WARNING, logger="app.executor")
+
+    async def _burst() -> None:
+        await asyncio.gather(*(executor.run(None, "mask", text="あいう。" * 50) for _ in range(4)))
+
+    try:
+        asyncio.run(_burst())
+    finally:
+        executor.shutdown()
+    assert any("saturated" in rec.getMessage() for rec in caplog.records)
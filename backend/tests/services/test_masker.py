@@ -3,10 +3,15 @@ Masker サービスのユニットテスト（TDD）
 
 - spaCy のロードや NER はモック/スタブ化し、サービスのロジックのみ検証
 """
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
 from typing import Any
 
 import pytest
-from backend.services.masker import Masker, Span
+from backend.services.masker import PIPELINE_PROFILES, DeadlineExceeded, Masker, Span
+
+_FIXTURES = Path(__file__).resolve().parents[1] / "fixtures"
 
 
 class _FakeDoc:
@@ -21,11 +26,15 @@ class _FakeNLP:
         # 既定では NER を空にして、正規表現ルートを検証
         return _FakeDoc(ents=[])
 
+    def pipe(self, texts: Iterable[str], **_kwargs: Any) -> Iterator[_FakeDoc]:
+        for t in texts:
+            yield self(t)
+
 
 @pytest.fixture
 def masker(monkeypatch: pytest.MonkeyPatch) -> Masker:
     # spaCy のロードをスタブ化して、Masker 生成時の重い依存を回避
-    monkeypatch.setattr("spacy.load", lambda _name: _FakeNLP())
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: _FakeNLP())
     return Masker(model_name="ja_ginza")
 
 
@@ -69,3 +78,241 @@ def test_preserve_length_false(masker: Masker) -> None:
     assert masked[s.start : s.start + 1] == "#"
 
 
+class _FakeEnt:
+    def __init__(self, label: str, start_char: int, end_char: int):
+        self.label_ = label
+        self.start_char = start_char
+        self.end_char = end_char
+
+
+class _NameNLP(_FakeNLP):
+    """文中の「太郎」を Person として返すスタブ（pipe の呼び出し引数を記録）"""
+
+    def __init__(self) -> None:
+        self.pipe_kwargs: list[dict[str, Any]] = []
+
+    def __call__(self, text: str) -> _FakeDoc:
+        return _FakeDoc(ents=[_FakeEnt("Person", m.start(), m.end()) for m in re.finditer("太郎", text)])
+
+    def pipe(self, texts: Iterable[str], **kwargs: Any) -> Iterator[_FakeDoc]:
+        self.pipe_kwargs.append(kwargs)
+        self.texts = list(texts)
+        return super().pipe(self.texts)
+
+
+def test_ner_offsets_with_batched_pipe(monkeypatch: pytest.MonkeyPatch) -> None:
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    masker = Masker(model_name="ja_ginza", batch_size=8)
+    text = "こんにちは。太郎です。明日は太郎と会う！"
+    masked, detected = masker.mask(text=text, targets=["PERSON"])
+    assert [(s.start, s.end) for s in detected] == [(6, 8), (14, 16)]
+    assert all(text[s.start:s.end] == "太郎" for s in detected)
+    assert masked == "こんにちは。＊＊です。明日は＊＊と会う！"
+    # 文ごとではなく1回の pipe 呼び出しにまとめられる
+    assert nlp.pipe_kwargs == [{"batch_size": 8, "n_process": 1}]
+
+
+def test_sentence_spans_single_pass(masker: Masker) -> None:
+    text = "「こんにちは。」と言った！？本当。最後"
+    spans = masker._sentence_spans(text)
+    assert [text[a:b] for a, b in spans] == ["「こんにちは。」", "と言った！", "？", "本当。", "最後"]
+    assert masker._sentence_spans("") == [(0, 0)]
+    assert masker._sentence_spans("終わり。") == [(0, 4)]
+
+
+def test_ner_windows_pack_short_sentences(masker: Masker) -> None:
+    masker.window_chars = 10
+    text = "あ。い。う。" + "えおかきくけこさしす。"  # 短文3つ + 11文字の文
+    windows = masker._ner_windows(text, masker._sentence_spans(text))
+    assert [text[a:b] for a, b in windows] == ["あ。い。う。", "えおかきくけこさしす", "。"]
+
+
+def test_ner_windows_split_long_run_at_safe_point(masker: Masker) -> None:
+    masker.window_chars = 8
+    text = "ああああああ、いいいいいい うう"
+    windows = masker._ner_windows(text, masker._sentence_spans(text))
+    # 区切り文字（、/空白）の直後で切り、全体を欠けなく覆う
+    assert [text[a:b] for a, b in windows] == ["ああああああ、", "いいいいいい ", "うう"]
+    assert all(b - a <= 8 for a, b in windows)
+    masker.window_chars = 0
+    assert masker._ner_windows(text, [(0, len(text))]) == [(0, len(text))]
+
+
+def test_pipeline_profile_excludes_components(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[dict[str, Any]] = []
+    monkeypatch.setattr("spacy.load", lambda _name, **kwargs: calls.append(kwargs) or _FakeNLP())
+    assert Masker(pipeline="ner").excluded == PIPELINE_PROFILES["ner"]
+    assert Masker(pipeline="full").excluded == ()
+    assert Masker(pipeline="ner", exclude=["parser"]).excluded == ("parser",)
+    assert calls[-1] == {"exclude": ["parser"]}
+    with pytest.raises(ValueError, match="未知のパイプラインプロファイル"):
+        Masker(pipeline="tiny")
+
+
+def test_ner_profile_matches_full_pipeline() -> None:
+    """NER 専用プロファイルでも、全コンポーネント時と検出結果が一致すること（実モデル）。"""
+    pytest.importorskip("ja_ginza")
+    corpus = (_FIXTURES / "ner_corpus.txt").read_text(encoding="utf-8")
+    full = Masker(pipeline="full")
+    ner = Masker(pipeline="ner")
+    assert set(ner.nlp.pipe_names) == {"tok2vec", "ner"}
+    for line in corpus.splitlines():
+        assert ner.mask(line) == full.mask(line), line
+
+
+def test_mask_many_single_ner_pass(monkeypatch: pytest.MonkeyPatch) -> None:
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    masker = Masker(model_name="ja_ginza")
+    items = [
+        {"text": "太郎です。", "targets": ["PERSON"]},
+        {"text": "連絡は taro@example.com へ。", "targets": ["EMAIL"], "replacement": "#"},
+        {"text": "花子と太郎。", "targets": ["PERSON"], "fixed_length": 1},
+    ]
+    results = masker.mask_many(items)
+    assert len(nlp.pipe_kwargs) == 1
+    assert results == [masker.mask(**it) for it in items]
+    assert results[2][0] == "花子と＊。"
+
+
+class _ClockNLP(_FakeNLP):
+    """ウィンドウを1つ処理するごとに時計を1秒進めるスタブ（処理済みのウィンドウ数を記録）"""
+
+    def __init__(self, clock: list[float]) -> None:
+        self.clock = clock
+        self.processed = 0
+
+    def pipe(self, texts: Iterable[str], **_kwargs: Any) -> Iterator[_FakeDoc]:
+        for t in texts:
+            self.processed += 1
+            self.clock[0] += 1.0
+            yield self(t)
+
+
+def test_deadline_abandons_ner_between_windows(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = [1000.0]
+    nlp = _ClockNLP(clock)
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    monkeypatch.setattr("backend.services.masker.time.time", lambda: clock[0])
+    masker = Masker(model_name="ja_ginza", window_chars=0, cache_size=0)
+    text = "一文目です。" * 10
+    with pytest.raises(DeadlineExceeded):
+        masker.mask(text, deadline=clock[0] - 1)
+    assert nlp.processed == 0
+    # 3ウィンドウ目の後で期限切れ → 残りの文は NER に流さない
+    with pytest.raises(DeadlineExceeded):
+        masker.mask(text, deadline=clock[0] + 2.5)
+    assert nlp.processed == 3
+    # 期限内なら通常どおり
+    assert masker.mask(text, deadline=clock[0] + 100)[0] == text
+
+    # mask_many: 期限切れの要素だけを DeadlineExceeded とし、他の要素は処理する
+    results = masker.mask_many([{"text": text, "deadline": clock[0] - 1}, {"text": text}])
+    assert isinstance(results[0], DeadlineExceeded)
+    assert results[1] == (text, [])
+
+
+def test_sentence_cache_skips_ner_for_known_sentences(monkeypatch: pytest.MonkeyPatch) -> None:
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    masker = Masker(model_name="ja_ginza", window_chars=0)
+    first = masker.mask("太郎です。よろしく。", targets=["PERSON"])
+    assert nlp.texts == ["太郎です。", "よろしく。"]
+    # 既知の文は NER を省略し、キャッシュから全文オフセットへ復元する
+    second = masker.mask("初めまして。太郎です。", targets=["PERSON"])
+    assert nlp.texts == ["初めまして。"]
+    assert second[0] == "初めまして。＊＊です。"
+    assert [(s.start, s.end, s.text) for s in second[1]] == [(6, 8, "太郎")]
+    assert first[0] == "＊＊です。よろしく。"
+    stats = masker.cache_stats()
+    assert stats is not None
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 3, 3)
+    # 原文は保持しない（キーはダイジェスト、値はオフセットとラベルのみ）
+    assert masker.cache is not None
+    for key, (_, value) in masker.cache._data.items():
+        assert len(key) == 16
+        assert all(isinstance(v, (int, str)) and v != "太郎" for ent in value for v in ent)
+
+
+def test_sentence_cache_skips_entities_across_sentences(masker: Masker) -> None:
+    # 文「あい。」(0-3) から「うえお。」(3-7) へまたがるエンティティと、「かき。」(7-10) 内のエンティティ
+    ents = [(0, 5, "PERSON"), (8, 9, "PERSON")]
+    masker._store_cached("あい。うえお。かき。", [(0, 3), (3, 7), (7, 10)], ents)
+    assert masker.cache is not None
+    assert masker.cache.get(masker._cache_key("あい。")) is None
+    assert masker.cache.get(masker._cache_key("うえお。")) is None
+    assert masker.cache.get(masker._cache_key("かき。")) == ((1, 2, "PERSON"),)
+
+
+def test_disk_cache_shared_across_maskers(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    first = Masker(model_name="ja_ginza", cache_dir=str(tmp_path))
+    first.mask("太郎です。", targets=["PERSON"])
+    # 新しいワーカ（プロセス内キャッシュは空）でも共有キャッシュから復元できる
+    second = Masker(model_name="ja_ginza", cache_dir=str(tmp_path))
+    nlp.texts = []
+    masked, detected = second.mask("太郎です。", targets=["PERSON"])
+    assert nlp.texts == []
+    assert masked == "＊＊です。"
+    assert [(s.start, s.end) for s in detected] == [(0, 2)]
+
+
+def test_custom_regex_rules_in_default_targets(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: _FakeNLP())
+    rules = tmp_path / "rules.json"
+    rules.write_text('[{"label": "postal_code", "pattern": "〒\\\\d{3}-\\\\d{4}"}]', encoding="utf-8")
+    masker = Masker(model_name="ja_ginza", regex_rules_file=str(rules))
+    masked, detected = masker.mask("〒100-0001 taro@example.com")
+    assert [s.label for s in detected] == ["POSTAL_CODE", "EMAIL"]
+    assert masked == "＊" * 9 + " " + "＊" * 16
+
+
+def test_user_dictionary_detection(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: _FakeNLP())
+    path = tmp_path / "dict.tsv"
+    path.write_text("青嵐\tPROJECT\n", encoding="utf-8")
+    masker = Masker(model_name="ja_ginza", dictionary_file=str(path), dictionary_reload_interval=0)
+    # 辞書のラベルは targets 省略時も対象
+    masked, detected = masker.mask("青嵐の件")
+    assert masked == "＊＊の件"
+    assert [(s.label, s.text) for s in detected] == [("PROJECT", "青嵐")]
+    assert masker.mask("青嵐の件", targets=["PERSON"])[0] == "青嵐の件"
+
+
+@pytest.mark.parametrize(
+    ("options", "repl_len"),
+    [({}, None), ({"fixed_length": 3}, 3), ({"preserve_length": False, "replacement": "#"}, 1)],
+)
+def test_masked_offsets_are_exact(masker: Masker, options: dict[str, Any], repl_len: int | None) -> None:
+    text = "a@example.com と https://x.example/b@example.com と 03-1234-5678 へ"
+    masked, detected = masker.mask(text=text, targets=["EMAIL", "URL", "PHONE"], **options)
+    # URL 中のメールアドレスも検出する（マスク範囲は URL 全体）
+    assert [s.label for s in detected] == ["EMAIL", "URL", "EMAIL", "PHONE"]
+    for s in detected:
+        region = masked[s.masked_start : s.masked_end]
+        assert set(region) == {options.get("replacement", "＊")}
+        assert len(region) == (repl_len or s.end - s.start)
+    # マスク間の未マスク部分は原文と一致する（後続スパンのずれが無い）
+    pairs = [(a, b) for a, b in zip(detected, detected[1:], strict=False) if a.end <= b.start]
+    assert len(pairs) == 2
+    assert [masked[a.masked_end : b.masked_start] for a, b in pairs] == [text[a.end : b.start] for a, b in pairs]
+
+
+def test_warm_up_bypasses_cache_and_metrics(monkeypatch: pytest.MonkeyPatch) -> None:
+    from backend.services.metrics import METRICS
+
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    masker = Masker(model_name="ja_ginza")
+    before = METRICS.snapshot().counters
+    masker.warm_up(["太郎です。", "太郎です。"])
+    # キャッシュを使わず毎回 NER を通し、件数・統計・メトリクスを変えない
+    assert nlp.texts == ["太郎です。"]
+    assert len(nlp.pipe_kwargs) == 2
+    stats = masker.cache_stats()
+    assert stats is not None
+    assert (stats["size"], stats["hits"], stats["misses"]) == (0, 0, 0)
+    assert METRICS.snapshot().counters == before
+    assert masker.warmed
@@ -0,0 +1,42 @@
+"""
+メトリクスレジストリのユニットテスト
+
+- スレッドごとの記録の合算、プロセス間の差分の合算、Prometheus テキスト形式を検証
+"""
+import threading
+
+from backend.services.metrics import Metrics
+
+
+def test_threads_are_summed_in_render() -> None:
+    metrics = Metrics()
+
+    def _work() -> None:
+        for _ in range(1000):
+            metrics.observe("masker_input_chars", 300)
+            metrics.inc("masker_detected_total", (("label", "EMAIL"),))
+
+    threads = [threading.Thread(target=_work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    text = metrics.render([("http_requests_in_flight", "処理中", 2)])
+    assert "http_requests_in_flight 2\n" in text
+    assert 'masker_input_chars_bucket{le="100"} 0\n' in text
+    assert 'masker_input_chars_bucket{le="500"} 4000\n' in text
+    assert 'masker_input_chars_bucket{le="+Inf"} 4000\n' in text
+    assert "masker_input_chars_sum 1200000\n" in text
+    assert 'masker_detected_total{label="EMAIL"} 4000\n' in text
+
+
+def test_drain_and_merge_between_registries() -> None:
+    worker, parent = Metrics(), Metrics()
+    worker.observe("masker_stage_seconds", 0.002, (("stage", "ner"),))
+    parent.merge(worker.drain())
+    parent.merge(worker.drain())  # 取り出し済みの差分は二重に加算されない
+    text = parent.render()
+    assert 'masker_stage_seconds_bucket{stage="ner",le="0.001"} 0\n' in text
+    assert 'masker_stage_seconds_bucket{stage="ner",le="0.005"} 1\n' in text
+    assert 'masker_stage_seconds_count{stage="ner"} 1\n' in text
+    assert worker.snapshot().hist == {}
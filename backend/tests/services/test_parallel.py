@@ -0,0 +1,84 @@
+"""
+文書内並列処理（mask_parallel）のユニットテスト
+
+- チャンクごとの NER の結果を全文オフセットへずらし、単一の mask と同じ結果になること
+- NER に渡すウィンドウが一括処理と同じになること（長大な文の途中で切らない）
+- 正規表現の一致が欠落・重複しないこと
+"""
+import asyncio
+import re
+from collections.abc import Iterable, Iterator
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from backend.services.masker import Masker, ner_windows, sentence_spans
+from backend.services.parallel import chunk_size, mask_parallel, split_chunks
+
+
+class _NameNLP:
+    """「太郎」を Person として返す NER スタブ（受け取ったウィンドウを記録する）"""
+
+    def __init__(self) -> None:
+        self.windows: list[str] = []
+
+    def pipe(self, texts: Iterable[str], **_kwargs: Any) -> Iterator[SimpleNamespace]:
+        for text in texts:
+            self.windows.append(text)
+            yield SimpleNamespace(
+                ents=[
+                    SimpleNamespace(label_="Person", start_char=m.start(), end_char=m.end())
+                    for m in re.finditer("太郎", text)
+                ]
+            )
+
+
+def test_parallel_matches_single_pass(monkeypatch: pytest.MonkeyPatch) -> None:
+    nlp = _NameNLP()
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: nlp)
+    masker = Masker(model_name="ja_ginza", cache_size=0, window_chars=16)
+    # 短い文の並び（ウィンドウへ詰められる）と、句点の無い長大な文（ウィンドウ上限で分割される）
+    text = "太郎です。" * 8 + "連絡先は" + "太郎、" * 12 + "taro@example.com" + "は太郎宛て。" * 4
+    calls: list[tuple[str, str]] = []
+
+    async def run(method: str, **kwargs: Any) -> Any:
+        calls.append((method, kwargs["text"]))
+        return getattr(masker, method)(**kwargs)
+
+    masked, detected = asyncio.run(
+        mask_parallel(
+            run, text, workers=4, max_chunk_chars=20, window_chars=16, targets=["PERSON", "EMAIL"], replacement="#"
+        )
+    )
+    ner_chunks = [t for m, t in calls if m == "detect_ner"]
+    assert len(ner_chunks) > 2
+    # 長大な文は1つのチャンクに収まる（文の途中では切らない）
+    long_sentence = "連絡先は" + "太郎、" * 12 + "taro@example.com" + "は太郎宛て。"
+    assert any(long_sentence in t for t in ner_chunks)
+    assert [m for m, _ in calls][-1] == "mask"
+    parallel_windows = sorted(nlp.windows)
+
+    nlp.windows.clear()
+    expected_masked, expected = masker.mask(text, targets=["PERSON", "EMAIL"], replacement="#")
+    assert parallel_windows == sorted(nlp.windows)
+    assert masked == expected_masked
+    assert [(s.start, s.end, s.label) for s in detected] == [(s.start, s.end, s.label) for s in expected]
+    assert sum(s.label == "EMAIL" for s in detected) == 1
+
+
+def test_split_chunks_only_at_window_starts() -> None:
+    text = "一文目です。二文目です。" * 5 + "あ" * 30 + "。最後。"
+    chunks = split_chunks(text, chunk_chars=20, window_chars=16)
+    assert "".join(c for _, c in chunks) == text
+    for start, chunk in chunks:
+        assert text[start : start + len(chunk)] == chunk
+    starts = [start for start, _ in chunks]
+    windows = ner_windows(text, sentence_spans(text), 16)
+    assert set(starts) <= {w for w, _ in windows} & {s for s, _ in sentence_spans(text)}
+    # 句点の無い30文字の区間は分割しない
+    assert any(("あ" * 30) in c for _, c in chunks)
+
+
+def test_chunk_size_spreads_across_workers() -> None:
+    assert chunk_size(2_000_000, workers=4, max_chunk_chars=50_000) == 50_000
+    assert chunk_size(80_000, workers=4, max_chunk_chars=50_000) == 10_000
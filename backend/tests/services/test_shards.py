@@ -0,0 +1,76 @@
+"""
+シャード分割・マニフェスト（backend/services/shards.py）のテスト
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from backend.services.shards import JobManifest, ManifestMismatch, iter_records, plan_shards
+
+
+def _write(tmp_path: Path, data: bytes) -> str:
+    path = tmp_path / "input.txt"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_shards_align_to_line_boundaries_and_cover_input(tmp_path: Path) -> None:
+    lines = [f"行{i} 連絡先 user{i}@example.com".encode() for i in range(50)]
+    data = b"\n".join(lines)  # 末尾は改行なし
+    path = _write(tmp_path, data)
+
+    ranges = plan_shards(path, 100)
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:], strict=False):
+        assert end == start
+        assert data[end - 1 : end] == b"\n"
+
+    records = [rec for start, end in ranges for rec in iter_records(path, start, end)]
+    assert [line for _, line in records] == [line.decode() for line in lines]
+    assert all(data[offset:].startswith(lines[i]) for i, (offset, _) in enumerate(records))
+
+
+def test_iter_records_skips_bom_and_flags_invalid_utf8(tmp_path: Path) -> None:
+    data = "\ufeff先頭\n".encode() + b"bad \xff\xfe\n" + "末尾\r\n".encode()
+    path = _write(tmp_path, data)
+    records = list(iter_records(path, 0, len(data)))
+    assert [line for _, line in records] == ["先頭", None, "末尾"]
+    assert [offset for offset, _ in records] == [3, data.index(b"bad"), data.index("末尾".encode())]
+    # 先頭以外のシャードでは BOM の扱いは関係しない
+    assert [line for _, line in iter_records(path, records[2][0], len(data))] == ["末尾"]
+
+
+def test_plan_shards_edge_cases(tmp_path: Path) -> None:
+    assert plan_shards(_write(tmp_path, b""), 10) == []
+    # 1行がシャードより長い場合はその行全体で1シャード
+    assert plan_shards(_write(tmp_path, b"a" * 30 + b"\nb\n"), 10) == [(0, 31), (31, 33)]
+    with pytest.raises(ValueError, match="shard_bytes"):
+        plan_shards(_write(tmp_path, b"a\n"), 0)
+
+
+def test_manifest_roundtrip_pending_and_check(tmp_path: Path) -> None:
+    path = _write(tmp_path, b"a\nb\nc\nd\n")
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    manifest = JobManifest.plan(path, {"format": "text"}, 4, ".txt")
+    assert [(s.start, s.end) for s in manifest.shards] == [(0, 4), (4, 8)]
+    manifest.save(job_dir)
+
+    first = manifest.shards[0]
+    first.done = True
+    (job_dir / first.output).write_text("a\nb\n", encoding="utf-8")
+    manifest.save(job_dir)
+
+    loaded = JobManifest.load(job_dir)
+    assert loaded == manifest
+    assert [s.index for s in loaded.pending(job_dir)] == [1]
+    # 完了済みでも出力が消えていれば再処理する
+    (job_dir / first.output).unlink()
+    assert [s.index for s in loaded.pending(job_dir)] == [0, 1]
+
+    loaded.check(JobManifest.plan(path, {"format": "text"}, 4, ".txt"))
+    with pytest.raises(ManifestMismatch, match="options"):
+        loaded.check(JobManifest.plan(path, {"format": "jsonl"}, 4, ".txt"))
@@ -0,0 +1,84 @@
+"""
+列指向スパンストア（backend/services/spans.py）のテスト
+
+- マージ・描画・マスク後オフセットが、スパンを1件ずつ処理する素朴な実装と一致すること
+- Masker の Python 実装（VECTORIZE_MIN_SPANS 未満で使う経路）も同じ結果になること
+"""
+from __future__ import annotations
+
+import random
+
+import pytest
+from backend.services.masker import Masker
+from backend.services.spans import SpanArrays, render
+
+
+def _reference(
+    text: str, triples: list[tuple[int, int, str]], replacement: str, preserve_length: bool, fixed: int | None
+) -> tuple[str, list[tuple[int, int]]]:
+    """スパンを1件ずつ処理する素朴な実装（マージ → 描画 → オフセットの対応付け）。"""
+    regions: list[list[int]] = []
+    for start, end, _ in sorted(triples, key=lambda t: (t[0], -t[1])):
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], end)
+        else:
+            regions.append([start, end])
+    out: list[str] = []
+    last = 0
+    placed: list[tuple[int, int, int, int]] = []  # (orig_start, orig_end, masked_start, masked_len)
+    for start, end in regions:
+        out.append(text[last:start])
+        if fixed is not None:
+            repl = (replacement * (fixed + 1))[: max(fixed, 0)]
+        elif preserve_length:
+            repl = (replacement * (end - start))[: end - start]
+        else:
+            repl = replacement
+        placed.append((start, end, sum(map(len, out)), len(repl)))
+        out.append(repl)
+        last = end
+    out.append(text[last:])
+    offsets: list[tuple[int, int]] = []
+    for start, end, _ in triples:
+        r_start, r_end, m_start, m_len = next(p for p in placed if p[0] <= start < p[1])
+        if m_len == r_end - r_start:
+            offsets.append((m_start + start - r_start, m_start + end - r_start))
+        else:
+            offsets.append((m_start, m_start + m_len))
+    return "".join(out), offsets
+
+
+def test_merge_overlapping_and_adjacent() -> None:
+    spans = SpanArrays.from_triples([(10, 12, "B"), (0, 3, "A"), (3, 5, "A"), (1, 2, "B"), (7, 9, "A"), (8, 12, "B")])
+    starts, ends = spans.merged()
+    assert list(zip(starts.tolist(), ends.tolist(), strict=True)) == [(0, 5), (7, 12)]
+
+
+def test_empty() -> None:
+    spans = SpanArrays.from_triples([])
+    masked, starts, ends = render("abc", spans, spans.merged(), "*", True, None)
+    assert masked == "abc"
+    assert len(starts) == len(ends) == 0
+
+
+@pytest.mark.parametrize(
+    ("replacement", "preserve_length", "fixed"),
+    [("*", True, None), ("ab", True, None), ("[X]", False, None), ("#", True, 3), ("#", True, 0)],
+)
+def test_render_matches_reference(replacement: str, preserve_length: bool, fixed: int | None) -> None:
+    rng = random.Random(0)
+    text = "".join(rng.choice("あいうabc。 ") for _ in range(500))
+    triples = []
+    for _ in range(120):
+        start = rng.randrange(0, 495)
+        triples.append((start, start + rng.randint(1, 8), rng.choice(["EMAIL", "PHONE", "PERSON"])))
+    spans = SpanArrays.from_triples(triples)
+    masked, starts, ends = render(text, spans, spans.merged(), replacement, preserve_length, fixed)
+    expected_text, expected_offsets = _reference(text, triples, replacement, preserve_length, fixed)
+    assert masked == expected_text
+    assert list(zip(starts.tolist(), ends.tolist(), strict=True)) == expected_offsets
+    python_masked, python_starts, python_ends = Masker._render(
+        text, triples, Masker._merge_regions(triples), replacement, preserve_length, fixed
+    )
+    assert python_masked == expected_text
+    assert list(zip(python_starts, python_ends, strict=True)) == expected_offsets
@@ -0,0 +1,35 @@
+"""
+SentenceChunker のユニットテスト
+
+- 文境界での切り出し、全文オフセット、UTF-8 の分割受信を検証
+"""
+from backend.services.stream import SentenceChunker
+
+
+def _drain(chunker: SentenceChunker, parts: list[bytes]) -> list[tuple[int, str]]:
+    out: list[tuple[int, str]] = []
+    for p in parts:
+        out.extend(chunker.feed(p))
+    out.extend(chunker.close())
+    return out
+
+
+def test_chunks_cover_input_with_global_offsets() -> None:
+    text = "山田です。「はい。」よろしく！\nURL は https://x.example/?q=1&r=2 です。終わり"
+    data = text.encode("utf-8")
+    # 1 バイトずつ送っても（マルチバイト文字の途中で区切れても）復元できる
+    chunks = _drain(SentenceChunker(chunk_chars=4, max_chars=64), [data[i : i + 1] for i in range(len(data))])
+    assert "".join(c for _, c in chunks) == text
+    for start, chunk in chunks:
+        assert text[start : start + len(chunk)] == chunk
+    # 閉じ括弧は文末に含め、URL 内の ? では切らない
+    assert "「はい。」" in [c for _, c in chunks]
+    assert any("https://x.example/?q=1&r=2" in c for _, c in chunks)
+
+
+def test_hard_cut_without_boundaries() -> None:
+    chunker = SentenceChunker(chunk_chars=4, max_chars=8)
+    chunks = _drain(chunker, [("あ" * 20).encode("utf-8")])
+    assert [len(c) for _, c in chunks] == [8, 8, 4]
+    assert chunker.offset == 20
+
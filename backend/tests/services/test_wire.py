@@ -0,0 +1,44 @@
+"""
+応答形式の決定・直列化（backend/services/wire.py）のテスト
+"""
+from __future__ import annotations
+
+import json
+
+import pytest
+from backend.services import wire
+from backend.services.wire import JSON, MSGPACK, NotAcceptable, encode, negotiate
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, JSON),
+        ("*/*", JSON),
+        ("text/html", JSON),
+        ("application/msgpack", MSGPACK),
+        ("application/x-msgpack", MSGPACK),
+        ("application/json, application/msgpack", JSON),
+        ("application/msgpack, application/json", MSGPACK),
+        ("application/json;q=0.5, application/msgpack", MSGPACK),
+        ("application/json;q=0, */*", MSGPACK),
+        ("application/msgpack;q=0, */*", JSON),
+    ],
+)
+def test_negotiate(monkeypatch: pytest.MonkeyPatch, accept: str | None, expected: str) -> None:
+    monkeypatch.setattr(wire, "msgpack_available", lambda: True)
+    assert negotiate(accept) == expected
+
+
+def test_negotiate_without_msgpack(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(wire, "msgpack_available", lambda: False)
+    assert negotiate("application/msgpack, application/json;q=0.5") == JSON
+    with pytest.raises(NotAcceptable):
+        negotiate("application/msgpack")
+
+
+def test_encode_json_is_compact_utf8() -> None:
+    payload = {"masked": "＊＊さん", "detected": [{"start_char": 0}]}
+    body = encode(payload, JSON)
+    assert body == '{"masked":"＊＊さん","detected":[{"start_char":0}]}'.encode()
+    assert json.loads(body) == payload
@@ -2,20 +2,110 @@
 アプリ起動テスト
 
 - startup で Masker が設定されることを確認（Masker をモックして軽量化）
+- 既定ではマスク処理をスレッドプールで実行する（イベントループ上で実行しない）ことを確認
+- pre-fork 起動時は親プロセスでロード済みの Masker を使うことを確認
+- ウォームアップ完了後に /ready が 200 になることを確認
+- /metrics の出力を確認（spaCy のロードはスタブ化）
 """
 from __future__ import annotations
 
+import time
+from types import SimpleNamespace
+
+import pytest
 from backend.app import app
+from backend.services.masker import WARMUP_TEXTS
 from fastapi.testclient import TestClient
 
 
+class _EmptyNLP:
+    """NER 結果が空の spaCy 代替スタブ"""
+
+    def pipe(self, texts, **_kwargs):
+        for _ in texts:
+            yield SimpleNamespace(ents=[])
+
+
 class _DummyMasker:
-    def __init__(self, model_name: str = "ja_ginza") -> None:  # noqa: D401
+    # ウォームアップ済みとして扱う（起動直後に ready になる）
+    warmed = True
+
+    def __init__(self, model_name: str = "ja_ginza", **kwargs) -> None:  # noqa: D401
         self.model_name = model_name
+        self.kwargs = kwargs
+
 
+class _WarmUpMasker:
+    warmed = False
 
+    def __init__(self, **_kwargs) -> None:
+        self.texts: list[str] = []
+
+    def warm_up(self, texts) -> float:
+        self.texts.extend(texts)
+        return 0.0
+
+
+@pytest.mark.usefixtures("inline_executor")
 def test_startup_sets_masker(monkeypatch) -> None:
     monkeypatch.setattr("backend.app.Masker", _DummyMasker)
     with TestClient(app) as client:
         assert hasattr(client.app.state, "masker")
         assert isinstance(client.app.state.masker, _DummyMasker)
+
+
+def test_default_executor_runs_off_the_event_loop(monkeypatch) -> None:
+    monkeypatch.delenv("MASK_EXECUTOR", raising=False)
+    monkeypatch.setattr("backend.services.executor.Masker", _WarmUpMasker)
+    with TestClient(app) as client:
+        assert client.app.state.mask_executor.mode == "thread"
+        assert client.app.state.masker is None
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_startup_uses_preloaded_masker(monkeypatch) -> None:
+    def _fail(**_kwargs):
+        raise AssertionError("preloaded masker should be reused")
+
+    monkeypatch.setattr("backend.app.Masker", _fail)
+    preloaded = _DummyMasker()
+    app.state.preloaded_masker = preloaded
+    try:
+        with TestClient(app) as client:
+            assert client.app.state.masker is preloaded
+    finally:
+        del app.state.preloaded_masker
+
+
+@pytest.mark.usefixtures("inline_executor")
+def test_ready_after_warm_up(monkeypatch) -> None:
+    monkeypatch.setattr("backend.app.Masker", _WarmUpMasker)
+    monkeypatch.setenv("MASK_WARMUP_ROUNDS", "2")
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        deadline = time.monotonic() + 5
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert client.get("/ready").json() == {"status": "ready"}
+        # 組み込みのサンプル文を回数ぶん処理する
+        assert len(client.app.state.masker.texts) == 2 * len(WARMUP_TEXTS)
+        client.app.state.ready = False
+        res = client.get("/ready")
+        assert (res.status_code, res.json()) == (503, {"status": "starting"})
+
+
+def test_metrics_endpoint_reports_stages(monkeypatch) -> None:
+    monkeypatch.setattr("spacy.load", lambda _name, **_kwargs: _EmptyNLP())
+    with TestClient(app) as client:
+        assert client.post("/mask", json={"text": "連絡先は taro@example.com です。"}).status_code == 200
+        res = client.get("/metrics")
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/plain")
+        body = res.text
+        for stage in ("split", "ner", "regex", "dictionary", "merge", "render"):
+            assert f'masker_stage_seconds_count{{stage="{stage}"}}' in body
+        assert 'masker_detected_total{label="EMAIL"}' in body
+        # /metrics 自身の処理中の1件
+        assert "http_requests_in_flight 1\n" in body
+        assert "process_resident_memory_bytes " in body
@@ -0,0 +1,133 @@
+"""
+一括マスク CLI（backend/cli.py）のテスト
+
+- 出力が入力と同じ順序・API（/mask）と同じ形式と結果になること
+- 不正な行は行番号付きのエラーとして出力し、他の行の処理を続けること
+- プロセスプール（spawn）でも順序を保つこと（ワーカは空の spaCy パイプラインをロードする）
+- ジョブ: UTF-8 として不正な行はその行だけを失敗とし、失敗したシャードがあっても完了したシャードは記録すること
+"""
+from __future__ import annotations
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+import spacy
+from backend import cli
+from backend.schemas.mask import MaskRequest
+from backend.services.masker import Masker
+
+_LINES = [
+    json.dumps({"text": "連絡は taro@example.com へ。"}, ensure_ascii=False),
+    "not json",
+    json.dumps({"text": "電話 03-1234-5678", "masking": {"replacement": "#", "preserve_length": False}}),
+    json.dumps({"text": ""}),
+    json.dumps({"text": "URL は https://example.com/a です", "targets": ["URL"]}, ensure_ascii=False),
+]
+
+
+@pytest.fixture(scope="module")
+def blank_model(tmp_path_factory: pytest.TempPathFactory) -> str:
+    path = tmp_path_factory.mktemp("model")
+    spacy.blank("xx").to_disk(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_jsonl_matches_api_semantics_in_order(blank_model: str, workers: int) -> None:
+    out = io.StringIO()
+    lines = [(i + 1, line) for i, line in enumerate(_LINES * 3)]
+    docs, errors = cli.run(lines, out, "jsonl", {}, {"model_name": blank_model}, workers=workers, batch_size=2)
+    assert (docs, errors) == (15, 6)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(records) == 15
+    assert records[1] == {"line": 2, "error": "JSON として解析できません"}
+    assert records[13] == {"line": 14, "error": "text は必須です"}
+
+    masker = Masker(model_name=blank_model)
+    for record, line in zip(records, _LINES * 3, strict=True):
+        if "error" in record:
+            continue
+        request = MaskRequest.model_validate_json(line)
+        masked, detected = masker.mask(**request.mask_kwargs())
+        assert record["original"] == request.text
+        assert record["masked"] == masked
+        assert [(d["start_char"], d["end_char"], d["label"]) for d in record["detected"]] == [
+            (s.start, s.end, s.label) for s in detected
+        ]
+
+
+def test_main_text_format_with_cli_options(
+    blank_model: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setenv("MASK_MODEL", blank_model)
+    src = tmp_path / "notes.txt"
+    src.write_text("メールは a@example.com\n\n電話 03-1234-5678\n", encoding="utf-8")
+    dst = tmp_path / "masked.txt"
+    code = cli.main([str(src), "-o", str(dst), "--workers", "1", "--targets", "EMAIL", "--replacement", "x"])
+    assert code == 0
+    assert dst.read_text(encoding="utf-8").splitlines() == ["メールは xxxxxxxxxxxxx", "", "電話 03-1234-5678"]
+    assert "done: docs=3 errors=0" in capsys.readouterr().err
+
+
+def test_job_resumes_and_skips_completed_shards(
+    blank_model: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setenv("MASK_MODEL", blank_model)
+    src = tmp_path / "records.jsonl"
+    src.write_text("\n".join(_LINES * 4) + "\n", encoding="utf-8")
+    job_dir = tmp_path / "job"
+    dst = tmp_path / "masked.jsonl"
+    argv = [str(src), "--job-dir", str(job_dir), "--shard-bytes", "200", "-o", str(dst)]
+
+    assert cli.main([*argv, "--workers", "2"]) == 1  # 不正な行を含む
+    manifest = json.loads((job_dir / "manifest.json").read_text(encoding="utf-8"))
+    shards = manifest["shards"]
+    assert len(shards) > 2
+    assert all(s["done"] for s in shards)
+    assert sum(s["docs"] for s in shards) == 20
+    assert sum(s["errors"] for s in shards) == 8
+    records = [json.loads(line) for line in dst.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 20
+    assert records[1] == {"offset": len(_LINES[0].encode()) + 1, "error": "JSON として解析できません"}
+    expected = dst.read_text(encoding="utf-8")
+    capsys.readouterr()
+
+    # 1シャードの出力を失った状態で再実行すると、そのシャードだけを処理する
+    (job_dir / shards[1]["output"]).unlink()
+    dst.unlink()
+    assert cli.main(argv) == 1
+    err = capsys.readouterr().err
+    assert f"shards={len(shards)} pending=1" in err
+    assert dst.read_text(encoding="utf-8") == expected
+
+    # 処理条件が異なるジョブディレクトリは再利用しない
+    assert cli.main([*argv, "--targets", "EMAIL"]) == 2
+
+
+def test_job_flags_undecodable_lines(blank_model: str, tmp_path: Path) -> None:
+    src = tmp_path / "records.jsonl"
+    good = json.dumps({"text": "メールは a@example.com"}, ensure_ascii=False).encode()
+    src.write_bytes(b"\xef\xbb\xbf" + good + b"\n" + b'{"text": "\xff"}\n' + good + b"\n")
+    job_dir = tmp_path / "job"
+    manifest = cli.run_job(str(src), job_dir, "jsonl", {}, {"model_name": blank_model})
+    out = io.StringIO()
+    cli.concat_outputs(manifest, job_dir, out)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert records[0]["original"] == records[2]["original"] == "メールは a@example.com"
+    assert records[1] == {"offset": 3 + len(good) + 1, "error": "UTF-8 としてデコードできません"}
+
+
+def test_job_records_finished_shards_when_one_fails(blank_model: str, tmp_path: Path) -> None:
+    src = tmp_path / "records.jsonl"
+    src.write_text("\n".join(_LINES * 4) + "\n", encoding="utf-8")
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    # 2番目のシャードの一時出力を書けないようにする
+    (job_dir / "shard-00001.jsonl.tmp").mkdir()
+    with pytest.raises(IsADirectoryError):
+        cli.run_job(str(src), job_dir, "jsonl", {}, {"model_name": blank_model}, workers=2, shard_bytes=200)
+    shards = json.loads((job_dir / "manifest.json").read_text(encoding="utf-8"))["shards"]
+    assert len(shards) > 2
+    assert [s["done"] for s in shards] == [s["index"] != 1 for s in shards]
@@ -0,0 +1,130 @@
+"""
+pre-fork 起動（backend/serve.py）のテスト
+
+- 親プロセスの監視: 異常終了したワーカの補充、SIGHUP での入れ替え、SIGTTIN での増加、SIGTERM での停止
+  （シグナルハンドラを使うため、別プロセスで PreforkSupervisor を起動して検証する）
+- 既定設定（MASK_EXECUTOR=thread）でも親でロードした Masker をワーカで使い、モデルを再ロードしないこと
+- MASK_EXECUTOR=process では起動を拒否すること
+"""
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from backend.app import app
+from backend.serve import preload_masker
+from backend.settings import Settings
+from fastapi.testclient import TestClient
+
+_ROOT = Path(__file__).resolve().parents[2]
+
+# ワーカは起動時に自分の pid 名のファイルを作り、停止されるまで待つ
+_SCRIPT = """
+import os, sys, time
+from backend.serve import PreforkSupervisor
+
+def target():
+    open(os.path.join(sys.argv[1], str(os.getpid())), "w").close()
+    time.sleep(60)
+
+PreforkSupervisor(target, workers=2, graceful_timeout=5, poll_interval=0.05).run()
+"""
+
+
+def _wait_for(cond: Callable[[], bool], timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.05)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_supervisor_respawns_restarts_and_stops(tmp_path: Path) -> None:
+    env = {**os.environ, "PYTHONPATH": str(_ROOT)}
+    master = subprocess.Popen([sys.executable, "-c", _SCRIPT, str(tmp_path)], env=env)
+
+    def started() -> list[int]:
+        return sorted(int(p.name) for p in tmp_path.iterdir())
+
+    try:
+        _wait_for(lambda: len(started()) == 2)
+        first = started()
+
+        # 異常終了したワーカは補充される
+        os.kill(first[0], signal.SIGKILL)
+        _wait_for(lambda: len(started()) == 3)
+
+        # SIGHUP: 新しいワーカを起動してから旧ワーカを停止する
+        before = [pid for pid in started() if _alive(pid)]
+        master.send_signal(signal.SIGHUP)
+        _wait_for(lambda: len(started()) == 5)
+        _wait_for(lambda: not any(_alive(pid) for pid in before))
+
+        # SIGTTIN: ワーカを1つ増やす
+        master.send_signal(signal.SIGTTIN)
+        _wait_for(lambda: len(started()) == 6)
+
+        # SIGTERM: 全ワーカを停止して親も終了する
+        master.send_signal(signal.SIGTERM)
+        assert master.wait(timeout=10) == 0
+        assert not any(_alive(pid) for pid in started())
+    finally:
+        if master.poll() is None:
+            master.kill()
+
+
+class _EmptyNLP:
+    """NER 結果が空の spaCy 代替スタブ"""
+
+    def pipe(self, texts, **_kwargs):
+        for _ in texts:
+            yield SimpleNamespace(ents=[])
+
+
+def test_default_executor_shares_preloaded_masker(monkeypatch: pytest.MonkeyPatch) -> None:
+    loads: list[str] = []
+
+    def _load(name, **_kwargs):
+        loads.append(name)
+        return _EmptyNLP()
+
+    monkeypatch.setattr("spacy.load", _load)
+    monkeypatch.delenv("MASK_EXECUTOR", raising=False)
+    monkeypatch.setenv("MASK_WORKERS", "4")
+    # main() と同じ手順: 親でロードしてから、ワーカ側で after_fork してアプリを起動する
+    masker = preload_masker(Settings.from_env())
+    assert len(loads) == 1
+    app.state.preloaded_masker = masker
+    try:
+        masker.after_fork()
+        with TestClient(app) as client:
+            executor = client.app.state.mask_executor
+            assert (executor.mode, executor.max_workers) == ("thread", 1)
+            assert client.get("/ready").status_code == 200
+            res = client.post("/mask", json={"text": "連絡先は taro@example.com です。"})
+            assert res.status_code == 200
+            assert "taro@example.com" not in res.json()["masked"]
+            assert executor.local_maskers(None) == [masker]
+    finally:
+        del app.state.preloaded_masker
+    assert len(loads) == 1
+
+
+def test_process_executor_refused(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("MASK_EXECUTOR", "process")
+    with pytest.raises(SystemExit, match="MASK_EXECUTOR=process"):
+        preload_masker(Settings.from_env())